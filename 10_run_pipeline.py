@@ -0,0 +1,126 @@
+#the following python modules need to be installed:
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from mowing import cuts, deduplication, dove, features, instrumentation, normalisation, pipeline, preparation, runner, splitting, storage #local modules of this repository
+
+#stages 4 to 7 declared as a DAG (see mowing/runner.py)
+#the preparation branches of Landsat-7, Landsat-8, Sentinel-2 and Planet run concurrently, and every
+#stage output is cached under a hash of its inputs and parameters: a rerun only executes the stages
+#whose inputs or parameters changed, e.g. after changing window_length only smoothing and cut detection
+
+#directory of the stage cache; delete it to recompute everything
+cache_directory = r'path\to\pipeline\cache'
+
+#input directories of the exported satellite observations (CSV fragments) and Planet products
+lan7_fragments = r'input\path\to\lan7\csv\fragments'
+lan8_fragments = r'input\path\to\lan8\csv\fragments'
+sen2_fragments = r'input\path\to\sen2\csv\fragments'
+dove_images = r'C:\path\to\input\directory'
+masked_images = r'C:\path\to\output\directory'
+metadata_files = r'C:\path\to\metadata\files'
+field_shapefile = r'C:\path\to\fields.shp'
+
+#parameters of the stages, as in scripts 4 to 7
+REGION_PREFIXES = ('KM', 'LM', 'AL')
+SENSOR_PRIORITY = ('Sen2', 'Planet', 'Lan8', 'Lan7')
+IF_PARAMETERS = {'contamination': 0.06, 'random_state': 42}
+SG_PARAMETERS = {'window_length': 5, 'polyorder': 2}
+CUT_PARAMETERS = {'threshold': -0.1, 'excluded_months': (3, 4)}
+#unstratified split as in script 5; ('region', 'sat_name') keeps their shares the same in both datasets
+STRATIFY_BY = None
+
+#storage format of the smoothed dataset: 'csv' or 'parquet' (see 5_merge_and_split.py)
+DATASET_FORMAT = 'csv'
+
+#record the executed stages in a JSON run report (see mowing/instrumentation.py)
+RUN_REPORT = r'path\to\run_reports\10_run_pipeline.json'
+run_report = instrumentation.RunReport('10_run_pipeline', RUN_REPORT)
+
+#stage functions
+#each one receives the outputs of its input stages, followed by its parameters
+
+def mask_dove_images(input_directory, output_directory):
+    return dove.mask_all_images(
+        input_directory, output_directory, processes=None, buffer_size=7, tile_size=512,
+        output_profile='float32', compress='deflate'
+        )
+
+def extract_planet(masked_files, masked_directory, metadata_path, fields):
+    planet_raw = dove.extract_planet_ndvi(masked_directory, metadata_path, fields, field_id_column='field_id')
+    return preparation.prepare_planet(preparation.planet_daily_medians(planet_raw))
+
+def load_satellite(input_directory, sat_name, date_format=None):
+    raw = storage.read_fragments(storage.list_fragments(input_directory))
+    raw['sat_name'] = sat_name
+    if sat_name == 'Sen2':
+        return preparation.prepare_sentinel2(raw)
+    return preparation.prepare_landsat(raw, date_format=date_format)
+
+def merge_satellites(*processed, priority):
+    merged = deduplication.merge_dfs(list(processed), priority=priority)
+    #remove unrealistic NDVI values to prevent skewed normalisation
+    return merged[merged['NDVI'] > 0]
+
+def normalise(merged, region_prefixes, minmax_path):
+    normalised, params = normalisation.normalise_columns_byYear_Region(
+        merged.copy(), region_prefixes=region_prefixes, return_params=True
+        )
+    normalisation.save_minmax(params, minmax_path)
+    return normalised.drop(['year', 'region'], axis=1)
+
+#random 80/20 split of the year-field_id groups, stratified by region and satellite as in 5_merge_and_split.py
+def split_train_validation(normalised, seed, stratify_by):
+    training_rows, validation_rows = splitting.train_validation_indices(normalised, seed=seed, stratify_by=stratify_by)
+    return normalised.iloc[training_rows], normalised.iloc[validation_rows]
+
+def train_isolation_forest(split, **parameters):
+    training_data = features.calculate_valley(split[0].copy()).drop(columns=['year'])
+    model = IsolationForest(n_jobs=-1, **parameters)
+    model.fit(training_data[pipeline.ANOMALY_INPUTS])
+    return model
+
+def remove_outliers(split, model):
+    return pipeline.remove_outliers(split[1], model)
+
+def smooth(cleaned, window_length, polyorder):
+    return pipeline.smooth_series(cleaned, window_length, polyorder, short_groups='filter')
+
+def detect_cuts(smoothed, threshold, excluded_months):
+    return cuts.detect_cuts(smoothed, threshold, excluded_months)
+
+#the DAG
+#mask_dove starts its own process pool and therefore runs alone
+stages = [
+    runner.Stage('mask_dove', mask_dove_images, params={'input_directory': dove_images, 'output_directory': masked_images},
+                 files=[dove_images], exclusive=True),
+    runner.Stage('prepare_Planet', extract_planet, ['mask_dove'],
+                 {'masked_directory': masked_images, 'metadata_path': metadata_files, 'fields': field_shapefile},
+                 files=[metadata_files, field_shapefile]),
+    runner.Stage('prepare_Lan7', load_satellite, params={'input_directory': lan7_fragments, 'sat_name': 'Lan7'},
+                 files=[lan7_fragments]),
+    runner.Stage('prepare_Lan8', load_satellite,
+                 params={'input_directory': lan8_fragments, 'sat_name': 'Lan8', 'date_format': '%d/%m/%Y'},
+                 files=[lan8_fragments]),
+    runner.Stage('prepare_Sen2', load_satellite, params={'input_directory': sen2_fragments, 'sat_name': 'Sen2'},
+                 files=[sen2_fragments]),
+    runner.Stage('merge', merge_satellites, ['prepare_Sen2', 'prepare_Planet', 'prepare_Lan8', 'prepare_Lan7'],
+                 {'priority': SENSOR_PRIORITY}),
+    runner.Stage('normalise', normalise, ['merge'],
+                 {'region_prefixes': REGION_PREFIXES, 'minmax_path': r'path\to\minmax_parameters.csv'}),
+    runner.Stage('split', split_train_validation, ['normalise'], {'seed': 42, 'stratify_by': STRATIFY_BY}),
+    runner.Stage('isolation_forest', train_isolation_forest, ['split'], IF_PARAMETERS),
+    runner.Stage('remove_outliers', remove_outliers, ['split', 'isolation_forest']),
+    runner.Stage('smooth', smooth, ['remove_outliers'], SG_PARAMETERS),
+    runner.Stage('cuts', detect_cuts, ['smooth'], CUT_PARAMETERS),
+]
+
+#apply function
+#the guard is needed for the process pool of the Dove masking on Windows
+if __name__ == '__main__':
+    results = runner.run_stages(stages, cache_directory, targets=['smooth', 'cuts'], max_workers=4, report=run_report)
+
+    storage.save_dataset(
+        results['smooth'], storage.dataset_path(r'path\to\final\dataset\validation_dataset_SG', DATASET_FORMAT), DATASET_FORMAT
+        )
+    results['cuts'].to_csv(r'path\to\cutting_dates.csv', index=False)
+    run_report.save()
@@ -0,0 +1,51 @@
+#the following python modules need to be installed:
+import pandas as pd
+from mowing import sentinel2, storage #local modules of this repository
+
+#offline alternative to 3_sentinel-2-preprocessing.py for locally stored Sentinel-2 L2A products
+#the s2cloudless cloud and shadow mask (CLD_PRB_THRESH, NIR_DRK_THRESH, CLD_PRJ_DIST, BUFFER) is computed
+#with NumPy (see mowing/sentinel2.py): the cloud shadows are found by shifting the cloud mask along the
+#solar azimuth, and the NDVI median of every field is calculated directly from the masked scenes
+
+#######################################
+############## PARAMETERS #############
+#######################################
+
+#scene index: CSV file with one row per scene and the columns
+#date, B4, B8, SCL, cloud_probability (paths of the rasters) and solar_azimuth (MEAN_SOLAR_AZIMUTH_ANGLE)
+#products of processing baseline 04.00 or later (from 2022) store reflectance + 1000: add the column
+#boa_add_offset (BOA_ADD_OFFSET of the product metadata, -1000) or processing_baseline for these scenes
+scene_index = r'path\to\sentinel2\scene_index.csv'
+
+#field polygons and the name of their field ID column
+field_shapefile = r'path\to\fields.shp'
+fieldIdColumn = 'fid'
+
+#masking parameters specified by Braaten (2022), as in 3_sentinel-2-preprocessing.py
+BUFFER = 7
+CLD_PRB_THRESH = 65
+NIR_DRK_THRESH = 0.15
+CLD_PRJ_DIST = 1
+
+#filter the scenes by date range and months (March to July)
+START_DATE = '2017-03-01'
+END_DATE = '2023-07-31'
+
+#######################################
+############# EXTRACTION ##############
+#######################################
+
+#apply function
+#scenes are processed in parallel (processes=None uses all cores); the guard is needed on Windows
+if __name__ == '__main__':
+    scenes = sentinel2.read_scene_index(scene_index)
+    scene_dates = pd.to_datetime(scenes['date'])
+    scenes = scenes[scene_dates.between(START_DATE, END_DATE) & scene_dates.dt.month.between(3, 7)]
+
+    sen2_ndvi = sentinel2.extract_sentinel2_ndvi(
+        scenes, field_shapefile, field_id_column=fieldIdColumn, processes=None,
+        cld_prb_thresh=CLD_PRB_THRESH, nir_drk_thresh=NIR_DRK_THRESH, cld_prj_dist=CLD_PRJ_DIST, buffer=BUFFER
+        )
+
+    #save NDVI time series with the columns date, NDVI, field_id and sat_name
+    storage.save_dataset(sen2_ndvi, r'path\to\S2_2017_2023.csv', 'csv')
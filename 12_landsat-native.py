@@ -0,0 +1,39 @@
+#the following python modules need to be installed:
+import glob
+import os
+import pandas as pd
+from mowing import landsat, storage #local modules of this repository
+
+#Landsat-7 and Landsat-8 NDVI time series at the native 30 m resolution, for locally stored
+#Collection 2 Level-2 products, as an alternative to 1_landsat-7-preprocessing.js and 2_landsat-8-preprocessing.js
+#the same QA_PIXEL/QA_RADSAT masks and scale/offset are applied to both sensors (landsat.SENSORS);
+#instead of resampling every scene to 10 m, each 30 m pixel is weighted by the share of its area inside
+#the field, and the field NDVI is the weighted median (see mowing/landsat.py)
+
+#directory with one unpacked product folder per scene, named by product ID (e.g. LC08_L2SP_193026_20200501_...)
+product_archive = r'path\to\landsat\products'
+
+#field polygons and the name of their field ID column
+field_shapefile = r'path\to\fields.shp'
+fieldIdColumn = 'fid'
+
+#date range and months (March to July), as in the Landsat scripts
+START_DATE = '2017-03-01'
+END_DATE = '2023-07-31'
+
+#apply function
+#products are processed in parallel (processes=None uses all cores); the guard is needed on Windows
+if __name__ == '__main__':
+    product_directories = [
+        directory for directory in glob.glob(os.path.join(product_archive, 'L[EC]0[78]_*'))
+        if START_DATE <= f"{landsat.date_of_product(os.path.basename(directory)):%Y-%m-%d}" < END_DATE
+        and 3 <= landsat.date_of_product(os.path.basename(directory)).month <= 7
+    ]
+
+    landsat_ndvi = landsat.extract_landsat_ndvi(
+        product_directories, field_shapefile, field_id_column=fieldIdColumn, processes=None
+        )
+
+    #save one NDVI time series per sensor with the columns date, NDVI, field_id and sat_name
+    for sat_name, sensor_ndvi in landsat_ndvi.groupby('sat_name'):
+        storage.save_dataset(sensor_ndvi, rf'path\to\{sat_name}_2017_2023.csv', 'csv')
@@ -0,0 +1,46 @@
+#the following python modules need to be installed:
+import pandas as pd
+from mowing import storage, sweep #local modules of this repository
+
+#calibration of the detection parameters of scripts 6 and 7 against reference mowing dates, e.g. for a new region
+#every combination is scored with a tolerance of ± 1 observation (recall, precision and F1); upstream results are
+#shared: one Isolation Forest per valley threshold, one outlier removal per contamination value and one
+#smoothing per SG setting, and the smoothing and scoring run in a pool of processes (see mowing/sweep.py)
+
+#storage format of the training and validation datasets: 'csv' or 'parquet' (see 5_merge_and_split.py)
+DATASET_FORMAT = 'csv'
+
+#reference mowing dates with the columns field_id and date
+reference_dates = r'path\to\reference_mowing_dates.csv'
+
+#values to try, as in the study: valley -0.1, contamination 0.06, SG 5/2, cut threshold -0.1, March and April excluded
+PARAMETER_GRID = {
+    'valley_threshold': [-0.15, -0.1, -0.05],
+    'contamination': [0.02, 0.04, 0.06, 0.08, 0.1],
+    'window_length': [5, 7, 9],
+    'polyorder': [2, 3],
+    'cut_threshold': [-0.15, -0.1, -0.05],
+    'excluded_months': [(3, 4), (3,), ()],
+}
+
+#None runs the whole grid; a number runs a random search over that many combinations of the grid
+RANDOM_COMBINATIONS = None
+
+#apply function
+#the guard is needed on Windows, where the worker processes import this script
+if __name__ == '__main__':
+    training_data = storage.load_dataset(storage.dataset_path(r'path\to\training', DATASET_FORMAT))
+    validation_data = storage.load_dataset(storage.dataset_path(r'path\to\validation', DATASET_FORMAT))
+    reference = pd.read_csv(reference_dates, parse_dates=['date'], dayfirst=True)
+
+    if RANDOM_COMBINATIONS is None:
+        combinations = sweep.grid_combinations(PARAMETER_GRID)
+    else:
+        combinations = sweep.random_combinations(PARAMETER_GRID, RANDOM_COMBINATIONS, seed=42)
+    print("Number of combinations:", len(combinations))
+
+    results = sweep.run_sweep(training_data, validation_data, reference, combinations, processes=None)
+    print(results.head(10).to_string(index=False))
+
+    #save all combinations with their scores, best F1 first
+    results.to_csv(r'path\to\parameter_sweep.csv', index=False)
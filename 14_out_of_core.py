@@ -0,0 +1,66 @@
+#the following python modules need to be installed:
+from mowing import instrumentation, normalisation, outofcore, preparation, storage #local modules of this repository
+
+#stages 5 to 7 for datasets larger than the memory of the machine (see mowing/outofcore.py)
+#the CSV fragments of every satellite are read a few hundred files at a time, prepared as in 5_merge_and_split.py
+#and written into partitions on disk; merge, normalisation (min and max of all partitions first, then applied
+#to each partition), outlier removal, smoothing and cut detection then hold one partition per process in memory
+
+#working directory for the partitions; the smoothed series are written to its 'smoothed' folder
+work_directory = r'path\to\out_of_core'
+
+#input directories of the exported satellite observations (CSV fragments) and the Planet dataset
+lan7_fragments = r'input\path\to\lan7\csv\fragments'
+lan8_fragments = r'input\path\to\lan8\csv\fragments'
+sen2_fragments = r'input\path\to\sen2\csv\fragments'
+planet_dataset = r'path\to\planet\csv'
+
+#partitions by year and region, or by a hash of the field_id into a number of buckets, e.g. PARTITIONS = 256;
+#choose enough buckets that one partition per process fits in memory
+PARTITIONS = ('year', 'region')
+FILES_PER_CHUNK = 200
+ROWS_PER_CHUNK = 1000000
+PROCESSES = 4
+
+#cuts are detected in the validation field-seasons, as in 6_IF_and_SG.py, or in all of them ('all')
+DETECT_ON = 'validation'
+
+#record the passes in a JSON run report (see mowing/instrumentation.py)
+RUN_REPORT = r'path\to\run_reports\14_out_of_core.json'
+run_report = instrumentation.RunReport('14_out_of_core', RUN_REPORT)
+
+#function to read the fragments of one satellite chunk by chunk and prepare every chunk for merging
+#(repeated daily Sen2 observations can be in different chunks: their medians are computed per partition)
+def prepared_chunks(input_directory, sat_name, date_format=None):
+    for raw in storage.iter_fragments(storage.list_fragments(input_directory), files_per_chunk=FILES_PER_CHUNK):
+        raw['sat_name'] = sat_name
+        if sat_name == 'Sen2':
+            yield preparation.sentinel2_observations(raw)
+        else:
+            yield preparation.prepare_landsat(raw, date_format=date_format)
+
+#function to read the Planet dataset (daily medians of 4_dove-preprocessing.py) ROWS_PER_CHUNK rows at a time
+def planet_chunks(path):
+    for raw in storage.iter_dataset(path, rows_per_chunk=ROWS_PER_CHUNK):
+        yield preparation.prepare_planet(raw)
+
+#apply function
+#the guard is needed on Windows, where the worker processes import this script
+if __name__ == '__main__':
+    sources = [
+        prepared_chunks(sen2_fragments, 'Sen2'),
+        planet_chunks(planet_dataset),
+        prepared_chunks(lan8_fragments, 'Lan8', date_format="%d/%m/%Y"),
+        prepared_chunks(lan7_fragments, 'Lan7'),
+    ]
+
+    cut_dates, minmax_parameters, model_IF = outofcore.run_out_of_core(
+        sources, work_directory, partitions=PARTITIONS, detect_on=DETECT_ON, processes=PROCESSES, report=run_report
+        )
+
+    #save the min-max parameters for incremental updates and the cutting dates
+    normalisation.save_minmax(minmax_parameters, r'path\to\minmax_parameters.csv')
+    storage.save_dataset(cut_dates, storage.dataset_path(r'path\to\cutting_dates', 'csv'), 'csv')
+    print("Number of year-field_id combinations:", len(cut_dates))
+
+    run_report.save()
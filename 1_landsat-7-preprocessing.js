@@ -65,13 +65,17 @@ var reference_S2_10m = ee.ImageCollection("COPERNICUS/S2_SR")
     ['B4', 'B3', 'B2', 'B8']
   );
 
+//projection of the reference, looked up once instead of for every image
+//(native 30 m field statistics without resampling: see mowing/landsat.py)
+var reference_projection = reference_S2_10m.first().projection();
+
 //resampling function using bicubic interpolation
 var resampleLandsat = function(image) {
   var resampled = image
     .resample('bicubic')
     .reproject({
-      crs: reference_S2_10m.first().projection().crs(),
-      scale: reference_S2_10m.first().projection().nominalScale() //scale 10
+      crs: reference_projection.crs(),
+      scale: reference_projection.nominalScale() //scale 10
     });
   return resampled.copyProperties(image, image.propertyNames());
 };
@@ -128,25 +132,27 @@ var l7_masked = l7_masked.map(addIndices);
 ///////////////////////////////////////
 
 //function to calculate NDVI medians for each field in shape file
+//with one reduceRegions call per image over all fields (instead of one reduceRegion per field and image)
 //and define information to be added to the CSV file
-var region_list = region.toList(region.size());
-var forExport = region_list.map(function (ele) {
-  var l7_masked_export = l7_masked.filter(ee.Filter.bounds(ee.Feature(ele).geometry()));
-  var getData = l7_masked_export.toList(l7_masked_export.size()).map(function (e) {
-    var date = ee.Date(ee.Image(e).get("system:time_start")).format().slice(0,10);
-    var NDVI = ee.Image(e).reduceRegion(ee.Reducer.median(), ee.Feature(ele).geometry()).get('NDVI');
-    var ft = ee.Feature(null, {'date': date, 
-                               'NDVI': NDVI,
-                               'field_id': ee.Feature(ele).get('fid') //change 'fid' to the name of the field ID column in the shapefile being processed
+//for large field assets, export chunks of fields and dates as separate tasks (see mowing/gee_export.py)
+var forExport = l7_masked.filterBounds(region.geometry()).map(function (img) {
+  var date = ee.Date(img.get("system:time_start")).format().slice(0,10);
+  var medians = img.select('NDVI').reduceRegions({
+    collection: region,
+    reducer: ee.Reducer.median().setOutputs(['NDVI']),
+    scale: 10 //grid of the resampled images (see resampleLandsat)
+  });
+  return medians.filter(ee.Filter.notNull(['NDVI'])).map(function (field) {
+    return ee.Feature(null, {'date': date,
+                             'NDVI': field.get('NDVI'),
+                             'field_id': field.get('fid') //change 'fid' to the name of the field ID column in the shapefile being processed
     });
-    return ft;
   });
-  return getData;
 });
 
 //export NDVI time series as CSV to a Google Drive folder
 Export.table.toDrive({
-    collection: ee.FeatureCollection(forExport.flatten()),
+    collection: forExport.flatten(),
     selectors: 'date, NDVI, field_id',
     description: 'L7_2017_2023', //define a name for the CSV
     folder: 'NDVI_timeseries' //specify the destination folder. The folder needs to exist in the Google Drive linked to the GEE account.
@@ -1,5 +1,6 @@
 #the following python modules need to be installed:
 import ee
+from mowing import gee_export #local module of this repository
 
 #authenticate the GEE account and initialise the API
 ee.Authenticate()
@@ -51,6 +52,17 @@ fieldIdColumn = 'fid' #change 'fid' to the name of the field ID column in the sh
 description = 'S2_2017_2023' #define a name for the CSV
 folder_name = 'NDVI_timeseries' #specify the destination folder. The folder needs to exist in the Google Drive linked to the GEE account.
 
+#export mode:
+#'chunked' exports chunks of fields and dates as separate tasks, with one reduceRegions call per image
+#over the fields of a chunk; several tasks run at once, failed tasks are retried with backoff and an
+#interrupted run resumes from the manifest (see mowing/gee_export.py)
+#'single' exports everything in one task with one reduceRegion call per field and image (former export)
+EXPORT_MODE = 'chunked'
+FIELDS_PER_CHUNK = 500
+MONTHS_PER_CHUNK = 12
+MAX_CONCURRENT_TASKS = 3
+export_manifest = description + '_manifest.json' #state of the chunks, to resume an interrupted export
+
 #function to filter image collection
 def get_s2_sr_cld_col(aoi, start_date, end_date):
     s2_sr_col = (ee.ImageCollection('COPERNICUS/S2_SR_HARMONIZED')
@@ -165,4 +177,13 @@ def exportTimeSeriesToCSV(description, s2CloudMasked, fieldIdColumn):
     task.start()
 
 #start export
-exportTimeSeriesToCSV(description, IC_withIndices, fieldIdColumn)
+#the chunk CSV files in the Drive folder can be combined with combine_csv_files in 5_merge_and_split.py
+if EXPORT_MODE == 'chunked':
+    backend = gee_export.EarthEngineBackend(IC_withIndices, fields, fieldIdColumn, folder_name, scale=10)
+    chunks = gee_export.plan_chunks(
+        backend.field_ids(), START_DATE, END_DATE,
+        fields_per_chunk=FIELDS_PER_CHUNK, months_per_chunk=MONTHS_PER_CHUNK, prefix=description
+        )
+    gee_export.run_exports(backend, chunks, export_manifest, max_concurrent=MAX_CONCURRENT_TASKS)
+else:
+    exportTimeSeriesToCSV(description, IC_withIndices, fieldIdColumn)
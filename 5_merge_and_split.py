@@ -2,40 +2,27 @@
 import os
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-import re
-import random
+from mowing import deduplication, instrumentation, normalisation, preparation, splitting, storage #local modules of this repository
 
-#functions for minmax normalisation
-def extract_region(field_id):
-    #extract region code from the field_id
-    #KM, LM, AL in this study
-    match = re.match(r'^(KM|LM|AL)', field_id)
-    if match:
-        return match.group()
-    return None
-
-def normalise_columns_byYear_Region(df):
-    df['date'] = pd.to_datetime(df['date'], dayfirst=True)
-    df['year'] = df['date'].dt.year
-    
-    normalised_df = df.copy()
-    
-    #extract region from field_id and create a new column 'region'
-    normalised_df['region'] = df['field_id'].apply(extract_region)
-    
-    groups = normalised_df.groupby(['year', 'region'])
-
-    column = 'NDVI'
-    scaler = MinMaxScaler()
-
-    column_values = groups[column].transform(
-        lambda x: scaler.fit_transform(x.values.reshape(-1, 1)).flatten() if x.notnull().any() else x
-    )
-    
-    normalised_df[column] = column_values
+#storage format of the intermediate datasets:
+#'csv' writes the former CSV files; set to 'parquet' to store typed columns (datetime64 dates,
+#categorical field_id/sat_name, float32 NDVI), with the training and validation data partitioned by year and region
+#(the same format has to be set in the following scripts)
+DATASET_FORMAT = 'csv'
 
-    return normalised_df
+#record wall time, CPU time, peak memory and row counts (per satellite) of every stage in a JSON
+#run report (see mowing/instrumentation.py); PROFILE = 'cprofile' or 'pyinstrument' also profiles the stages
+RUN_REPORT = r'path\to\run_reports\5_merge_and_split.json'
+PROFILE = None
+run_report = instrumentation.RunReport('5_merge_and_split', RUN_REPORT, profile=PROFILE)
+
+#functions for minmax normalisation
+#implemented in mowing/normalisation.py: the region is looked up from the field_id prefix
+#in one vectorised pass (REGION_PREFIXES, KM, LM, AL in this study), min and max are computed once
+#per year-region group and can be stored, so that new observations are normalised incrementally
+#with normalisation.normalise_new_observations instead of re-normalising the whole dataset
+REGION_PREFIXES = ('KM', 'LM', 'AL')
+normalise_columns_byYear_Region = normalisation.normalise_columns_byYear_Region
 
 #function to clean date-field_id duplicates in dataframe
 #usually from overlapping observations
@@ -62,21 +49,32 @@ def clean_duplicates(df):
 
 #function to merge all observations from one satellite into a single csv file
 #to be used if each satellite has observations split into several csv files
-def combine_csv_files(input_directory, output_directory, sat_name):
-    dfs = []
-    
-    for filename in os.listdir(input_directory):
-        if filename.endswith(".csv"):
-            file_path = os.path.join(input_directory, filename)
-            df = pd.read_csv(file_path)
-            dfs.append(df)
-    
-    if dfs:
-        combined_df = pd.concat(dfs, ignore_index=True)
+#fragments are read concurrently and concatenated once (see mowing/storage.py)
+#with files_per_chunk, the fragments are written chunk by chunk and the combined file is not kept in memory
+#file_format sets the format of the combined file ('csv' or 'parquet')
+def combine_csv_files(input_directory, output_directory, sat_name, usecols=None, dtype=None, files_per_chunk=None, file_format=DATASET_FORMAT):
+    csv_files = storage.list_fragments(input_directory)
+
+    if csv_files:
+        output_filename = storage.dataset_path(os.path.join(output_directory, f"{sat_name}_complete"), file_format)
+
+        if files_per_chunk and file_format == 'csv':
+            storage.write_fragments_to_csv(csv_files, output_filename, files_per_chunk, usecols, dtype, {'sat_name': sat_name})
+            print(f"Combined CSV file saved to '{output_filename}'")
+            return None
+
+        if files_per_chunk:
+            #the output of an earlier run is removed first, only the chunks of this run are appended
+            storage.remove_dataset(output_filename)
+            for chunk in storage.iter_fragments(csv_files, files_per_chunk, usecols, dtype):
+                storage.save_dataset(chunk.assign(sat_name=sat_name), output_filename, file_format, partition_by=['sat_name'], append=True)
+            print(f"Combined CSV file saved to '{output_filename}'")
+            return None
+
+        combined_df = storage.read_fragments(csv_files, usecols, dtype)
         combined_df['sat_name'] = sat_name
-        
-        output_filename = os.path.join(output_directory, f"{sat_name}_complete.csv")
-        combined_df.to_csv(output_filename, index=False)
+
+        storage.save_dataset(combined_df, output_filename, file_format)
         print(f"Combined CSV file saved to '{output_filename}'")
         
         return combined_df
@@ -94,32 +92,18 @@ def check_duplicates(df):
         print("No duplicate date-field_id combinations found.")
 
 #prepare Lan7 dataset for merging
-landsat7_raw = combine_csv_files(
-    r'input\path\to\lan7\csv\fragments',
-    r'output\path\to\merged\lan7\csv',
-    "Lan7"
-    )
+with run_report.stage('load_Lan7') as stage:
+    landsat7_raw = combine_csv_files(
+        r'input\path\to\lan7\csv\fragments',
+        r'output\path\to\merged\lan7\csv',
+        "Lan7"
+        )
+    stage.output(landsat7_raw)
 
 #convert 'date' column to datetime and sort by date
-landsat7_raw = (
-    landsat7_raw
-    .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
-    .sort_values('date')
-)
-
-#columns containing band and index values
-landsat7_column_range = list(landsat7_raw.columns[1:14])
-
-#drop rows with NA values in the specified columns, rename columns, and select columns
-landsat7_processed = (
-    landsat7_raw
-    .dropna(subset=landsat7_column_range)
-    .rename(columns={"Satellite": "sat_name"})
-    .loc[:, ["date", "NDVI", "field_id", "sat_name"]]
-)
-
-#check for duplicate timestamps by field ID
-check_duplicates(landsat7_processed)
+#drop rows with NA values in the band and index columns, rename columns, and select columns
+#(see mowing/preparation.py)
+landsat7_processed = preparation.prepare_landsat(landsat7_raw)
 
 #check for remaining empty NDVI values
 print("Number of NA values in L7 NDVI column:", landsat7_processed['NDVI'].isna().sum())
@@ -127,32 +111,17 @@ print("Number of NA values in L7 NDVI column:", landsat7_processed['NDVI'].isna(
 landsat7_processed.info()
 
 #prepare Lan8 dataset for merging
-landsat8_raw = combine_csv_files(
-    r'input\path\to\lan8\csv\fragments',
-    r'output\path\to\merged\lan8\csv',
-    "Lan8"
-    )
+with run_report.stage('load_Lan8') as stage:
+    landsat8_raw = combine_csv_files(
+        r'input\path\to\lan8\csv\fragments',
+        r'output\path\to\merged\lan8\csv',
+        "Lan8"
+        )
+    stage.output(landsat8_raw)
 
 #convert 'date' column to datetime and sort by date
-landsat8_raw = (
-    landsat8_raw
-    .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'], format = "%d/%m/%Y")))
-    .sort_values('date')
-)
-
-#columns containing band and index values
-landsat8_column_range = list(landsat8_raw.columns[1:14])
-
-#drop rows with NA values in the specified columns, rename columns, and select columns
-landsat8_processed = (
-    landsat8_raw
-    .dropna(subset=landsat8_column_range)
-    .rename(columns={"Satellite": "sat_name"})
-    .loc[:, ["date", "NDVI", "field_id", "sat_name"]]
-)
-
-#check for duplicate timestamps by field ID
-check_duplicates(landsat8_processed)
+#drop rows with NA values in the band and index columns, rename columns, and select columns
+landsat8_processed = preparation.prepare_landsat(landsat8_raw, date_format="%d/%m/%Y")
 
 #check for remaining empty NDVI values
 print("Number of NA values in L8 NDVI column:", landsat8_processed['NDVI'].isna().sum())
@@ -162,14 +131,9 @@ landsat8_processed.info()
 #prepare Planet dataset for merging
 #for this satellite, only load table, convert 'date' column to datetime and sort by date
 #other processes already occurred in previous scripts
-planet_processed = (
-    pd.read_csv(r'path\to\planet\csv')
-    .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
-    .sort_values('date')
-)
-
-#check for duplicate timestamps by field ID
-check_duplicates(planet_processed)
+with run_report.stage('load_Planet') as stage:
+    planet_processed = preparation.prepare_planet(storage.load_dataset(r'path\to\planet\csv'))
+    stage.output(planet_processed)
 
 #check for remaining empty NDVI values
 print("Number of NA values in Planet NDVI column:", planet_processed['NDVI'].isna().sum())
@@ -177,37 +141,19 @@ print("Number of NA values in Planet NDVI column:", planet_processed['NDVI'].isn
 planet_processed.info()
 
 #prepare Sen2 dataset for merging
-sentinel2_raw = combine_csv_files(
-    r'input\path\to\sen2\csv\fragments',
-    r'output\path\to\merged\sen2\csv',
-    "Sen2"
-    )
+with run_report.stage('load_Sen2') as stage:
+    sentinel2_raw = combine_csv_files(
+        r'input\path\to\sen2\csv\fragments',
+        r'output\path\to\merged\sen2\csv',
+        "Sen2"
+        )
+    stage.output(sentinel2_raw)
 
 #convert 'date' column to datetime and sort by date
-sentinel2_raw = (
-    sentinel2_raw
-    .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
-    .sort_values('date')
-)
-
-#columns containing band and index values
-sentinel2_column_range = list(sentinel2_raw.columns[1:21])
-
-#drop rows with NA values in the specified columns, rename columns, and select columns
+#drop rows with NA values in the band and index columns, rename columns, and select columns
 #calculate median of duplicate "date" and "field_id" groups
 #since sen2 had repeated daily observations for our study areas
-sentinel2_processed = (
-    sentinel2_raw
-    .dropna(subset=sentinel2_column_range)
-    .groupby(['date', 'field_id'], as_index=False)[sentinel2_raw.columns[1:22]]
-    .median()
-    .pipe(lambda x: x[[c for c in x if c != 'field_id'] + ['field_id']])
-    .assign(sat_name="Sen2")
-    .loc[:, ["date", "NDVI", "field_id", "sat_name"]]
-)
-
-#check for duplicate timestamps by field ID
-check_duplicates(sentinel2_processed)
+sentinel2_processed = preparation.prepare_sentinel2(sentinel2_raw)
 
 #check for remaining empty NDVI values
 print("Number of NA values in S2 NDVI column:", sentinel2_processed['NDVI'].isna().sum())
@@ -215,20 +161,18 @@ print("Number of NA values in S2 NDVI column:", sentinel2_processed['NDVI'].isna
 sentinel2_processed.info()
 
 #merge processed dataframes
-def merge_dfs(dataframes_list):
-    merged_df = pd.concat(dataframes_list, ignore_index=True)
-    unique_df = merged_df.drop_duplicates(subset=['date', 'field_id'], keep='first')
-    sorted_df = unique_df.sort_values(by=['date', 'field_id'])
-    return sorted_df
-
-#define list of dfs to merge
-#order matters for hierarchy of timestamps to be kept in case of duplicate dates
-input_list = [sentinel2_processed, planet_processed, landsat8_processed, landsat7_processed]
+#date-field_id collisions are resolved in one pass by satellite priority (see mowing/deduplication.py),
+#same-satellite duplicates included; the collisions per satellite pair are reported
+merge_dfs = deduplication.merge_dfs
 
-merged_satellites = merge_dfs(input_list)
+#define list of dfs to merge and the hierarchy of timestamps to be kept in case of duplicate dates
+#the order of input_list does not matter
+SENSOR_PRIORITY = ('Sen2', 'Planet', 'Lan8', 'Lan7')
+input_list = [sentinel2_processed, planet_processed, landsat8_processed, landsat7_processed]
 
-#check for duplicate timestamps by field ID
-check_duplicates(merged_satellites)
+with run_report.stage('merge', input_list) as stage:
+    merged_satellites = merge_dfs(input_list, priority=SENSOR_PRIORITY)
+    stage.output(merged_satellites)
 
 print("Final df length:", len(merged_satellites))
 
@@ -248,82 +192,43 @@ print("Unique year-field_id combinations:", len(unique_combinations))
 merged_satellites_filtered = merged_satellites[merged_satellites['NDVI'] > 0]
 
 #normalise merged df
-normalised_merged_satellites = normalise_columns_byYear_Region(merged_satellites_filtered).drop(['year', 'region'], axis=1)
+#and save the min-max parameters of every year-region group for incremental updates
+with run_report.stage('normalisation', merged_satellites_filtered) as stage:
+    normalised_merged_satellites, minmax_parameters = normalise_columns_byYear_Region(
+        merged_satellites_filtered, region_prefixes=REGION_PREFIXES, return_params=True
+        )
+    stage.output(normalised_merged_satellites)
+normalised_merged_satellites = normalised_merged_satellites.drop(['year', 'region'], axis=1)
+normalisation.save_minmax(minmax_parameters, r'path\to\minmax_parameters.csv')
 
 normalised_merged_satellites.info()
 
 #function to create training and validation datasets
-#with a random 80/20 split
-def generate_train_validation_data(dataframe, seed=42):
-    #set the seed
-    random.seed(seed)
-
-    #assign group numbers to each combination of field_id and year
-    dataframe['group_nr'] = dataframe.groupby(['field_id', pd.to_datetime(dataframe['date']).dt.year]).ngroup()
-
-    #determine the number of groups for training data
-    num_train_groups = int(dataframe['group_nr'].nunique() * 0.8)
-
-    #group dataframe by 'group_nr'
-    field_groups = dataframe.groupby('group_nr')
-
-    #shuffle the group_nrs
-    group_nrs = list(field_groups.groups.keys())
-    random.shuffle(group_nrs)
-
-    #initialise train and validation groups
-    train_groups = []
-    validation_groups = []
-
-    #split data into train and validation groups
-    for group_nr in group_nrs:
-        group = field_groups.get_group(group_nr)
-        if len(train_groups) < num_train_groups:
-            train_groups.append(group)
-        else:
-            validation_groups.append(group)
-
-    #concatenate train and validation groups into train and validation data
-    training_data = pd.concat([pd.DataFrame(group, columns=dataframe.columns) for group in train_groups])
-    validation_data = pd.concat([pd.DataFrame(group, columns=dataframe.columns) for group in validation_groups])
-
-    return training_data, validation_data
+#with a random 80/20 split of whole field_id-year groups
+#the groups are shuffled with one permutation over integer group codes (see mowing/splitting.py),
+#and the same groups as before are selected for the same seed;
+#stratify_by=STRATIFY_BY keeps the share of every region and satellite the same in both datasets instead
+#for k-fold cross-validation, splitting.iter_folds yields the row indices of every fold instead
+STRATIFY_BY = ('region', 'sat_name')
+
+def generate_train_validation_data(dataframe, seed=42, stratify_by=None):
+    training_rows, validation_rows = splitting.train_validation_indices(
+        dataframe, train_share=0.8, seed=seed, stratify_by=stratify_by
+        )
+    return dataframe.iloc[training_rows], dataframe.iloc[validation_rows]
 
 #apply function to merged and normalised df
-training_data, validation_data = generate_train_validation_data(normalised_merged_satellites)
+with run_report.stage('train_validation_split', normalised_merged_satellites) as stage:
+    training_data, validation_data = generate_train_validation_data(normalised_merged_satellites)
+    stage.note(training_rows=len(training_data), validation_rows=len(validation_data))
 
 training_data.info()
 validation_data.info()
 
 #function check validity of training/validation split
+#date-field_id observations and field_id-year groups are compared as integer keys
 def check_split_validity(training_df, validation_df, source_df):
-    training_df_combinations = set(zip(training_df['date'], training_df['field_id']))
-    validation_df_combinations = set(zip(validation_df['date'], validation_df['field_id']))
-
-    common_combinations = training_df_combinations.intersection(validation_df_combinations)
-    is_sum_equal_df = len(training_df) + len(validation_df) == len(source_df)
-
-    def calculate_unique_df(input_df):
-        unique_df = (
-            input_df
-            .pipe(lambda df: df.assign(date=pd.to_datetime(df['date'], format='%d/%m/%Y')))
-            .assign(year=lambda df: df['date'].dt.year)
-            .groupby(['year', 'field_id'])
-            .size()
-            .reset_index(name='count')
-            .drop(columns=['year'])
-        )
-        return unique_df
-
-    unique_training = calculate_unique_df(training_df)
-    unique_validation = calculate_unique_df(validation_df)
-    unique_source = calculate_unique_df(source_df)
-
-    is_sum_combinations_equal = (
-        len(unique_training) + len(unique_validation) == len(unique_source)
-    )
-
-    if is_sum_combinations_equal and is_sum_equal_df and not common_combinations:
+    if splitting.check_split(training_df, validation_df, source_df)['valid']:
         return "Split is valid"
     else:
         return "Split is not valid"
@@ -332,8 +237,14 @@ def check_split_validity(training_df, validation_df, source_df):
 check_split_validity(training_data, validation_data, normalised_merged_satellites)
 
 #save training and validation dataif wished
-training_data = training_data.drop('group_nr', axis=1)
-validation_data = validation_data.drop('group_nr', axis=1)
 
-training_data.to_csv(r'path\to\training\csv', index=False)
-validation_data.to_csv(r'path\to\validation\csv', index=False)
+storage.save_dataset(
+    training_data, storage.dataset_path(r'path\to\training', DATASET_FORMAT),
+    DATASET_FORMAT, partition_by=['year', 'region']
+    )
+storage.save_dataset(
+    validation_data, storage.dataset_path(r'path\to\validation', DATASET_FORMAT),
+    DATASET_FORMAT, partition_by=['year', 'region']
+    )
+
+run_report.save()
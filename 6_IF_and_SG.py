@@ -4,97 +4,99 @@ from scipy.ndimage import gaussian_filter1d
 from sklearn.ensemble import IsolationForest
 import os
 from scipy import signal
+from mowing import features, fieldseasons, instrumentation, models, storage #local modules of this repository
+
+#storage format of the intermediate datasets: 'csv' or 'parquet' (see 5_merge_and_split.py)
+DATASET_FORMAT = 'csv'
+
+#Isolation Forest models are kept in a registry together with a fingerprint of their training
+#data and settings (see mowing/models.py), and are only retrained when either changes
+model_registry = r'path\to\model\registry'
+
+#set to True to score with the registered model without loading the training dataset
+USE_REGISTERED_MODEL = False
+
+#record wall time, CPU time, peak memory and row counts of every stage in a JSON run report
+#(see mowing/instrumentation.py); PROFILE = 'cprofile' or 'pyinstrument' also profiles the stages
+RUN_REPORT = r'path\to\run_reports\6_IF_and_SG.json'
+PROFILE = None
+run_report = instrumentation.RunReport('6_IF_and_SG', RUN_REPORT, profile=PROFILE)
 
 #load training and validation datasets
 #validation dataset may be replaced by the official dataset for analysis
-training_data = pd.read_csv(
-    r'path\to\training\csv',
-    parse_dates=['date']
-    )
+if not USE_REGISTERED_MODEL:
+    training_data = storage.load_dataset(
+        storage.dataset_path(r'path\to\training', DATASET_FORMAT)
+        )
 
-validation_dataset = pd.read_csv(
-    r'path\to\validation\csv',
-    parse_dates=['date']
+validation_dataset = storage.load_dataset(
+    storage.dataset_path(r'path\to\validation', DATASET_FORMAT)
     )
 
 #calculate the valley anomaly input
-def calculate_valley(df):
-    df['valley'] = 0
-    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
-    df['year'] = df['date'].dt.year
-    df = df.sort_values('date')
-
-    grouped = df.groupby(['year', 'field_id'])
-
-    for (_, field_data) in grouped:
-        for i in range(len(field_data)):
-            if i == 0 or i == len(field_data) - 1:
-                df.loc[field_data.index[i], 'valley'] = 0
-            else:
-                diff_prev = field_data.iloc[i]['NDVI'] - field_data.iloc[i-1]['NDVI']
-                diff_next = field_data.iloc[i]['NDVI'] - field_data.iloc[i+1]['NDVI']
-                
-                if diff_prev <= -0.1 and diff_next <= -0.1:
-                    df.loc[field_data.index[i], 'valley'] = 1
-    
-    return df
+#vectorised implementation in mowing/features.py, same output as the former row-by-row loop
+calculate_valley = features.calculate_valley
 
 #apply engineered input on datasets
-training_data_wInputs = (
-    training_data
-    .pipe(calculate_valley)
-    .drop(columns=['year'])
-)
-
-validation_dataset_wInputs = (
-    validation_dataset
-    .pipe(calculate_valley)
-    .drop(columns=['year'])
-)
-
-training_data_wInputs.info()
+if not USE_REGISTERED_MODEL:
+    with run_report.stage('valley_training', training_data) as stage:
+        training_data_wInputs = (
+            training_data
+            .pipe(calculate_valley)
+            .drop(columns=['year'])
+        )
+        stage.output(training_data_wInputs)
+
+    training_data_wInputs.info()
+
+with run_report.stage('valley_validation', validation_dataset) as stage:
+    validation_dataset_wInputs = (
+        validation_dataset
+        .pipe(calculate_valley)
+        .drop(columns=['year'])
+    )
+    stage.output(validation_dataset_wInputs)
 
 validation_dataset_wInputs.info()
 
 #specify anomaly inputs for IF
 anomaly_inputs = ['NDVI', 'valley']
 
-#set contamination and random_state value
-model_IF = IsolationForest(contamination = 0.06, random_state = 42)
-
-#train model
-model_IF.fit(training_data_wInputs[anomaly_inputs])
-
-#compute anomaly labels
-validation_dataset_wInputs['anomaly'] = model_IF.predict(validation_dataset_wInputs[anomaly_inputs])
+#set contamination and random_state value, train model in parallel (n_jobs=-1 uses all cores)
+#or reuse the registered model trained on the same data with the same settings
+#models per region or satellite: models.load_or_train_groups(model_registry, training_data_wInputs, by='sat_name')
+with run_report.stage('isolation_forest_training', None if USE_REGISTERED_MODEL else training_data_wInputs):
+    if USE_REGISTERED_MODEL:
+        model_IF = models.load_model(model_registry)
+    else:
+        model_IF = models.load_or_train(
+            model_registry, training_data_wInputs, anomaly_inputs,
+            contamination = 0.06, random_state = 42, n_jobs = -1
+            )
+
+#compute anomaly labels in chunks of rows, with bounded memory
+with run_report.stage('isolation_forest_scoring', validation_dataset_wInputs) as stage:
+    validation_dataset_wInputs['anomaly'] = models.predict_chunked(
+        model_IF, validation_dataset_wInputs[anomaly_inputs], chunk_size=500000
+        )
+    stage.note(outliers=int((validation_dataset_wInputs['anomaly'] == -1).sum()))
 
 #function to calculate NDVI difference between current cell and the one two days before
-def calculate_temporal_features(df, value_column):
-    df['date'] = pd.to_datetime(df['date'])
-    df = df.sort_values('date')
-
-    # Initialise the new columns
-    df['dif_to_forelast'] = pd.NA
-
-    # Calculate the temporal features within each group
-    groups = df.groupby(['field_id', df['date'].dt.year])
-    
-    for _, data in groups:
-        data['dif_to_forelast'] = data[value_column].diff(periods=2)
-        
-        df.update(data)
-    
-    return df
+#grouped diff in mowing/features.py, computed in one linear pass over all field_id-year series
+#further lags can be requested at once, e.g. lags={'dif_to_last': 1, 'dif_to_forelast': 2}
+calculate_temporal_features = features.calculate_temporal_features
 
 #remove detected outliers
-cleaned_validation_dataset = (
-    validation_dataset_wInputs
-    .loc[validation_dataset_wInputs['anomaly'] != -1]                  # Remove outliers
-    .assign(date=pd.to_datetime(validation_dataset_wInputs['date']))   # Convert date to datetime
-    .sort_values(by='date')                                            # Sort by ascending date
-    .pipe(lambda x: calculate_temporal_features(x, 'NDVI'))            # Calculate temporal features without outliers
-    .loc[:, ["date", "field_id", "NDVI", "dif_to_forelast"]]           # Select relevant columns for further processing
-)
+#temporal features are only calculated once, on the smoothed values (see smooth_and_save_dataframes)
+with run_report.stage('outlier_removal', validation_dataset_wInputs) as stage:
+    cleaned_validation_dataset = (
+        validation_dataset_wInputs
+        .loc[validation_dataset_wInputs['anomaly'] != -1]                  # Remove outliers
+        .assign(date=pd.to_datetime(validation_dataset_wInputs['date']))   # Convert date to datetime
+        .sort_values(by='date')                                            # Sort by ascending date
+        .loc[:, ["date", "field_id", "NDVI"]]                              # Select relevant columns for further processing
+    )
+    stage.output(cleaned_validation_dataset)
 
 print("Length of original dataset:", len(validation_dataset_wInputs))
 print("Length of cleaned dataset:", len(cleaned_validation_dataset))
@@ -105,27 +107,20 @@ print("Percent removed:", (100-((len(cleaned_validation_dataset)/len(validation_
 dataframes = {"validation_dataset": cleaned_validation_dataset}
 
 #function to smooth dataframes using the SG filter
-def smooth_and_save_dataframes(dataframes, output_directory):
+def smooth_and_save_dataframes(dataframes, output_directory, file_format=DATASET_FORMAT):
     for df_name, df in dataframes.items():
         df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
         df.sort_values(by='date', ascending=True, inplace=True)
-        df['year'] = df['date'].dt.year
 
-        unique_combinations = df[['year', 'field_id']].drop_duplicates()
-        
-        for _, row in unique_combinations.iterrows():
-            mask = (df['year'] == row['year']) & (df['field_id'] == row['field_id'])
-            filtered_rows = df.loc[mask].sort_values(by='date', ascending=True)  # Sort by ascending date
-            smoothed_values = signal.savgol_filter(filtered_rows['NDVI'], window_length=5, polyorder=2, mode='nearest')
-            df.loc[mask, 'smoothed_NDVI'] = smoothed_values
+        #sort once into the year-field_id series of the compact FieldSeasons store, smooth them and
+        #add dif_to_forelast (see mowing/fieldseasons.py and mowing/smoothing.py), with the same results
+        #as pipeline.smooth_series; series shorter than window_length are filtered with edge padding, like before
+        with run_report.stage(f'sg_smoothing_{df_name}', df) as stage:
+            df = fieldseasons.smooth_frame(df, window_length=5, polyorder=2, short_groups='filter')
+            stage.output(df)
 
-        df.drop(columns=['NDVI', 'year'], inplace=True)  # Drop the original NDVI column
-        df.rename(columns={'smoothed_NDVI': 'NDVI'}, inplace=True)  # Rename the smoothed column
-
-        df = calculate_temporal_features(df, 'NDVI')
-
-        output_filename = os.path.join(output_directory, f"{df_name}_SG.csv")
-        df.to_csv(output_filename, index=False)
+        output_filename = storage.dataset_path(os.path.join(output_directory, f"{df_name}_SG"), file_format)
+        storage.save_dataset(df, output_filename, file_format)
         print(f"Smoothed DataFrame '{df_name}' saved to '{output_filename}'")
 
 #apply function and save cleaned and smoothed dataframe
@@ -133,3 +128,5 @@ smooth_and_save_dataframes(
     dataframes,
     r'path\to\final\dataset'
     )
+
+run_report.save()
@@ -3,72 +3,37 @@ import pandas as pd
 from datetime import datetime, timedelta
 import numpy as np
 import os
+from mowing import cuts, fieldseasons, instrumentation, storage #local modules of this repository
 
-#load dataset
-official_df = pd.read_csv(
-            r'path\to\official_dataset.csv',
-            parse_dates=['date'])
-
-#function to find cutting dates
-def find_cut_dates(dataframe, output_csv):
-
-    dataframe['date'] = pd.to_datetime(dataframe['date'], format="%d/%m/%Y")                   # Convert df dates to datetime
-    dataframe = dataframe[(dataframe['date'].dt.month < 3) | (dataframe['date'].dt.month > 4)] # Remove all dates from March and April (no cuts)
-    dataframe.sort_values(by='date', inplace=True)                                             # Sort by ascending
-
-    
-    grouped_df = dataframe.groupby([dataframe['date'].dt.year, 'field_id'])                    # Form subgroups of year-field ID combinations         
+#storage format of the smoothed dataset and the cutting dates: 'csv' or 'parquet' (see 5_merge_and_split.py)
+DATASET_FORMAT = 'csv'
 
-    # Identify clusters of NDVI drop values <= -0.1
-    results = {}
+#record wall time, CPU time, peak memory and row counts of every stage in a JSON run report
+#(see mowing/instrumentation.py); PROFILE = 'cprofile' or 'pyinstrument' also profiles the stages
+RUN_REPORT = r'path\to\run_reports\7_find_cutting_dates.json'
+PROFILE = None
+run_report = instrumentation.RunReport('7_find_cutting_dates', RUN_REPORT, profile=PROFILE)
 
-    for (year, field_id), group_df in grouped_df:                                              # Find clusters by year-field_id pair
-        clusters = []                                                                          # List of all found clusters
-        current_cluster = []
-
-        for _, row in group_df.iterrows():
-            if row['dif_to_forelast'] <= -0.1:
-                current_cluster.append(row)
-            elif current_cluster:
-                clusters.append(pd.DataFrame(current_cluster))
-                current_cluster = []
-
-        if current_cluster:
-            clusters.append(pd.DataFrame(current_cluster))
-
-        # Find first date of each cluster
-        first_date = []
-        for cluster in clusters:
-            if not cluster.empty:
-                first_date_value = dataframe['date'][cluster.index[0]]
-                first_date.append(first_date_value.strftime('%d/%m/%Y'))
-                #print(f"First date found for cluster of {year, field_id} at {first_date_value.strftime('%d/%m/%Y')}")
-        
-        results[year, field_id] = {
-            'num_cuts': len(first_date),
-            'cutting dates': first_date
-        }
+#load dataset
+official_df = storage.load_dataset(
+            storage.dataset_path(r'path\to\official_dataset', DATASET_FORMAT))
 
-    # Create and populate the CSV file
-    csv_data = []
-    for (year, field_id), result in results.items():
-        csv_row = {
-            'year': year,
-            'field_id': field_id
-        }
-        
-        for i, cut_date in enumerate(result['cutting dates'], start=1):
-            csv_row[f'cut_{i}'] = cut_date
-        
-        csv_data.append(csv_row)
-    
-    csv_df = pd.DataFrame(csv_data)
-    csv_df.to_csv(output_csv, index=False)
+#function to find cutting dates
+#vectorised implementation in mowing/cuts.py: cluster starts are found by edge detection
+#on the date-sorted dif_to_forelast values of all year-field_id combinations at once;
+#the series are kept in the compact FieldSeasons store (see mowing/fieldseasons.py), with the same results
+find_cut_dates = cuts.find_cut_dates
 
 
 #apply function
 #save file with cutting dates
-find_cut_dates(
-    official_df,
-    r'path\to\cutting_dates.csv'
-    )
+with run_report.stage('cut_detection', official_df) as stage:
+    cut_dates = find_cut_dates(
+        official_df,
+        storage.dataset_path(r'path\to\cutting_dates', DATASET_FORMAT),
+        DATASET_FORMAT,
+        detect=fieldseasons.detect_cuts_frame
+        )
+    stage.output(cut_dates)
+
+run_report.save()
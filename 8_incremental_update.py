@@ -0,0 +1,40 @@
+#the following python modules need to be installed:
+import pandas as pd
+from mowing import incremental, models, storage #local modules of this repository
+
+#incremental alternative to rerunning scripts 5 to 7 when new observations arrive
+#only the year-field_id series touched by the new observations are merged, normalised,
+#cleaned of outliers, smoothed and searched for cuts again; their results replace the stored ones
+
+#directory holding the processed keys (manifest), merged observations, normalisation
+#parameters, smoothed series and cut dates between runs; created on the first run
+#every run saves a new version folder and then switches the CURRENT file to it; the tables are stored
+#per year and region, and a run only rewrites the partitions of its new observations
+state_directory = r'path\to\incremental\state'
+
+#new observations with the columns date, NDVI, field_id and sat_name,
+#e.g. the clean Dove dataset of script 4 or prepared Sentinel-2 exports
+new_observations = storage.load_dataset(r'path\to\new\observations.csv')
+
+#load the Isolation Forest registered by 6_IF_and_SG.py, without loading the training dataset
+model_IF = models.load_model(r'path\to\model\registry')
+
+#apply function
+#satellite priority and detection parameters are the ones used in scripts 5 to 7
+summary = incremental.update(
+    state_directory,
+    new_observations,
+    model_IF,
+    priority=('Sen2', 'Planet', 'Lan8', 'Lan7'),
+    region_prefixes=('KM', 'LM', 'AL'),
+    window_length=5,
+    polyorder=2,
+    cut_threshold=-0.1
+    )
+
+print("New observations:", summary['new_rows'])
+print("Recomputed year-field_id series:", summary['recomputed_series'])
+
+#export the updated cutting dates
+cutting_dates = incremental.load_state(state_directory)['cuts']
+cutting_dates.to_csv(r'path\to\cutting_dates.csv', index=False)
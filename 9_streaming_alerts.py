@@ -0,0 +1,50 @@
+#the following python modules need to be installed:
+import os
+import pandas as pd
+from mowing import models, normalisation, storage, streaming #local modules of this repository
+
+#near-real-time mowing alerts: new observations are fed to a streaming detector that keeps a compact
+#state per field (last NDVI values, SG window, open cluster) and emits a 'cut started' event with the
+#range of ± 1 observation as soon as the dif_to_forelast <= -0.1 condition of a new cluster is known
+
+#file keeping the per-field states between runs
+detector_state = r'path\to\streaming\detector_state.pkl'
+
+#file the alerts are appended to
+alerts_csv = r'path\to\mowing_alerts.csv'
+
+#file keeping the min-max parameters extended by the new observations between runs
+streaming_minmax = r'path\to\streaming\minmax_parameters.csv'
+
+#load the registered Isolation Forest (6_IF_and_SG.py) and the min-max parameters
+#the first run starts from the parameters of 5_merge_and_split.py; the detector adds the groups of
+#new years and widens the min and max of known groups as observations arrive
+model_IF = models.load_model(r'path\to\model\registry')
+if os.path.exists(streaming_minmax):
+    minmax_parameters = normalisation.load_minmax(streaming_minmax)
+else:
+    minmax_parameters = normalisation.load_minmax(r'path\to\minmax_parameters.csv')
+
+detector = streaming.load_detector(
+    detector_state,
+    model=model_IF,
+    params=minmax_parameters,
+    region_prefixes=('KM', 'LM', 'AL'),
+    window_length=5,
+    polyorder=2,
+    cut_threshold=-0.1,
+    excluded_months=(3, 4)
+    )
+
+#new observations (date, NDVI, field_id), e.g. from today's Dove or Sentinel-2 scenes
+new_observations = storage.load_dataset(r'path\to\new\observations.csv')
+
+#detect cuts and save the detector state and parameters for the next run
+alerts = detector.process(new_observations)
+streaming.save_detector(detector, detector_state)
+normalisation.save_minmax(detector.params, streaming_minmax)
+
+#at the end of the season, close all series of the year with detector.flush(year)
+
+print("New mowing alerts:", len(alerts))
+alerts.to_csv(alerts_csv, mode='a', header=not os.path.exists(alerts_csv), index=False)
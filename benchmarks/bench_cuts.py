@@ -0,0 +1,65 @@
+#benchmark of the cut detection: original iterrows clusters vs. vectorised mowing.cuts
+#run from the repository root: python -m benchmarks.bench_cuts [--sizes 1000 10000 100000]
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks import legacy
+from benchmarks.synthetic import make_ndvi_frame
+from mowing.cuts import find_cut_dates
+
+
+def make_cut_input(size):
+    data = make_ndvi_frame(size).sort_values('date')
+    data['dif_to_forelast'] = data.groupby(['field_id', data['date'].dt.year])['NDVI'].diff(periods=2)
+    return data
+
+
+def time_call(func, df, output_csv):
+    start = time.perf_counter()
+    func(df, output_csv)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='cut detection benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    parser.add_argument('--legacy-max', type=int, default=None,
+                        help='skip the original loop for datasets with more field-seasons than this')
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_csv = os.path.join(tmp, 'legacy.csv')
+        new_csv = os.path.join(tmp, 'vectorised.csv')
+
+        for size in args.sizes:
+            data = make_cut_input(size)
+            new_time = time_call(find_cut_dates, data.copy(), new_csv)
+
+            legacy_time, identical = float('nan'), None
+            if args.legacy_max is None or size <= args.legacy_max:
+                legacy_time = time_call(legacy.find_cut_dates, data.copy(), legacy_csv)
+                with open(legacy_csv) as a, open(new_csv) as b:
+                    identical = a.read() == b.read()
+
+            rows.append({
+                'field_seasons': size,
+                'rows': len(data),
+                'rows_per_s': len(data) / new_time,
+                'legacy_s': legacy_time,
+                'vectorised_s': new_time,
+                'speedup': legacy_time / new_time,
+                'identical_csv': identical,
+            })
+            print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
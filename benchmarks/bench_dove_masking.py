@@ -0,0 +1,74 @@
+#benchmark of the Dove masking output profiles: bytes written and seconds per scene
+#run from the repository root: python -m benchmarks.bench_dove_masking [--scenes 4 --width 2000 --height 1500]
+import argparse
+import glob
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import rasterio
+
+from benchmarks import legacy
+from benchmarks.synthetic_rasters import write_dove_scene
+from mowing import dove
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dove masking benchmark')
+    parser.add_argument('--scenes', type=int, default=4, help='number of synthetic scenes')
+    parser.add_argument('--width', type=int, default=2000, help='scene width in pixels')
+    parser.add_argument('--height', type=int, default=1500, help='scene height in pixels')
+    parser.add_argument('--processes', type=int, default=1, help='size of the process pool')
+    args = parser.parse_args()
+
+    settings = [
+        ('legacy', None, None),
+        ('float64', 'float64', None),
+        ('float32', 'float32', None),
+        ('float32 + deflate', 'float32', 'deflate'),
+        ('float32 + zstd', 'float32', 'zstd'),
+        ('int16 + deflate', 'int16', 'deflate'),
+        ('int16 + zstd', 'int16', 'zstd'),
+    ]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        input_directory = os.path.join(tmp, 'input')
+        os.mkdir(input_directory)
+        scenes = [write_dove_scene(input_directory, f'scene{i}', args.width, args.height, seed=i) for i in range(args.scenes)]
+        input_bytes = sum(os.path.getsize(img_file) for img_file, _ in scenes)
+        reference = None
+
+        for name, output_profile, compress in settings:
+            output_directory = os.path.join(tmp, name.replace(' + ', '_'))
+            os.mkdir(output_directory)
+
+            start = time.perf_counter()
+            if output_profile is None:
+                for img_file, udm2_file in scenes:
+                    legacy.process_image(img_file, udm2_file, output_directory)
+            else:
+                dove.mask_all_images(input_directory, output_directory, processes=args.processes,
+                                     output_profile=output_profile, compress=compress)
+            seconds = time.perf_counter() - start
+
+            output_files = sorted(glob.glob(os.path.join(output_directory, '*_masked.tif')))
+            with rasterio.open(output_files[0]) as src:
+                values = src.read().astype(float) * src.scales[0]
+            reference = values if reference is None else reference
+
+            rows.append({
+                'output': name,
+                'bytes_written': sum(os.path.getsize(f) for f in output_files),
+                'ratio_to_input': sum(os.path.getsize(f) for f in output_files) / input_bytes,
+                'seconds_per_scene': seconds / args.scenes,
+                'max_abs_difference': np.abs(values - reference).max(),
+            })
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#benchmark of the compact FieldSeasons store vs. the long dataframe for smoothing, dif_to_forelast and cuts
+#run from the repository root: python -m benchmarks.bench_fieldseasons [--sizes 1000 10000 100000]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import make_ndvi_frame
+from mowing import cuts, fieldseasons, pipeline
+
+
+def dataframe_stages(df):
+    smoothed = pipeline.smooth_series(df)
+    return smoothed, cuts.detect_cuts(smoothed)
+
+
+def store_stages(df, dtype):
+    store = fieldseasons.FieldSeasons.from_frame(df, dtype=dtype)
+    store = fieldseasons.temporal_features(fieldseasons.smooth(store))
+    return store, fieldseasons.detect_cuts(store)
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+#number of year-field_id series whose cut dates differ
+def differing_series(expected, result):
+    expected, result = expected.fillna(''), result.fillna('')
+    if expected.shape != result.shape:
+        return abs(len(expected) - len(result)) + len(expected.columns.symmetric_difference(result.columns))
+    return int((expected.to_numpy() != result.to_numpy()).any(axis=1).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FieldSeasons store benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        data = make_ndvi_frame(size)
+        data['date'] = pd.to_datetime(data['date'], format='%d/%m/%Y')
+
+        frame_time, (smoothed, expected) = time_call(dataframe_stages, data)
+        row = {
+            'field_seasons': size,
+            'rows': len(data),
+            'dataframe_mb': smoothed.memory_usage(deep=True).sum() / 1e6,
+            'dataframe_s': frame_time,
+        }
+        for dtype in (np.float64, np.float32):
+            store_time, (store, result) = time_call(store_stages, data, dtype)
+            name = np.dtype(dtype).name
+            row[f'{name}_mb'] = store.nbytes / 1e6
+            row[f'{name}_s'] = store_time
+            row[f'{name}_cut_mismatches'] = differing_series(expected, result)
+        rows.append(row)
+        print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
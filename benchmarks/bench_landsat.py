@@ -0,0 +1,116 @@
+#benchmark of the Landsat field statistics: weighted medians at the native 30 m resolution vs.
+#bicubic resampling to the 10 m Sentinel-2 grid followed by per-field medians (1_/2_landsat scripts)
+#run from the repository root: python -m benchmarks.bench_landsat [--sizes 400 1500 --fields 400]
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import rasterio
+import shapefile
+from rasterio.enums import Resampling
+from rasterio.warp import reproject
+
+from benchmarks.synthetic_rasters import write_landsat_product
+from mowing import dove, landsat
+
+
+#fields of 150 to 400 m side, slightly rotated, in a regular grid
+def write_fields(path, n_fields, extent, seed=0):
+    rng = np.random.default_rng(seed)
+    writer = shapefile.Writer(path, shapeType=shapefile.POLYGON)
+    writer.field('field_id', 'C')
+    per_row = int(np.ceil(np.sqrt(n_fields)))
+    spacing = extent / (per_row + 1)
+    for k in range(n_fields):
+        centre_x = 700000 + spacing * (1 + k % per_row)
+        centre_y = 5400000 - spacing * (1 + k // per_row)
+        half = rng.uniform(75, min(200, spacing / 2.5))
+        angle = rng.uniform(0, np.pi / 8)
+        corners = [(-half, -half), (half, -half), (half, half), (-half, half), (-half, -half)]
+        writer.poly([[(centre_x + x * np.cos(angle) - y * np.sin(angle), centre_y + x * np.sin(angle) + y * np.cos(angle))
+                      for x, y in corners[::-1]]])
+        writer.record(f'KM{k}')
+    writer.close()
+    return path + '.shp'
+
+
+#former approach: resample red and NIR with bicubic interpolation to 10 m, then median per field
+def upsampled_medians(product_directory, fields):
+    settings = landsat.SENSORS[landsat.sensor_of_product(os.path.basename(product_directory))]
+    bands = {}
+    with rasterio.open(landsat.band_file(product_directory, 'QA_PIXEL')) as src:
+        qa_pixel = src.read(1)
+        crs, transform, width, height = src.crs, src.transform, src.width, src.height
+    with rasterio.open(landsat.band_file(product_directory, 'QA_RADSAT')) as src:
+        valid = landsat.valid_pixels(qa_pixel, src.read(1))
+
+    fine_transform = transform * rasterio.Affine.scale(1 / 3)
+    for band in ('red', 'nir'):
+        with rasterio.open(landsat.band_file(product_directory, settings[band])) as src:
+            reflectance = landsat.scale_optical(src.read(1))
+        reflectance[~valid] = np.nan
+        resampled = np.full((height * 3, width * 3), np.nan, dtype=np.float32)
+        reproject(reflectance, resampled, src_transform=transform, src_crs=crs, src_nodata=np.nan,
+                  dst_transform=fine_transform, dst_crs=crs, dst_nodata=np.nan, resampling=Resampling.cubic)
+        bands[band] = resampled
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = (bands['nir'] - bands['red']) / (bands['nir'] + bands['red'])
+    labels = dove.field_labels(fields, crs, fine_transform, width * 3, height * 3)
+    positions, medians = dove.label_medians(ndvi, labels)
+    return pd.Series(medians, index=[fields[p - 1][1] for p in positions])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Landsat field statistics benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[400, 1500], help='scene sizes in 30 m pixels')
+    parser.add_argument('--fields', type=int, default=400, help='number of fields')
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            fields_path = write_fields(os.path.join(tmp, f'fields{size}'), args.fields, size * 30)
+            fields = dove.read_fields(fields_path)
+            product = write_landsat_product(tmp, 'Lan8', size=size, n_clouds=size // 40, seed=size)
+
+            start = time.perf_counter()
+            reference = upsampled_medians(product, fields)
+            upsampled_time = time.perf_counter() - start
+
+            weight_cache = {}
+            start = time.perf_counter()
+            native = landsat.product_ndvi_medians(product, fields, weight_cache).set_index('field_id')['NDVI']
+            native_time = time.perf_counter() - start
+
+            #a second product on the same grid reuses the coverage weights
+            start = time.perf_counter()
+            landsat.product_ndvi_medians(product, fields, weight_cache)
+            cached_time = time.perf_counter() - start
+
+            common = native.index.intersection(reference.index)
+            difference = (native[common] - reference[common]).abs()
+            rows.append({
+                'pixels_30m': size * size,
+                'fields': len(fields),
+                'upsampled_10m_s': upsampled_time,
+                'native_30m_s': native_time,
+                'native_cached_weights_s': cached_time,
+                'speedup_cached': upsampled_time / cached_time,
+                'fields_both': len(common),
+                'fields_only_native': len(native.index.difference(reference.index)),
+                'fields_only_upsampled': len(reference.index.difference(native.index)),
+                'median_abs_difference': float(difference.median()),
+                'p95_abs_difference': float(difference.quantile(0.95)),
+                'correlation': float(np.corrcoef(native[common], reference[common])[0, 1]),
+            })
+            print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#benchmark of the out-of-core mode: peak memory and time of stages 5 to 7 in memory vs. mowing.outofcore
+#the data is generated and every run is made in a fresh process, so that each peak memory is measured on its own
+#run from the repository root: python -m benchmarks.bench_out_of_core [--size 20000] [--partitions 4 16 64]
+import argparse
+import glob
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from benchmarks.synthetic import make_multisensor_dataset
+from mowing import cuts, deduplication, features, instrumentation, models, normalisation, outofcore, pipeline
+
+
+#all observations in memory at once, as in scripts 5 to 7 (cuts detected in all rows)
+def run_in_memory(input_directory, work_directory, partitions):
+    combined = pd.concat([pd.read_parquet(path) for path in sorted(glob.glob(os.path.join(input_directory, '*.parquet')))],
+                         ignore_index=True)
+    merged, _ = deduplication.resolve_duplicates(combined)
+    merged = merged[merged['NDVI'] > 0]
+    normalised = normalisation.normalise_columns_byYear_Region(merged.copy()).drop(columns=['year', 'region'])
+    training = features.calculate_valley(normalised.copy())
+    model = IsolationForest(n_jobs=-1, **models.IF_PARAMETERS).fit(training[models.ANOMALY_INPUTS])
+    smoothed = pipeline.smooth_series(pipeline.remove_outliers(normalised, model))
+    return cuts.detect_cuts(smoothed)
+
+
+#one chunk file at a time, streamed into partitions
+def run_out_of_core(input_directory, work_directory, partitions):
+    paths = sorted(glob.glob(os.path.join(input_directory, '*.parquet')))
+    chunks = (pd.read_parquet(path) for path in paths)
+    cut_dates, _, _ = outofcore.run_out_of_core([chunks], work_directory, partitions=partitions, detect_on='all')
+    return cut_dates
+
+
+#synthetic observations written as args.chunks files per satellite
+def write_inputs(input_directory, size, chunks):
+    observations, _ = make_multisensor_dataset(size)
+    for sat_name, df in observations.items():
+        for chunk in range(chunks):
+            df.iloc[chunk::chunks].to_parquet(os.path.join(input_directory, f'{sat_name}_{chunk:03d}.parquet'))
+    return sum(len(df) for df in observations.values())
+
+
+def measure(mode, input_directory, work_directory, partitions):
+    start = time.perf_counter()
+    cut_dates = {'in_memory': run_in_memory, 'out_of_core': run_out_of_core}[mode](input_directory, work_directory, partitions)
+    return time.perf_counter() - start, instrumentation.peak_rss_mb(), len(cut_dates)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='out-of-core benchmark')
+    parser.add_argument('--size', type=int, default=20000, help='number of field-seasons in the synthetic dataset')
+    parser.add_argument('--chunks', type=int, default=20, help='number of input files per satellite')
+    parser.add_argument('--partitions', type=int, nargs='+', default=[4, 16, 64],
+                        help='numbers of field_id hash buckets; year/region partitions are always included')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        input_directory = os.path.join(directory, 'input')
+        os.makedirs(input_directory)
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            rows = executor.submit(write_inputs, input_directory, args.size, args.chunks).result()
+
+        runs = [('in_memory', None), ('out_of_core', outofcore.PARTITIONS)] + [('out_of_core', n) for n in args.partitions]
+        results = []
+        for mode, partitions in runs:
+            with ProcessPoolExecutor(1, mp_context=context) as executor:
+                wall_s, peak_rss_mb, field_seasons = executor.submit(
+                    measure, mode, input_directory, os.path.join(directory, 'work'), partitions
+                    ).result()
+            results.append({'mode': mode, 'partitions': partitions, 'rows': rows, 'wall_s': wall_s,
+                            'peak_rss_mb': peak_rss_mb, 'field_seasons': field_seasons})
+            print(results[-1])
+
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
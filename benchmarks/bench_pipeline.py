@@ -0,0 +1,106 @@
+#end-to-end benchmark of stages 5 to 7 on synthetic multi-satellite data with known mowing dates
+#runs the functions called by the scripts (fieldseasons.smooth_frame in script 6, detect_cuts_frame in script 7)
+#reports rows/s and the peak memory allocated within every stage (tracemalloc) and the detection accuracy (± 1 observation)
+#run from the repository root: python -m benchmarks.bench_pipeline [--sizes 100 10000 1000000]
+import argparse
+import time
+
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from benchmarks.synthetic import make_multisensor_dataset
+from mowing import deduplication, evaluation, features, fieldseasons, instrumentation, models, normalisation, pipeline, splitting
+
+
+#columns of the stage measurements in the results
+#peak_increase_mb is the peak of the memory allocated within the stage above that allocated at its start
+STAGE_COLUMNS = ['stage', 'rows_in', 'rows_out', 'wall_s', 'cpu_s', 'rows_per_s', 'peak_increase_mb']
+
+
+#80/20 split of the year-field_id groups, as in 5_merge_and_split.py
+def split_groups(df, train_share=0.8, seed=42):
+    training_rows, validation_rows = splitting.train_validation_indices(df, train_share, seed)
+    return df.iloc[training_rows], df.iloc[validation_rows]
+
+
+def train_model(training_data):
+    training_data = features.calculate_valley(training_data.copy())
+    model = IsolationForest(n_jobs=-1, **models.IF_PARAMETERS)
+    model.fit(training_data[models.ANOMALY_INPUTS])
+    return model
+
+
+def run_pipeline(observations, profile=None, trace_memory=True):
+    report = instrumentation.RunReport('bench_pipeline', profile=profile, trace_memory=trace_memory)
+
+    with report.stage('merge', observations) as stage:
+        combined = pd.concat(observations.values(), ignore_index=True)
+        merged, _ = deduplication.resolve_duplicates(combined)
+        merged = merged[merged['NDVI'] > 0]
+        stage.output(merged)
+    with report.stage('normalise', merged) as stage:
+        normalised = normalisation.normalise_columns_byYear_Region(merged.copy()).drop(columns=['year', 'region'])
+        stage.output(normalised)
+    with report.stage('split', normalised):
+        training, validation = split_groups(normalised)
+    with report.stage('train_isolation_forest', training):
+        model = train_model(training)
+    with report.stage('remove_outliers', validation) as stage:
+        cleaned = pipeline.remove_outliers(validation, model)
+        stage.output(cleaned)
+    with report.stage('smooth', cleaned) as stage:
+        smoothed = fieldseasons.smooth_frame(cleaned, window_length=5, polyorder=2, short_groups='filter')
+        stage.output(smoothed)
+    with report.stage('detect_cuts', smoothed) as stage:
+        cut_dates = fieldseasons.detect_cuts_frame(smoothed)
+        stage.output(cut_dates)
+    return report, smoothed, cut_dates, validation
+
+
+def main():
+    parser = argparse.ArgumentParser(description='end-to-end throughput and accuracy benchmark of stages 5 to 7')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000],
+                        help='numbers of field-seasons in the synthetic datasets (up to 1000000)')
+    parser.add_argument('--cloud-probability', type=float, default=0.35,
+                        help='share of days without any observation')
+    parser.add_argument('--outlier-probability', type=float, default=0.03,
+                        help='share of observations lowered by residual clouds or shadows')
+    parser.add_argument('--report', default=None, help='optional CSV file for the results')
+    parser.add_argument('--profile', choices=instrumentation.PROFILERS, default=None,
+                        help='profile every stage (files are written to the working directory)')
+    parser.add_argument('--trace-memory', action=argparse.BooleanOptionalAction, default=True,
+                        help='measure the memory of every stage with tracemalloc (the times include its overhead)')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        start = time.perf_counter()
+        observations, reference = make_multisensor_dataset(
+            size, cloud_probability=args.cloud_probability, outlier_probability=args.outlier_probability
+            )
+        generation_time = time.perf_counter() - start
+
+        report, smoothed, cut_dates, validation = run_pipeline(observations, args.profile, args.trace_memory)
+
+        #reference cuts of the validation field-seasons
+        validation_seasons = validation[['field_id']].assign(year=validation['date'].dt.year).drop_duplicates()
+        validation_seasons['field_id'] = validation_seasons['field_id'].astype(str)
+        reference = reference.merge(validation_seasons, on=['year', 'field_id'])
+        accuracy = evaluation.score_cuts(cut_dates, reference, smoothed)
+
+        for stage in report.stages:
+            rows.append({'field_seasons': size, **{key: stage[key] for key in STAGE_COLUMNS}})
+        summary = report.to_dict()
+        rows.append({'field_seasons': size, 'stage': 'total', 'rows_in': sum(len(df) for df in observations.values()),
+                     'wall_s': summary['total_wall_s'], 'cpu_s': summary['total_cpu_s'],
+                     'peak_rss_mb': summary['peak_rss_mb'], 'generation_s': generation_time, **accuracy})
+        print(rows[-1])
+
+    report = pd.DataFrame(rows)
+    print(report.to_string(index=False))
+    if args.report:
+        report.to_csv(args.report, index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#benchmark of the offline Sentinel-2 extraction: seconds per scene for the whole scene and for the
+#window covering the fields, and the share of cloud shadows found with the solar azimuth; the same scene
+#stored with the BOA_ADD_OFFSET of processing baseline 04.00 has to give the same medians
+#run from the repository root: python -m benchmarks.bench_sentinel2 [--sizes 1200 5490 --fields 25]
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import rasterio
+import shapefile
+
+from benchmarks.synthetic_rasters import write_sentinel2_scene
+from mowing import dove, sentinel2
+
+
+#square fields of 400 m in a regular grid over the upper left part of the scene
+def write_fields(path, n_fields, spacing=1000):
+    writer = shapefile.Writer(path, shapeType=shapefile.POLYGON)
+    writer.field('field_id', 'C')
+    per_row = int(np.ceil(np.sqrt(n_fields)))
+    for k in range(n_fields):
+        x0 = 700000 + 1000 + (k % per_row) * spacing
+        y0 = 5400000 - 1000 - (k // per_row) * spacing
+        writer.poly([[(x0, y0), (x0 + 400, y0), (x0 + 400, y0 - 400), (x0, y0 - 400), (x0, y0)]])
+        writer.record(f'KM{k}')
+    writer.close()
+    return path + '.shp'
+
+
+#NDVI medians computed on the full scene, for comparison with the windowed extraction
+def full_scene_medians(scene, fields):
+    with rasterio.open(scene['B4']) as src:
+        red = src.read(1)
+        labels = dove.field_labels(fields, src.crs, src.transform, src.width, src.height)
+        full = rasterio.windows.Window(0, 0, src.width, src.height)
+        nir = sentinel2.read_on_grid(scene['B8'], src, full)
+        scl = sentinel2.read_on_grid(scene['SCL'], src, full)
+        cloud_probability = sentinel2.read_on_grid(scene['cloud_probability'], src, full)
+    offset = sentinel2.scene_offset(scene)
+    mask = sentinel2.cloud_shadow_mask(cloud_probability, nir, scl, scene['solar_azimuth'], boa_add_offset=offset)
+    positions, medians = dove.label_medians(sentinel2.masked_ndvi(red, nir, mask, offset), labels)
+    shadows = nir < sentinel2.NIR_DRK_THRESH * sentinel2.SR_BAND_SCALE - offset
+    return pd.Series(medians, index=[fields[p - 1][1] for p in positions]), (mask & shadows).sum() / shadows.sum()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='offline Sentinel-2 extraction benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1200, 5490],
+                        help='scene sizes in 10 m pixels (10980 is a full tile)')
+    parser.add_argument('--fields', type=int, default=25, help='number of fields')
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        fields_path = write_fields(os.path.join(tmp, 'fields'), args.fields)
+        fields = dove.read_fields(fields_path)
+        for size in args.sizes:
+            scene = write_sentinel2_scene(tmp, f'scene{size}', size=size, n_clouds=max(5, size // 200), seed=size)
+
+            start = time.perf_counter()
+            reference, shadow_share = full_scene_medians(scene, fields)
+            full_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            windowed = sentinel2.scene_ndvi_medians(scene, fields).set_index('field_id')['NDVI']
+            window_time = time.perf_counter() - start
+
+            offset_scene = write_sentinel2_scene(tmp, f'offset{size}', size=size, n_clouds=max(5, size // 200), seed=size,
+                                                 boa_add_offset=sentinel2.BASELINE_04_OFFSET)
+            with_offset = sentinel2.scene_ndvi_medians(offset_scene, fields).set_index('field_id')['NDVI']
+
+            rows.append({
+                'pixels': size * size,
+                'full_scene_s': full_time,
+                'fields_window_s': window_time,
+                'speedup': full_time / window_time,
+                'max_abs_difference': np.nanmax(np.abs(windowed - reference.loc[windowed.index])),
+                'baseline_04_difference': np.nanmax(np.abs(with_offset - windowed.loc[with_offset.index])),
+                'shadow_pixels_masked': shadow_share,
+            })
+            print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#benchmark of the SG smoothing: original per-group boolean masks vs. grouped mowing.smoothing
+#run from the repository root: python -m benchmarks.bench_smoothing [--sizes 1000 10000 100000]
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import legacy
+from benchmarks.synthetic import make_ndvi_frame
+from mowing.smoothing import smooth_by_group
+
+
+def smooth_dataframe(df):
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    df.sort_values(by='date', ascending=True, inplace=True)
+    df['year'] = df['date'].dt.year
+    return smooth_by_group(df, 'NDVI', ['year', 'field_id'], output_column='smoothed_NDVI')
+
+
+def time_call(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SG smoothing benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='skip the original loop for datasets with more field-seasons than this')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        #varying season lengths, including series shorter than the SG window
+        obs_per_season = 20
+        data = make_ndvi_frame(size, obs_per_season=obs_per_season)
+        season_length = np.random.default_rng(1).integers(2, obs_per_season + 1, size=size)
+        data = data[np.arange(len(data)) % obs_per_season < np.repeat(season_length, obs_per_season)]
+
+        new_time, new_result = time_call(smooth_dataframe, data.copy())
+
+        legacy_time, max_difference = float('nan'), None
+        if args.legacy_max is None or size <= args.legacy_max:
+            legacy_time, legacy_result = time_call(legacy.smooth_dataframe, data.copy())
+            max_difference = np.nanmax(np.abs(
+                legacy_result['smoothed_NDVI'].to_numpy() - new_result.loc[legacy_result.index, 'smoothed_NDVI'].to_numpy()
+            ))
+
+        rows.append({
+            'field_seasons': size,
+            'rows': len(data),
+            'legacy_s': legacy_time,
+            'vectorised_s': new_time,
+            'speedup': legacy_time / new_time,
+            'max_abs_difference': max_difference,
+        })
+        print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
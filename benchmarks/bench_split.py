@@ -0,0 +1,75 @@
+#benchmark of the train/validation split: original group loop vs. mowing.splitting, and k-fold generation
+#run from the repository root: python -m benchmarks.bench_split [--sizes 1000 10000 100000]
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks import legacy
+from benchmarks.synthetic import make_multisensor_dataset
+from mowing import splitting
+
+
+def split_and_check(df, stratify_by):
+    training, validation = splitting.train_validation_indices(df, stratify_by=stratify_by)
+    return splitting.check_split(df.iloc[training], df.iloc[validation], df)['valid'], training
+
+
+def legacy_split_and_check(df):
+    training, validation = legacy.generate_train_validation_data(df)
+    return legacy.check_split_validity(training, validation, df) == "Split is valid", training
+
+
+def cross_validate(df, n_folds):
+    return all(
+        splitting.check_split(df.iloc[training], df.iloc[validation], df)['valid']
+        for training, validation in splitting.iter_folds(df, n_folds, stratify_by=splitting.STRATIFY_BY)
+    )
+
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='train/validation split benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    parser.add_argument('--folds', type=int, default=5, help='number of cross-validation folds')
+    parser.add_argument('--legacy-max', type=int, default=10000,
+                        help='skip the original loop for datasets with more field-seasons than this')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        observations, _ = make_multisensor_dataset(size)
+        data = pd.concat(observations.values(), ignore_index=True).drop_duplicates(['date', 'field_id'])
+
+        legacy_time, legacy_valid, same_training = float('nan'), None, None
+        split_time, (split_valid, training_rows) = time_call(split_and_check, data, None)
+        if args.legacy_max is None or size <= args.legacy_max:
+            legacy_time, (legacy_valid, legacy_training) = time_call(legacy_split_and_check, data.copy())
+            same_training = bool(pd.Index(legacy_training.index).sort_values().equals(data.index[training_rows]))
+        stratified_time, (stratified_valid, _) = time_call(split_and_check, data, splitting.STRATIFY_BY)
+        folds_time, folds_valid = time_call(cross_validate, data, args.folds)
+
+        rows.append({
+            'field_seasons': size,
+            'rows': len(data),
+            'legacy_s': legacy_time,
+            'split_s': split_time,
+            'speedup': legacy_time / split_time,
+            'stratified_s': stratified_time,
+            f'{args.folds}_folds_s': folds_time,
+            'same_training_rows': same_training,
+            'all_valid': all(valid is not False for valid in (legacy_valid, split_valid, stratified_valid, folds_valid)),
+        })
+        print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
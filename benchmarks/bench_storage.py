@@ -0,0 +1,62 @@
+#benchmark of the intermediate dataset formats: save/load time and size of CSV vs. Parquet
+#run from the repository root: python -m benchmarks.bench_storage [--sizes 10000 100000]
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from benchmarks.synthetic import make_ndvi_frame
+from mowing import storage
+
+
+def size_on_disk(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='dataset storage benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    args = parser.parse_args()
+
+    settings = [
+        ('csv', 'csv', None),
+        ('parquet', 'parquet', None),
+        ('parquet, year/region partitions', 'parquet', ['year', 'region']),
+    ]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data = make_ndvi_frame(size).assign(sat_name='Sen2')
+
+            for name, file_format, partition_by in settings:
+                path = storage.dataset_path(os.path.join(tmp, f"{size}_{len(rows)}"), file_format)
+
+                start = time.perf_counter()
+                storage.save_dataset(data, path, file_format, partition_by=partition_by)
+                save_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                loaded = storage.load_dataset(path)
+                load_seconds = time.perf_counter() - start
+
+                rows.append({
+                    'field_seasons': size,
+                    'rows': len(loaded),
+                    'format': name,
+                    'save_s': save_seconds,
+                    'load_s': load_seconds,
+                    'megabytes': size_on_disk(path) / 1e6,
+                })
+                print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
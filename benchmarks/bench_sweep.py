@@ -0,0 +1,80 @@
+#benchmark of the parameter sweep: one full stage 6 and 7 run per combination vs. mowing.sweep
+#run from the repository root: python -m benchmarks.bench_sweep [--size 1000] [--direct 5]
+import argparse
+import time
+
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from benchmarks.bench_pipeline import split_groups
+from benchmarks.synthetic import make_multisensor_dataset
+from mowing import cuts, deduplication, evaluation, features, models, normalisation, pipeline, sweep
+
+#grid of 216 combinations around the values of the study
+GRID = {
+    'valley_threshold': [-0.1, -0.05],
+    'contamination': [0.02, 0.06, 0.1],
+    'window_length': [5, 7, 9],
+    'polyorder': [2, 3],
+    'cut_threshold': [-0.15, -0.1, -0.05],
+    'excluded_months': [(3, 4), (3,)],
+}
+
+
+#one combination run from scratch, as a manual rerun of scripts 6 and 7
+def run_combination(training, validation, reference, combination):
+    training = features.calculate_valley(training.copy(), threshold=combination['valley_threshold'])
+    model = IsolationForest(contamination=combination['contamination'], random_state=42, n_jobs=-1)
+    model.fit(training[models.ANOMALY_INPUTS])
+    cleaned = pipeline.remove_outliers(validation, model, valley_threshold=combination['valley_threshold'])
+    smoothed = pipeline.smooth_series(cleaned, combination['window_length'], combination['polyorder'])
+    cut_dates = cuts.detect_cuts(smoothed, combination['cut_threshold'], combination['excluded_months'])
+    return evaluation.score_cuts(cut_dates, reference, smoothed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parameter sweep benchmark')
+    parser.add_argument('--size', type=int, default=1000, help='number of field-seasons in the synthetic dataset')
+    parser.add_argument('--direct', type=int, default=5,
+                        help='number of combinations run from scratch to estimate the time of separate runs')
+    parser.add_argument('--processes', type=int, default=None, help='worker processes of the sweep')
+    args = parser.parse_args()
+
+    observations, reference = make_multisensor_dataset(args.size)
+    merged, _ = deduplication.resolve_duplicates(pd.concat(observations.values(), ignore_index=True))
+    merged = merged[merged['NDVI'] > 0]
+    normalised = normalisation.normalise_columns_byYear_Region(merged.copy()).drop(columns=['year', 'region'])
+    training, validation = split_groups(normalised)
+
+    combinations = sweep.grid_combinations(GRID)
+    start = time.perf_counter()
+    results = sweep.run_sweep(training, validation, reference, combinations, processes=args.processes)
+    sweep_time = time.perf_counter() - start
+
+    #reference cuts of the validation field-seasons, as scored by the sweep
+    validation_seasons = validation[['field_id']].assign(year=validation['date'].dt.year).drop_duplicates()
+    validation_seasons['field_id'] = validation_seasons['field_id'].astype(str)
+    validation_reference = reference.merge(validation_seasons, on=['year', 'field_id'])
+
+    start = time.perf_counter()
+    checked = results.sample(min(args.direct, len(results)), random_state=1)
+    mismatches = 0
+    for _, row in checked.iterrows():
+        scores = run_combination(training, validation, validation_reference, row[list(sweep.DEFAULTS)].to_dict())
+        mismatches += any(abs(scores[column] - row[column]) > 1e-12 for column in sweep.SCORE_COLUMNS)
+    direct_time = (time.perf_counter() - start) / len(checked)
+
+    print(results.head(10).to_string(index=False))
+    print(pd.DataFrame([{
+        'field_seasons': args.size,
+        'combinations': len(combinations),
+        'sweep_s': sweep_time,
+        'direct_s_per_combination': direct_time,
+        'estimated_direct_s': direct_time * len(combinations),
+        'speedup': direct_time * len(combinations) / sweep_time,
+        'score_mismatches': mismatches,
+    }]).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
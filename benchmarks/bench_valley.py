@@ -0,0 +1,51 @@
+#benchmark of the valley anomaly input: original row loop vs. vectorised mowing.features
+#run from the repository root: python -m benchmarks.bench_valley [--sizes 1000 10000 100000]
+import argparse
+import time
+
+import pandas as pd
+
+from benchmarks import legacy
+from benchmarks.synthetic import make_ndvi_frame
+from mowing.features import calculate_valley
+
+
+def time_call(func, df):
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='valley anomaly benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='numbers of field-seasons in the synthetic datasets')
+    parser.add_argument('--legacy-max', type=int, default=None,
+                        help='skip the original loop for datasets with more field-seasons than this')
+    args = parser.parse_args()
+
+    rows = []
+    for size in args.sizes:
+        data = make_ndvi_frame(size)
+        new_time, new_result = time_call(calculate_valley, data.copy())
+
+        legacy_time, identical = float('nan'), None
+        if args.legacy_max is None or size <= args.legacy_max:
+            legacy_time, legacy_result = time_call(legacy.calculate_valley, data.copy())
+            identical = legacy_result.equals(new_result)
+
+        rows.append({
+            'field_seasons': size,
+            'rows': len(data),
+            'legacy_s': legacy_time,
+            'vectorised_s': new_time,
+            'speedup': legacy_time / new_time,
+            'identical': identical,
+        })
+        print(rows[-1])
+
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+#reference copies of the original row-by-row implementations
+#kept only to benchmark and cross-check the vectorised versions in mowing/
+import pandas as pd
+
+#original calculate_valley from 6_IF_and_SG.py
+def calculate_valley(df):
+    df['valley'] = 0
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    df['year'] = df['date'].dt.year
+    df = df.sort_values('date')
+
+    grouped = df.groupby(['year', 'field_id'])
+
+    for (_, field_data) in grouped:
+        for i in range(len(field_data)):
+            if i == 0 or i == len(field_data) - 1:
+                df.loc[field_data.index[i], 'valley'] = 0
+            else:
+                diff_prev = field_data.iloc[i]['NDVI'] - field_data.iloc[i-1]['NDVI']
+                diff_next = field_data.iloc[i]['NDVI'] - field_data.iloc[i+1]['NDVI']
+
+                if diff_prev <= -0.1 and diff_next <= -0.1:
+                    df.loc[field_data.index[i], 'valley'] = 1
+
+    return df
+
+#original find_cut_dates from 7_find_cutting_dates.py
+def find_cut_dates(dataframe, output_csv):
+
+    dataframe['date'] = pd.to_datetime(dataframe['date'], format="%d/%m/%Y")                   # Convert df dates to datetime
+    dataframe = dataframe[(dataframe['date'].dt.month < 3) | (dataframe['date'].dt.month > 4)] # Remove all dates from March and April (no cuts)
+    dataframe.sort_values(by='date', inplace=True)                                             # Sort by ascending
+
+
+    grouped_df = dataframe.groupby([dataframe['date'].dt.year, 'field_id'])                    # Form subgroups of year-field ID combinations
+
+    # Identify clusters of NDVI drop values <= -0.1
+    results = {}
+
+    for (year, field_id), group_df in grouped_df:                                              # Find clusters by year-field_id pair
+        clusters = []                                                                          # List of all found clusters
+        current_cluster = []
+
+        for _, row in group_df.iterrows():
+            if row['dif_to_forelast'] <= -0.1:
+                current_cluster.append(row)
+            elif current_cluster:
+                clusters.append(pd.DataFrame(current_cluster))
+                current_cluster = []
+
+        if current_cluster:
+            clusters.append(pd.DataFrame(current_cluster))
+
+        # Find first date of each cluster
+        first_date = []
+        for cluster in clusters:
+            if not cluster.empty:
+                first_date_value = dataframe['date'][cluster.index[0]]
+                first_date.append(first_date_value.strftime('%d/%m/%Y'))
+
+        results[year, field_id] = {
+            'num_cuts': len(first_date),
+            'cutting dates': first_date
+        }
+
+    # Create and populate the CSV file
+    csv_data = []
+    for (year, field_id), result in results.items():
+        csv_row = {
+            'year': year,
+            'field_id': field_id
+        }
+
+        for i, cut_date in enumerate(result['cutting dates'], start=1):
+            csv_row[f'cut_{i}'] = cut_date
+
+        csv_data.append(csv_row)
+
+    csv_df = pd.DataFrame(csv_data)
+    csv_df.to_csv(output_csv, index=False)
+
+#smoothing loop of the original smooth_and_save_dataframes from 6_IF_and_SG.py
+#(without the temporal features and the CSV export)
+def smooth_dataframe(df):
+    from scipy import signal
+
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    df.sort_values(by='date', ascending=True, inplace=True)
+    df['year'] = df['date'].dt.year
+
+    unique_combinations = df[['year', 'field_id']].drop_duplicates()
+
+    for _, row in unique_combinations.iterrows():
+        mask = (df['year'] == row['year']) & (df['field_id'] == row['field_id'])
+        filtered_rows = df.loc[mask].sort_values(by='date', ascending=True)  # Sort by ascending date
+        smoothed_values = signal.savgol_filter(filtered_rows['NDVI'], window_length=5, polyorder=2, mode='nearest')
+        df.loc[mask, 'smoothed_NDVI'] = smoothed_values
+
+    return df
+
+#original calculate_temporal_features from 6_IF_and_SG.py
+def calculate_temporal_features(df, value_column):
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date')
+
+    # Initialise the new columns
+    df['dif_to_forelast'] = pd.NA
+
+    # Calculate the temporal features within each group
+    groups = df.groupby(['field_id', df['date'].dt.year])
+
+    for _, data in groups:
+        data['dif_to_forelast'] = data[value_column].diff(periods=2)
+
+        df.update(data)
+
+    return df
+
+#original process_image from 4_dove-preprocessing.py
+def process_image(img_file, udm2_file, output_directory):
+    import os
+    import rasterio
+    from scipy.ndimage import binary_dilation
+
+    with rasterio.open(udm2_file) as src:
+        shadow_mask = src.read(3).astype(bool)
+        cloud_mask = src.read(6).astype(bool)
+    mask = shadow_mask + cloud_mask
+
+    buffer_size = 7
+    mask_buffered = binary_dilation(mask, iterations=buffer_size)
+
+    with rasterio.open(img_file) as src:
+        profile = src.profile
+        band_count = profile['count']
+        work_data = src.read(list(range(1, band_count + 1)), masked=True) / 10000.0
+
+    work_data.mask = mask_buffered
+    masked_data = work_data.filled(fill_value=0)
+
+    output_file = os.path.join(output_directory, f"{os.path.basename(img_file).split('.')[0]}_masked.tif")
+    profile.update(count=masked_data.shape[0], dtype=str(masked_data.dtype))
+
+    with rasterio.open(output_file, "w", **profile) as dst_idx:
+        dst_idx.write(masked_data)
+
+    return output_file
+
+#original generate_train_validation_data from 5_merge_and_split.py
+def generate_train_validation_data(dataframe, seed=42):
+    import random
+    random.seed(seed)
+
+    dataframe['group_nr'] = dataframe.groupby(['field_id', pd.to_datetime(dataframe['date']).dt.year]).ngroup()
+
+    num_train_groups = int(dataframe['group_nr'].nunique() * 0.8)
+
+    field_groups = dataframe.groupby('group_nr')
+
+    group_nrs = list(field_groups.groups.keys())
+    random.shuffle(group_nrs)
+
+    train_groups = []
+    validation_groups = []
+
+    for group_nr in group_nrs:
+        group = field_groups.get_group(group_nr)
+        if len(train_groups) < num_train_groups:
+            train_groups.append(group)
+        else:
+            validation_groups.append(group)
+
+    training_data = pd.concat([pd.DataFrame(group, columns=dataframe.columns) for group in train_groups])
+    validation_data = pd.concat([pd.DataFrame(group, columns=dataframe.columns) for group in validation_groups])
+
+    return training_data, validation_data
+
+#original check_split_validity from 5_merge_and_split.py
+def check_split_validity(training_df, validation_df, source_df):
+    training_df_combinations = set(zip(training_df['date'], training_df['field_id']))
+    validation_df_combinations = set(zip(validation_df['date'], validation_df['field_id']))
+
+    common_combinations = training_df_combinations.intersection(validation_df_combinations)
+    is_sum_equal_df = len(training_df) + len(validation_df) == len(source_df)
+
+    def calculate_unique_df(input_df):
+        unique_df = (
+            input_df
+            .pipe(lambda df: df.assign(date=pd.to_datetime(df['date'], format='%d/%m/%Y')))
+            .assign(year=lambda df: df['date'].dt.year)
+            .groupby(['year', 'field_id'])
+            .size()
+            .reset_index(name='count')
+            .drop(columns=['year'])
+        )
+        return unique_df
+
+    unique_training = calculate_unique_df(training_df)
+    unique_validation = calculate_unique_df(validation_df)
+    unique_source = calculate_unique_df(source_df)
+
+    is_sum_combinations_equal = (
+        len(unique_training) + len(unique_validation) == len(unique_source)
+    )
+
+    if is_sum_combinations_equal and is_sum_equal_df and not common_combinations:
+        return "Split is valid"
+    else:
+        return "Split is not valid"
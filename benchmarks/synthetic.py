@@ -0,0 +1,117 @@
+#small generator of NDVI observations for benchmarking
+import numpy as np
+import pandas as pd
+
+#function to create a long dataframe with date, NDVI and field_id columns
+#n_field_seasons is spread over the given years, each season holding obs_per_season observations
+def make_ndvi_frame(n_field_seasons, obs_per_season=20, years=(2017, 2018, 2019, 2020, 2021, 2022), seed=42):
+    rng = np.random.default_rng(seed)
+    regions = np.array(['KM', 'LM', 'AL'])
+
+    n_years = len(years)
+    n_fields = max(1, -(-n_field_seasons // n_years))
+    season_field = np.arange(n_field_seasons) % n_fields
+    season_year = np.asarray(years)[np.arange(n_field_seasons) // n_fields % n_years]
+
+    field_names = np.char.add(regions[np.arange(n_fields) % len(regions)], np.arange(n_fields).astype(str))
+
+    #increasing observation days from March onwards, one every 2 to 8 days
+    day_offsets = rng.integers(2, 9, size=(n_field_seasons, obs_per_season)).cumsum(axis=1)
+    starts = pd.to_datetime([f'{year}-03-01' for year in season_year]).values.astype('datetime64[D]')
+    dates = starts[:, None] + day_offsets.astype('timedelta64[D]')
+
+    ndvi = np.clip(0.5 + 0.3 * np.sin(day_offsets / 150 * np.pi) + rng.normal(0, 0.08, dates.shape), 0, 1)
+
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates.ravel()),
+        'NDVI': ndvi.ravel(),
+        'field_id': np.repeat(field_names[season_field], obs_per_season),
+    })
+
+#revisit interval (days, None = random daily acquisitions), noise and share of acquisitions of every satellite
+SENSORS = {
+    'Sen2': {'revisit': 5, 'noise': 0.02, 'daily_probability': None},
+    'Planet': {'revisit': None, 'noise': 0.04, 'daily_probability': 0.35},
+    'Lan8': {'revisit': 16, 'noise': 0.03, 'daily_probability': None},
+    'Lan7': {'revisit': 16, 'noise': 0.035, 'daily_probability': None},
+}
+
+#length of the simulated season: March 1st to July 31st
+SEASON_DAYS = 153
+
+#function to simulate the true NDVI of n seasons on a daily grid, with mowing drops at known days
+#growth is a logistic curve; a cut lowers NDVI by 35 to 55 % and the sward regrows within about three weeks
+#returns the daily NDVI (n x SEASON_DAYS) and the cut days of every season (-1 where there are fewer cuts)
+def simulate_seasons(n, rng, max_cuts=3):
+    days = np.arange(SEASON_DAYS)
+    green_up = rng.uniform(30, 55, size=(n, 1))
+    ndvi = 0.25 + 0.55 / (1 + np.exp(-(days - green_up) / 8))
+
+    n_cuts = rng.choice(np.arange(max_cuts + 1), size=n, p=[0.15, 0.45, 0.3, 0.1][:max_cuts + 1])
+    cut_days = np.full((n, max_cuts), -1)
+    next_cut = rng.integers(65, 96, size=n)
+    for k in range(max_cuts):
+        has_cut = (k < n_cuts) & (next_cut < SEASON_DAYS - 3)
+        cut_days[has_cut, k] = next_cut[has_cut]
+        depth = rng.uniform(0.35, 0.55, size=n)
+        regrowth = rng.uniform(7, 12, size=n)
+        since_cut = days - next_cut[:, None]
+        effect = np.where(since_cut >= 0, 1 - depth[:, None] * np.exp(-np.maximum(since_cut, 0) / regrowth[:, None]), 1)
+        ndvi = np.where(has_cut[:, None], ndvi * effect, ndvi)
+        next_cut = next_cut + rng.integers(25, 41, size=n)
+
+    return ndvi, cut_days
+
+#function to create realistic multi-satellite NDVI series with known mowing dates
+#revisit gaps per satellite, cloud dropouts shared by all satellites on a day (cloud_probability),
+#sensor noise and outliers (residual clouds and shadows lowering NDVI, outlier_probability)
+#seasons are simulated in blocks of block_size, so memory grows with the observations kept only
+#returns a dict of satellite -> observations (date, NDVI, field_id, sat_name) and the reference cuts (year, field_id, date)
+def make_multisensor_dataset(n_field_seasons, years=(2017, 2018, 2019, 2020, 2021, 2022), regions=('KM', 'LM', 'AL'),
+                             cloud_probability=0.35, outlier_probability=0.03, sensors=SENSORS, block_size=20000, seed=42):
+    rng = np.random.default_rng(seed)
+    n_years = len(years)
+    n_fields = max(1, -(-n_field_seasons // n_years))
+    regions = np.asarray(regions)
+    field_names = np.char.add(regions[np.arange(n_fields) % len(regions)], np.arange(n_fields).astype(str))
+
+    observations = {sensor: [] for sensor in sensors}
+    reference = []
+    for block_start in range(0, n_field_seasons, block_size):
+        seasons = np.arange(block_start, min(block_start + block_size, n_field_seasons))
+        n = len(seasons)
+        field_id = field_names[seasons % n_fields]
+        year = np.asarray(years)[seasons // n_fields % n_years]
+        season_start = pd.to_datetime([f'{y}-03-01' for y in year]).values.astype('datetime64[D]')
+
+        ndvi, cut_days = simulate_seasons(n, rng)
+        cloudy = rng.random((n, SEASON_DAYS)) < cloud_probability
+
+        season_index, cut_index = np.nonzero(cut_days >= 0)
+        reference.append(pd.DataFrame({
+            'year': year[season_index],
+            'field_id': field_id[season_index],
+            'date': pd.to_datetime(season_start[season_index] + cut_days[season_index, cut_index].astype('timedelta64[D]')),
+        }))
+
+        for sensor, settings in sensors.items():
+            if settings['revisit'] is None:
+                acquired = rng.random((n, SEASON_DAYS)) < settings['daily_probability']
+            else:
+                offset = rng.integers(0, settings['revisit'], size=(n, 1))
+                acquired = (np.arange(SEASON_DAYS) % settings['revisit']) == offset
+            rows, days = np.nonzero(acquired & ~cloudy)
+
+            values = ndvi[rows, days] + rng.normal(0, settings['noise'], size=len(rows))
+            is_outlier = rng.random(len(rows)) < outlier_probability
+            values[is_outlier] *= rng.uniform(0.2, 0.6, size=is_outlier.sum())
+
+            observations[sensor].append(pd.DataFrame({
+                'date': pd.to_datetime(season_start[rows] + days.astype('timedelta64[D]')),
+                'NDVI': np.clip(values, -0.1, 1),
+                'field_id': field_id[rows],
+                'sat_name': sensor,
+            }))
+
+    observations = {sensor: pd.concat(frames, ignore_index=True) for sensor, frames in observations.items()}
+    return observations, pd.concat(reference, ignore_index=True)
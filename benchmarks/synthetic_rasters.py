@@ -0,0 +1,94 @@
+#small generators of Planet (Dove) and Sentinel-2 scenes for benchmarking
+import os
+
+import numpy as np
+import rasterio
+from rasterio.transform import from_origin
+
+#function to write one 4-band SR image and its 8-band udm2 file with random clouds and shadows
+#returns the paths of the image and the udm2 file
+def write_dove_scene(directory, scene_id, width=1000, height=800, cloud_fraction=0.002, seed=0):
+    rng = np.random.default_rng(seed)
+    profile = {
+        'driver': 'GTiff', 'width': width, 'height': height, 'crs': 'EPSG:32632',
+        'transform': from_origin(700000, 5400000, 3, 3), 'nodata': 0,
+    }
+
+    img_file = os.path.join(directory, f"{scene_id}_AnalyticMS_SR_harmonized_clip.tif")
+    reflectance = rng.integers(1, 6000, size=(4, height, width), dtype=np.uint16)
+    with rasterio.open(img_file, 'w', count=4, dtype='uint16', **profile) as dst:
+        dst.write(reflectance)
+
+    udm2_file = os.path.join(directory, f"{scene_id}_udm2_clip.tif")
+    udm2 = np.zeros((8, height, width), dtype=np.uint8)
+    udm2[2] = rng.random((height, width)) < cloud_fraction
+    udm2[5] = rng.random((height, width)) < cloud_fraction
+    with rasterio.open(udm2_file, 'w', count=8, dtype='uint8', **profile) as dst:
+        dst.write(udm2)
+
+    return img_file, udm2_file
+
+#function to write one Sentinel-2 L2A scene (B4, B8 at 10 m, SCL and cloud probability at 20 m)
+#with square clouds whose shadows fall on dark pixels away from the sun
+#boa_add_offset=-1000 stores the bands like products of processing baseline 04.00 (reflectance * 1e4 + 1000)
+#returns a scene index row (see mowing/sentinel2.py)
+def write_sentinel2_scene(directory, scene_id, size=1200, n_clouds=5, solar_azimuth=160.0, date='2020-05-01', seed=0,
+                          boa_add_offset=0):
+    rng = np.random.default_rng(seed)
+    profile = {'driver': 'GTiff', 'count': 1, 'crs': 'EPSG:32632'}
+    fine = {**profile, 'width': size, 'height': size, 'transform': from_origin(700000, 5400000, 10, 10)}
+    coarse = {**profile, 'width': size // 2, 'height': size // 2, 'transform': from_origin(700000, 5400000, 20, 20)}
+
+    red = rng.integers(300, 800, size=(size, size), dtype=np.uint16)
+    nir = rng.integers(2500, 4500, size=(size, size), dtype=np.uint16)
+    cloud_probability = rng.integers(0, 30, size=(size // 2, size // 2), dtype=np.uint8)
+    scl = np.full((size // 2, size // 2), 4, dtype=np.uint8)
+
+    #clouds, and dark shadow pixels 500 m away from the sun
+    angle = np.deg2rad(90 - solar_azimuth)
+    shadow_rows, shadow_cols = int(round(50 * np.sin(angle))), int(round(-50 * np.cos(angle)))
+    for row, col in rng.integers(100, size - 200, size=(n_clouds, 2)):
+        cloud_probability[row // 2:row // 2 + 20, col // 2:col // 2 + 20] = 90
+        shadow = slice(row + shadow_rows, row + shadow_rows + 40), slice(col + shadow_cols, col + shadow_cols + 40)
+        nir[shadow] = 800
+    red, nir = red + np.uint16(-boa_add_offset), nir + np.uint16(-boa_add_offset)
+
+    paths = {}
+    for band, data, band_profile in [('B4', red, fine), ('B8', nir, fine), ('SCL', scl, coarse),
+                                     ('cloud_probability', cloud_probability, coarse)]:
+        paths[band] = os.path.join(directory, f"{scene_id}_{band}.tif")
+        with rasterio.open(paths[band], 'w', dtype=data.dtype, **band_profile) as dst:
+            dst.write(data, 1)
+
+    return {'date': date, **paths, 'solar_azimuth': solar_azimuth, 'boa_add_offset': boa_add_offset}
+
+#function to write one Landsat Collection 2 Level-2 product (red, NIR, QA_PIXEL and QA_RADSAT at 30 m)
+#NDVI varies smoothly in space; clouds are set in QA_PIXEL (bit 3) as random squares
+#returns the product directory, named like the product ID
+def write_landsat_product(directory, sat_name='Lan8', date='2020-05-01', size=400, n_clouds=5, seed=0):
+    from scipy.ndimage import gaussian_filter
+
+    from mowing.landsat import OPTICAL_OFFSET, OPTICAL_SCALE, SENSORS
+
+    rng = np.random.default_rng(seed)
+    settings = SENSORS[sat_name]
+    product_id = f"{settings['prefix']}_L2SP_193026_{date.replace('-', '')}_20200820_02_T1"
+    product_directory = os.path.join(directory, product_id)
+    os.makedirs(product_directory, exist_ok=True)
+    profile = {'driver': 'GTiff', 'count': 1, 'crs': 'EPSG:32632', 'width': size, 'height': size,
+               'transform': from_origin(700000, 5400000, 30, 30)}
+
+    ndvi = np.clip(0.6 + 3 * gaussian_filter(rng.normal(0, 0.2, size=(size, size)), 4), 0.05, 0.95)
+    red = 0.04 + 0.02 * rng.random((size, size))
+    nir = red * (1 + ndvi) / (1 - ndvi)
+    qa_pixel = np.full((size, size), 21824, dtype=np.uint16)
+    for row, col in rng.integers(0, size - 20, size=(n_clouds, 2)):
+        qa_pixel[row:row + 20, col:col + 20] |= 1 << 3
+
+    for band, data in [(settings['red'], ((red - OPTICAL_OFFSET) / OPTICAL_SCALE).astype(np.uint16)),
+                       (settings['nir'], ((nir - OPTICAL_OFFSET) / OPTICAL_SCALE).astype(np.uint16)),
+                       ('QA_PIXEL', qa_pixel), ('QA_RADSAT', np.zeros((size, size), dtype=np.uint16))]:
+        with rasterio.open(os.path.join(product_directory, f"{product_id}_{band}.TIF"), 'w', dtype=data.dtype, **profile) as dst:
+            dst.write(data, 1)
+
+    return product_directory
@@ -0,0 +1,2 @@
+#shared, vectorised building blocks for the mowing detection scripts (4_ to 7_)
+#the numbered scripts import from here so that each stage runs in linear time
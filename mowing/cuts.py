@@ -0,0 +1,75 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+from mowing import storage
+from mowing.features import sorted_group_codes
+
+#NDVI decrease to the forelast observation that indicates a cut
+CUT_THRESHOLD = -0.1
+
+#months without cuts (March and April), removed before detection
+EXCLUDED_MONTHS = (3, 4)
+
+#function to flag the first row of every run of True values inside each group of a group-sorted array
+def run_starts_sorted(condition, sorted_codes):
+    starts = condition.copy()
+    if len(condition) > 1:
+        continues_run = condition[:-1] & (sorted_codes[1:] == sorted_codes[:-1])
+        starts[1:] &= ~continues_run
+    return starts
+
+#function to detect cutting dates for every year-field_id combination
+#a cut is the first date of each cluster of consecutive observations with dif_to_forelast <= threshold
+#returns one row per year-field_id with the columns year, field_id, cut_1 ... cut_n
+def detect_cuts(dataframe, threshold=CUT_THRESHOLD, excluded_months=EXCLUDED_MONTHS, date_format='%d/%m/%Y'):
+    dataframe = dataframe[~dataframe['date'].dt.month.isin(excluded_months) & dataframe['date'].notna()]  # Remove months without cuts and missing dates
+    dataframe = dataframe.sort_values(by='date')                                               # Sort by ascending
+    dataframe = dataframe[dataframe['field_id'].notna()]                                       # Rows without field are not grouped
+
+    year = dataframe['date'].dt.year
+    keys = pd.DataFrame({'year': year, 'field_id': dataframe['field_id']})
+    codes = keys.groupby(['year', 'field_id'], sort=True, observed=True).ngroup().to_numpy()   # Codes follow sorted year-field_id order
+    order = np.argsort(codes, kind='stable')
+    sorted_codes = codes[order]
+
+    drops = dataframe['dif_to_forelast'].to_numpy(dtype=float, na_value=np.nan)[order]
+    starts = np.flatnonzero(run_starts_sorted(drops <= threshold, sorted_codes))
+
+    #one row per year-field_id, in the same order as the groups
+    group_first = np.flatnonzero(np.r_[True, sorted_codes[1:] != sorted_codes[:-1]]) if len(codes) else np.array([], dtype=int)
+    result = pd.DataFrame({
+        'year': year.to_numpy()[order][group_first],
+        'field_id': dataframe['field_id'].to_numpy()[order][group_first],
+    })
+
+    #position of every cut within its year-field_id combination
+    start_codes = sorted_codes[starts]
+    cut_number = np.arange(len(starts)) - np.searchsorted(start_codes, start_codes, side='left')
+    cut_dates = dataframe['date'].to_numpy()[order][starts]
+
+    if len(starts):
+        formatted = pd.DatetimeIndex(cut_dates).strftime(date_format).to_numpy(dtype=object)
+        wide = np.full((len(result), cut_number.max() + 1), np.nan, dtype=object)
+        wide[start_codes, cut_number] = formatted
+        for i in range(wide.shape[1]):
+            result[f'cut_{i + 1}'] = wide[:, i]
+
+    return result
+
+#function to find cutting dates and save them as CSV, or as Parquet with datetime cut columns
+#detect is the cut detection function, e.g. fieldseasons.detect_cuts_frame (same results on the compact store)
+#date_format is the format of the cut dates written to CSV; for Parquet, the cut columns are parsed back with it
+def find_cut_dates(dataframe, output_csv, file_format='csv', detect=detect_cuts, date_format='%d/%m/%Y'):
+    dataframe['date'] = pd.to_datetime(dataframe['date'], format="%d/%m/%Y")                   # Convert df dates to datetime
+    csv_df = detect(dataframe, date_format=date_format)
+    if csv_df.empty:
+        csv_df = pd.DataFrame()
+
+    if file_format == 'parquet':
+        cut_columns = [column for column in csv_df.columns if column.startswith('cut_')]
+        typed_df = csv_df.assign(**{column: pd.to_datetime(csv_df[column], format=date_format) for column in cut_columns})
+        storage.save_dataset(typed_df, output_csv, file_format)
+    else:
+        storage.save_dataset(csv_df, output_csv, file_format)
+    return csv_df
@@ -0,0 +1,51 @@
+#the following python modules need to be installed:
+import pandas as pd
+
+#priority of the satellites when several observe a field on the same date, highest first
+SENSOR_PRIORITY = ('Sen2', 'Planet', 'Lan8', 'Lan7')
+
+#function to rank the satellites of every row by priority as an ordered categorical
+#satellites missing from priority rank after all listed ones, in alphabetical order
+def sensor_rank(sat_names, priority=SENSOR_PRIORITY):
+    others = sorted(set(sat_names.dropna().unique()) - set(priority))
+    return pd.Categorical(sat_names, categories=list(priority) + others, ordered=True)
+
+#function to keep one observation per date-field_id combination, preferring satellites by priority
+#collisions are resolved with one sort and one pass over the sorted keys; within one satellite the
+#highest NDVI is kept (clouds and shadows lower NDVI), so the result does not depend on the row order
+#returns the de-duplicated rows sorted by date and field_id, and the collision statistics
+def resolve_duplicates(df, priority=SENSOR_PRIORITY, keys=('date', 'field_id'), value_column='NDVI'):
+    keys = list(keys)
+    ranked = df.assign(_rank=sensor_rank(df['sat_name'], priority))
+    ranked = ranked.sort_values(keys + ['_rank', value_column], ascending=[True] * (len(keys) + 1) + [False],
+                                kind='mergesort', na_position='last')
+
+    dropped = ranked.duplicated(subset=keys, keep='first').to_numpy()
+    kept = ranked.loc[~dropped].drop(columns='_rank')
+
+    #satellite kept for the key of every dropped row, by forward-filling the kept satellite
+    kept_sensor = ranked['sat_name'].where(~dropped).ffill()
+    statistics = (
+        pd.DataFrame({'kept': kept_sensor[dropped].to_numpy(), 'dropped': ranked.loc[dropped, 'sat_name'].to_numpy()})
+        .value_counts()
+        .rename('collisions')
+        .reset_index()
+    )
+
+    return kept.reset_index(drop=True), statistics
+
+#function to print the collision statistics of resolve_duplicates
+def report_collisions(statistics):
+    if statistics.empty:
+        print("No duplicate date-field_id combinations found.")
+    else:
+        print("Duplicate date-field_id combinations resolved (kept satellite, dropped satellite):")
+        print(statistics.to_string(index=False))
+
+#function to merge the processed dataframes of all satellites
+#the result is the same regardless of the order of dataframes_list
+def merge_dfs(dataframes_list, priority=SENSOR_PRIORITY):
+    merged_df = pd.concat(dataframes_list, ignore_index=True)
+    unique_df, statistics = resolve_duplicates(merged_df, priority)
+    report_collisions(statistics)
+    return unique_df
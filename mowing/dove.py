@@ -0,0 +1,356 @@
+#the following python modules need to be installed:
+import glob
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+import shapefile
+from dbfread import DBF
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+from scipy.ndimage import binary_dilation
+
+#number of pixels to buffer the identified clouds and cloud shadows by
+BUFFER_SIZE = 7
+
+#size of the square tiles masked at once, in pixels (a multiple of 16, as it is also the block size of compressed outputs)
+TILE_SIZE = 512
+
+#output profiles of the masked images
+#float64 is the former output (with compress=None); float32 keeps the scaled reflectance at half the size
+#and is the default, compressed with DEFLATE;
+#int16 keeps the original digital numbers (reflectance x 10000) and stores the 1/10000 scale as metadata
+#predictor 3 (floating point) and 2 (horizontal differencing) help DEFLATE/ZSTD compression
+OUTPUT_PROFILES = {
+    'float64': {'dtype': 'float64', 'predictor': 3},
+    'float32': {'dtype': 'float32', 'predictor': 3},
+    'int16': {'dtype': 'int16', 'predictor': 2},
+}
+
+#reflectance scale of the Planet surface reflectance products
+REFLECTANCE_SCALE = 10000.0
+
+#image products that can accompany a udm2 file, in order of preference
+IMAGE_SUFFIXES = (
+    "_AnalyticMS_SR_harmonized_clip.tif",
+    "_AnalyticMS_SR_8b_harmonized_clip.tif",
+    "_BGRN_SR_clip.tif",
+)
+
+#function to find the image belonging to a udm2 file
+def find_image_for_udm2(udm2_file, input_directory):
+    img_prefix = os.path.basename(udm2_file).split("_udm2_clip.tif")[0]
+    for suffix in IMAGE_SUFFIXES:
+        full_img_path = os.path.join(input_directory, img_prefix + suffix)
+        if os.path.exists(full_img_path):
+            return full_img_path
+    return None
+
+#function to grow a window by a margin of pixels, clipped to the raster size
+#returns the grown window and the position of the original window inside it
+def expand_window(window, margin, width, height):
+    col_off = max(window.col_off - margin, 0)
+    row_off = max(window.row_off - margin, 0)
+    col_end = min(window.col_off + window.width + margin, width)
+    row_end = min(window.row_off + window.height + margin, height)
+    expanded = Window(col_off, row_off, col_end - col_off, row_end - row_off)
+    inner = (slice(window.row_off - row_off, window.row_off - row_off + window.height),
+             slice(window.col_off - col_off, window.col_off - col_off + window.width))
+    return expanded, inner
+
+#function to split a raster into square windows of tile_size pixels, row by row (smaller at the right and bottom edges)
+def tile_windows(width, height, tile_size=TILE_SIZE):
+    return [Window(col, row, min(tile_size, width - col), min(tile_size, height - row))
+            for row in range(0, height, tile_size) for col in range(0, width, tile_size)]
+
+#function to compute the block size of a tiled GeoTIFF: tile_size, but at most the raster size rounded up
+#to a multiple of 16, so that small images are not padded to whole tiles
+def block_size(length, tile_size=TILE_SIZE):
+    return min(tile_size, -(-length // 16) * 16)
+
+#function to compute the buffered cloud and shadow mask of one window
+#the udm2 window is read with a margin of buffer_size pixels, so that clouds just outside
+#the window still buffer into it and tiles give the same result as the full scene
+def buffered_mask(udm2_src, window, buffer_size=BUFFER_SIZE):
+    expanded, inner = expand_window(window, buffer_size, udm2_src.width, udm2_src.height)
+    shadow_mask = udm2_src.read(3, window=expanded).astype(bool)
+    cloud_mask = udm2_src.read(6, window=expanded).astype(bool)
+    mask = shadow_mask + cloud_mask
+    if buffer_size > 0 and mask.any():
+        mask = binary_dilation(mask, iterations=buffer_size)
+    return mask[inner]
+
+#function to mask one Planet (Dove) image tile by tile
+#reflectance is scaled by 1/10000 and pixels under the buffered cloud and shadow mask are set to nodata (0 by default)
+#only one tile (plus its buffer margin) is held in memory at a time
+#output_profile is one of OUTPUT_PROFILES; compress may be None, 'deflate' or 'zstd'
+#compressed outputs are tiled (see block_size), uncompressed ones keep the block layout of the input image
+def process_image(img_file, udm2_file, output_directory, buffer_size=BUFFER_SIZE, tile_size=TILE_SIZE,
+                  output_profile='float32', compress='deflate', nodata=0):
+    if output_profile not in OUTPUT_PROFILES:
+        raise ValueError(f"output_profile must be one of {sorted(OUTPUT_PROFILES)}, not {output_profile!r}")
+    output_settings = OUTPUT_PROFILES[output_profile]
+    output_file = os.path.join(output_directory, f"{os.path.basename(img_file).split('.')[0]}_masked.tif")
+
+    with rasterio.open(img_file) as src, rasterio.open(udm2_file) as udm2_src:
+        profile = src.profile
+        profile.update(count=src.count, dtype=output_settings['dtype'])
+        if compress:
+            profile.update(compress=compress, predictor=output_settings['predictor'], tiled=True,
+                           blockxsize=block_size(src.width, tile_size), blockysize=block_size(src.height, tile_size))
+        else:
+            profile.pop('compress', None)
+        if output_profile == 'int16':
+            profile.update(nodata=nodata)
+
+        with rasterio.open(output_file, "w", **profile) as dst_idx:
+            if output_profile == 'int16':
+                dst_idx.scales = [1 / REFLECTANCE_SCALE] * src.count
+
+            for window in tile_windows(src.width, src.height, tile_size):
+                mask = buffered_mask(udm2_src, window, buffer_size)
+                if output_profile == 'int16':
+                    work_data = np.clip(src.read(window=window), -32767, 32767).astype(np.int16)
+                else:
+                    work_data = (src.read(window=window) / REFLECTANCE_SCALE).astype(output_settings['dtype'], copy=False)
+                work_data[:, mask] = nodata
+                dst_idx.write(work_data, window=window)
+
+    return output_file
+
+#function to mask one udm2 file and its image, used by the process pool
+def _mask_scene(udm2_file, input_directory, output_directory, buffer_size, tile_size, output_profile, compress):
+    full_img_path = find_image_for_udm2(udm2_file, input_directory)
+    if full_img_path is None:
+        return udm2_file, None
+    return udm2_file, process_image(full_img_path, udm2_file, output_directory, buffer_size, tile_size,
+                                    output_profile=output_profile, compress=compress)
+
+#function to mask batches of Planet (Dove) imagery
+#scenes are spread over a pool of processes (processes=None uses all cores, processes=1 runs serially)
+#on Windows, call this from within an `if __name__ == '__main__':` block
+#output_profile and compress are passed on to process_image
+def mask_all_images(input_directory, output_directory, processes=None, buffer_size=BUFFER_SIZE, tile_size=TILE_SIZE,
+                    output_profile='float32', compress='deflate'):
+    udm2_files = sorted(glob.glob(os.path.join(input_directory, "*_udm2_clip.tif")))
+    print("Files to be processed:", len(udm2_files))
+
+    processes = processes or os.cpu_count() or 1
+    args = (input_directory, output_directory, buffer_size, tile_size, output_profile, compress)
+
+    if processes == 1 or len(udm2_files) <= 1:
+        results = (_mask_scene(udm2_file, *args) for udm2_file in udm2_files)
+        output_files = _report_masked(results)
+    else:
+        #fork avoids re-importing the calling script in every worker where it is available
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            results = executor.map(_mask_scene, udm2_files, *[[arg] * len(udm2_files) for arg in args])
+            output_files = _report_masked(results)
+
+    return output_files
+
+#function to print the outcome of each masked scene and collect the written files
+def _report_masked(results):
+    output_files = []
+    for udm2_file, output_file in results:
+        if output_file is None:
+            print(f"Warning: No corresponding image found for {udm2_file}.")
+        else:
+            print("Image processed successfully:", output_file)
+            output_files.append(output_file)
+    return output_files
+
+#red and near-infrared band numbers by number of bands in the Planet product
+#4 bands: blue, green, red, NIR; 8 bands: coastal blue, blue, green I, green, yellow, red, red edge, NIR
+NDVI_BANDS = {4: (3, 4), 8: (6, 8)}
+
+#function to read field polygons and their IDs from a shapefile
+#returns a list of (geometry, field_id) pairs in GeoJSON-like form
+def read_fields(field_shapefile, field_id_column='field_id'):
+    with shapefile.Reader(field_shapefile) as reader:
+        return [(shape_record.shape.__geo_interface__, shape_record.record[field_id_column])
+                for shape_record in reader.iterShapeRecords()]
+
+#number of label rasters kept in a label cache; clipped scene footprints rarely repeat,
+#so only the most recently used grids are kept
+LABEL_CACHE_SIZE = 32
+
+#function to get the label raster of the fields on a scene grid
+#pixels are labelled with the position of the field (1-based) whose polygon contains their centre, 0 elsewhere
+#label rasters are cached by grid (least recently used ones are dropped beyond max_cached grids),
+#so scenes with the same footprint only rasterize the fields once
+def field_labels(fields, crs, transform, width, height, label_cache=None, fields_crs=None, max_cached=LABEL_CACHE_SIZE):
+    grid_key = (str(crs), tuple(transform), width, height)
+    if label_cache is not None and grid_key in label_cache:
+        labels = label_cache.pop(grid_key)
+        label_cache[grid_key] = labels
+        return labels
+
+    geometries = [geometry for geometry, _ in fields]
+    if fields_crs is not None and str(fields_crs) != str(crs):
+        geometries = [transform_geom(fields_crs, crs, geometry) for geometry in geometries]
+
+    labels = rasterize(
+        ((geometry, label) for label, geometry in enumerate(geometries, start=1)),
+        out_shape=(height, width), transform=transform, fill=0, dtype='int32'
+    )
+    if label_cache is not None:
+        label_cache[grid_key] = labels
+        while len(label_cache) > max_cached:
+            del label_cache[next(iter(label_cache))]
+    return labels
+
+#function to compute the median of values for every label with one sort, without a loop over labels
+#NaN values and label 0 are ignored; returns the labels found and their medians
+def label_medians(values, labels):
+    values = values.ravel()
+    labels = labels.ravel()
+    valid = (labels > 0) & ~np.isnan(values)
+    values, labels = values[valid], labels[valid]
+    if len(values) == 0:
+        return np.array([], dtype=labels.dtype), np.array([], dtype=float)
+
+    order = np.lexsort((values, labels))
+    values, labels = values[order], labels[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    counts = np.diff(np.r_[starts, len(labels)])
+
+    lower = values[starts + (counts - 1) // 2]
+    upper = values[starts + counts // 2]
+    return labels[starts], (lower.astype(float) + upper) / 2
+
+#function to calculate the NDVI median of every field in one masked image
+#masked pixels (nodata or 0 in both bands) are left out
+def zonal_ndvi_medians(masked_file, fields, label_cache=None, fields_crs=None):
+    with rasterio.open(masked_file) as src:
+        red_band, nir_band = NDVI_BANDS[src.count]
+        labels = field_labels(fields, src.crs, src.transform, src.width, src.height, label_cache, fields_crs)
+        red, nir = src.read([red_band, nir_band]).astype(np.float32)
+        nodata = src.nodata
+
+    masked = (red == 0) & (nir == 0)
+    if nodata is not None:
+        masked |= (red == nodata) | (nir == nodata)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = (nir - red) / (nir + red)
+    ndvi[masked] = np.nan
+
+    field_positions, medians = label_medians(ndvi, labels)
+    field_ids = [fields[position - 1][1] for position in field_positions]
+    return pd.DataFrame({'NDVI': medians, 'field_id': field_ids})
+
+#function to get the scene ID of a masked image, e.g. 20220501_101010_1234_3B
+def scene_id_from_masked(masked_file):
+    base_name = os.path.basename(masked_file)
+    for suffix in IMAGE_SUFFIXES:
+        product = suffix[:-len('.tif')] + '_masked.tif'
+        if base_name.endswith(product):
+            return base_name[:-len(product)]
+    return base_name.split('_masked.tif')[0]
+
+#function to read the acquisition date and cloud cover of a scene from its Planet metadata file
+def read_scene_metadata(metadata_file):
+    with open(metadata_file, "r") as f:
+        properties = json.load(f)["properties"]
+    return properties["acquired"].split("T")[0], properties.get("cloud_cover", np.nan)
+
+#function to build the Planet NDVI table directly from the masked images
+#replaces the external zonal statistics, the .dbf to .csv conversion and the CSV merge
+#returns one row per scene and field with the columns date, NDVI, field_id and cloud_cover
+def extract_planet_ndvi(masked_directory, metadata_path, field_shapefile, field_id_column='field_id', fields_crs=None):
+    fields = read_fields(field_shapefile, field_id_column)
+    label_cache = {}
+    scene_tables = []
+
+    for masked_file in sorted(glob.glob(os.path.join(masked_directory, "*_masked.tif"))):
+        scene_id = scene_id_from_masked(masked_file)
+        metadata_file = os.path.join(metadata_path, f"{scene_id}_metadata.json")
+        if not os.path.exists(metadata_file):
+            print(f"No metadata file found for {masked_file}")
+            continue
+
+        date, cloud_cover = read_scene_metadata(metadata_file)
+        medians = zonal_ndvi_medians(masked_file, fields, label_cache, fields_crs)
+        scene_tables.append(medians.assign(date=date, cloud_cover=cloud_cover))
+
+    if not scene_tables:
+        return pd.DataFrame(columns=["date", "NDVI", "field_id", "cloud_cover"])
+    return pd.concat(scene_tables, ignore_index=True).loc[:, ["date", "NDVI", "field_id", "cloud_cover"]]
+
+#function to index the .dbf files of a directory by scene ID, with a single directory scan
+#every '_'-separated prefix of a file name is a key, e.g. 20220501_101010_1234_3B_AnalyticMS_masked.dbf
+#is found under 20220501, 20220501_101010, ... ; the first file in directory order wins
+def index_dbf_files(masked_files):
+    dbf_index = {}
+    with os.scandir(masked_files) as entries:
+        for entry in entries:
+            if not (entry.name.endswith(".dbf") and entry.is_file()):
+                continue
+            parts = entry.name[:-len(".dbf")].split('_')
+            for i in range(1, len(parts) + 1):
+                dbf_index.setdefault('_'.join(parts[:i]), entry.path)
+    return dbf_index
+
+#function to turn one .dbf file into a .csv with the date of its metadata file
+#returns the written CSV file, or None if no valid rows remain
+def convert_dbf_file(dbf_file, metadata_file, output_path):
+    base_name = os.path.splitext(os.path.basename(metadata_file))[0]
+
+    # Convert the .dbf file to a pandas DataFrame
+    table = DBF(dbf_file, encoding='utf-8')
+    df = pd.DataFrame(iter(table))
+
+    # Extract "acquired" and populate date
+    date, _ = read_scene_metadata(metadata_file)
+    df["date"] = date
+
+    # Filter and rename columns, filter out rows where NDVI is null or missing
+    df = df[["date", "_median", "field_id"]].rename(columns={"_median": "NDVI"})
+    df = df[df["NDVI"].notnull()]
+
+    if df.empty:
+        return None
+
+    csv_file = os.path.join(output_path, base_name + ".csv")
+    df.to_csv(csv_file, index=False)
+    return csv_file
+
+#function to turn .dbf files into .csv
+#metadata files are matched to .dbf files through an index built with one directory scan,
+#the conversions run in a pool of threads; unmatched and empty scenes are reported in one summary
+def process_dbf_files(masked_files, metadata_path, output_path, max_workers=8):
+    metadata_files = sorted(glob.glob(os.path.join(metadata_path, "*_metadata.json")))
+    dbf_index = index_dbf_files(masked_files)
+
+    matched, unmatched = [], []
+    for metadata_file in metadata_files:
+        base_name = os.path.splitext(os.path.basename(metadata_file))[0]
+        matching_key = '_'.join(base_name.split('_')[:-1])  # Get the matching key up to the last underscore
+        if matching_key in dbf_index:
+            matched.append((dbf_index[matching_key], metadata_file))
+        else:
+            unmatched.append(metadata_file)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        csv_files = list(executor.map(lambda pair: convert_dbf_file(*pair, output_path), matched))
+
+    empty = [metadata_file for (_, metadata_file), csv_file in zip(matched, csv_files) if csv_file is None]
+    summary = {
+        'converted': [csv_file for csv_file in csv_files if csv_file is not None],
+        'unmatched': unmatched,
+        'empty': empty,
+    }
+
+    print(f"Converted {len(summary['converted'])} of {len(metadata_files)} scenes to CSV")
+    if unmatched:
+        print(f"No matching .dbf file found for {len(unmatched)} metadata files:", *unmatched, sep="\n  ")
+    if empty:
+        print(f"No valid rows remaining for {len(empty)} scenes, skipped CSV generation:", *empty, sep="\n  ")
+
+    return summary
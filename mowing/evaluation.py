@@ -0,0 +1,55 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+#function to turn the wide cut table (year, field_id, cut_1 ... cut_n) into one row per cut
+def cuts_to_long(cut_dates, date_format='%d/%m/%Y'):
+    cut_columns = [column for column in cut_dates.columns if column.startswith('cut_')]
+    long = cut_dates.melt(id_vars=['year', 'field_id'], value_vars=cut_columns, value_name='date').dropna(subset=['date'])
+    dates = long['date'] if pd.api.types.is_datetime64_any_dtype(long['date']) else pd.to_datetime(long['date'], format=date_format)
+    return pd.DataFrame({'year': long['year'].to_numpy(), 'field_id': long['field_id'].astype(str).to_numpy(),
+                         'date': dates.to_numpy()})
+
+#function to add the range of ± 1 observation around every detected cut
+#observations are the dates of the series the cuts were detected in (e.g. the smoothed dataset)
+def add_observation_range(detected, observations):
+    series = pd.DataFrame({
+        'year': observations['date'].dt.year.to_numpy(),
+        'field_id': observations['field_id'].astype(str).to_numpy(),
+        'date': observations['date'].to_numpy(),
+    }).sort_values(['year', 'field_id', 'date'], kind='mergesort')
+    same_series = series[['year', 'field_id']].eq(series[['year', 'field_id']].shift()).all(axis=1)
+    series['earliest'] = series['date'].shift().where(same_series, series['date'])
+    following_same = series[['year', 'field_id']].eq(series[['year', 'field_id']].shift(-1)).all(axis=1)
+    series['latest'] = series['date'].shift(-1).where(following_same, series['date'])
+    return detected.merge(series, on=['year', 'field_id', 'date'], how='left')
+
+#function to compare detected cuts with reference mowing dates, with a tolerance of ± 1 observation
+#a reference cut is found when it lies within the range of a detected cut of the same year-field_id;
+#returns recall (share of reference cuts found), precision (share of detections matching a reference cut)
+#and their F1 score, together with the numbers they are based on
+def score_cuts(cut_dates, reference, observations, date_format='%d/%m/%Y'):
+    detected = add_observation_range(cuts_to_long(cut_dates, date_format), observations)
+    return score_detections(detected, reference)
+
+#function to score detected cuts that already have their range (year, field_id, date, earliest, latest),
+#e.g. from add_observation_range or fieldseasons.cut_ranges
+def score_detections(detected, reference):
+    detected = detected.assign(detection=np.arange(len(detected)))
+    reference = reference.assign(field_id=reference['field_id'].astype(str), reference=np.arange(len(reference)))
+
+    pairs = detected.merge(reference.rename(columns={'date': 'reference_date'}), on=['year', 'field_id'])
+    hits = pairs[(pairs['earliest'] <= pairs['reference_date']) & (pairs['reference_date'] <= pairs['latest'])]
+
+    found = hits['reference'].nunique()
+    matching = hits['detection'].nunique()
+    recall = found / len(reference) if len(reference) else np.nan
+    precision = matching / len(detected) if len(detected) else np.nan
+    return {
+        'reference_cuts': len(reference),
+        'detected_cuts': len(detected),
+        'found_cuts': found,
+        'recall': recall,
+        'precision': precision,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0,
+    }
@@ -0,0 +1,108 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+#threshold of NDVI decrease (to both neighbours) that marks an observation as a valley
+VALLEY_THRESHOLD = -0.1
+
+#function to order rows by group while keeping their current order within each group
+#returns the positional order and the group code of every row in that order
+def sorted_group_codes(df, keys):
+    #rows with a missing key get code -1 (recent pandas versions return NaN for them instead)
+    codes = df.groupby(keys, sort=False, observed=True).ngroup().to_numpy(dtype=np.int64, na_value=-1)
+    order = np.argsort(codes, kind='stable')
+    return order, codes[order]
+
+#function to compute value[i] - value[i-lag] inside each group of a group-sorted array
+#rows without a predecessor at distance lag in the same group are NaN
+#a negative lag compares to the following rows instead, like pandas' diff
+def grouped_diff_sorted(values, sorted_codes, lag=1):
+    values = np.asarray(values, dtype=float)
+    result = np.full(len(values), np.nan)
+    if lag == 0:
+        return values - values
+    step = abs(lag)
+    if step >= len(values):
+        return result
+    same_group = sorted_codes[step:] == sorted_codes[:-step]
+    if lag > 0:
+        result[step:] = np.where(same_group, values[step:] - values[:-step], np.nan)
+    else:
+        result[:-step] = np.where(same_group, values[:-step] - values[step:], np.nan)
+    return result
+
+#calculate the valley anomaly input
+#an observation is a valley when it lies at least 0.1 below both neighbours of its year-field_id series
+#produces the same output as the former row-by-row loop in 6_IF_and_SG.py
+#keep_diffs=True also returns the diff_prev/diff_next columns the flag is based on
+def calculate_valley(df, value_column='NDVI', threshold=VALLEY_THRESHOLD, keep_diffs=False):
+    df['valley'] = 0
+    df['date'] = pd.to_datetime(df['date'], format='%d/%m/%Y')
+    df['year'] = df['date'].dt.year
+    df = df.sort_values('date')
+
+    order, sorted_codes = sorted_group_codes(df, ['year', 'field_id'])
+    values = df[value_column].to_numpy(dtype=float)[order]
+
+    diff_prev = np.empty(len(df))
+    diff_next = np.empty(len(df))
+    diff_prev[order] = grouped_diff_sorted(values, sorted_codes, lag=1)
+    diff_next[order] = grouped_diff_sorted(values, sorted_codes, lag=-1)
+
+    #rows without field_id or date have no series (code -1) and are never valleys
+    missing_key = order[sorted_codes < 0]
+    diff_prev[missing_key] = np.nan
+    diff_next[missing_key] = np.nan
+
+    #first and last observations of a series have NaN diffs and are never valleys
+    is_valley = (diff_prev <= threshold) & (diff_next <= threshold)
+    df['valley'] = is_valley.astype(df['valley'].dtype)
+
+    if keep_diffs:
+        df['diff_prev'] = diff_prev
+        df['diff_next'] = diff_next
+
+    return df
+
+#function to get the start offsets of the groups in a group-sorted code array
+#group g occupies the positions offsets[g]:offsets[g + 1]
+def group_offsets(sorted_codes):
+    if len(sorted_codes) == 0:
+        return np.zeros(1, dtype=np.int64)
+    boundaries = np.flatnonzero(sorted_codes[1:] != sorted_codes[:-1]) + 1
+    return np.concatenate(([0], boundaries, [len(sorted_codes)])).astype(np.int64)
+
+#function to compute the difference to the value lag observations earlier within each group
+#rows keep their position; within a group the current row order is used (sort by date first)
+def grouped_diff(df, value_column, keys, lag=1):
+    return grouped_diffs(df, value_column, keys, {'diff': lag})['diff']
+
+#function to compute several lagged differences within each group in one pass
+#lags maps output names to lags, e.g. {'dif_to_last': 1, 'dif_to_forelast': 2}
+def grouped_diffs(df, value_column, keys, lags):
+    order, sorted_codes = sorted_group_codes(df, keys)
+    values = df[value_column].to_numpy(dtype=float, na_value=np.nan)[order]
+    missing_key = order[sorted_codes < 0]
+
+    diffs = {}
+    for name, lag in lags.items():
+        diff = np.empty(len(df))
+        diff[order] = grouped_diff_sorted(values, sorted_codes, lag=lag)
+        diff[missing_key] = np.nan
+        diffs[name] = pd.Series(diff, index=df.index, name=name)
+    return diffs
+
+#temporal features used in this study: NDVI difference to the observation two dates before
+TEMPORAL_LAGS = {'dif_to_forelast': 2}
+
+#function to calculate NDVI differences between the current observation and earlier ones
+#of the same field_id and year, by default the one two observations before (dif_to_forelast)
+def calculate_temporal_features(df, value_column, lags=None):
+    df['date'] = pd.to_datetime(df['date'])
+    df = df.sort_values('date')
+
+    diffs = grouped_diffs(df, value_column, ['field_id', df['date'].dt.year], lags or TEMPORAL_LAGS)
+    for name, diff in diffs.items():
+        df[name] = diff
+
+    return df
@@ -0,0 +1,274 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+from mowing import cuts, features, smoothing
+
+#compact store of NDVI time series: one contiguous array per column, ordered by year-field_id series
+#(field-seasons) and by date within each series, with an offsets index; series s occupies the positions
+#offsets[s]:offsets[s + 1]. Field IDs are integer codes into a table of unique IDs, dates are int32 days
+#of the year and value columns are float32 by default. Slicing returns views (no copy), and smoothing,
+#differences and cut detection run directly on the arrays, without grouping a dataframe again.
+
+class FieldSeasons:
+    __slots__ = ('field_ids', 'field_codes', 'years', 'offsets', 'doy', 'columns')
+
+    #field_ids: unique field IDs; field_codes, years: one entry per series (codes index field_ids);
+    #offsets: n_series + 1 start positions; doy: day of year per observation; columns: name -> values
+    def __init__(self, field_ids, field_codes, years, offsets, doy, columns):
+        self.field_ids = field_ids
+        self.field_codes = field_codes
+        self.years = years
+        self.offsets = offsets
+        self.doy = doy
+        self.columns = columns
+
+    #function to build the store from a long dataframe with date, field_id and value columns
+    #series are ordered by year and field_id, observations by date (rows with equal dates keep their order)
+    #rows without date or field_id are left out
+    @classmethod
+    def from_frame(cls, df, value_columns=('NDVI',), dtype=np.float32):
+        dates = pd.to_datetime(df['date'])
+        valid = (dates.notna() & df['field_id'].notna()).to_numpy()
+        dates = dates[valid]
+        field_codes, field_ids = pd.factorize(df['field_id'][valid], sort=True)
+        years = dates.dt.year.to_numpy(dtype=np.int16)
+        day_of_year = dates.dt.dayofyear.to_numpy(dtype=np.int32)
+
+        order = np.lexsort((dates.to_numpy(), field_codes, years))
+        series_field = field_codes[order].astype(np.int32)
+        series_year = years[order]
+        new_series = np.r_[True, (series_field[1:] != series_field[:-1]) | (series_year[1:] != series_year[:-1])] \
+            if len(order) else np.array([], dtype=bool)
+        starts = np.flatnonzero(new_series)
+
+        return cls(
+            field_ids=np.asarray(field_ids, dtype=object),
+            field_codes=series_field[starts],
+            years=series_year[starts],
+            offsets=np.r_[starts, len(order)].astype(np.int64),
+            doy=day_of_year[order],
+            columns={column: df[column].to_numpy(dtype=dtype, na_value=np.nan)[valid][order] for column in value_columns},
+        )
+
+    def __len__(self):
+        return len(self.field_codes)
+
+    @property
+    def n_observations(self):
+        return int(self.offsets[-1] - self.offsets[0])
+
+    #bytes held by the arrays (the field ID table is counted once)
+    @property
+    def nbytes(self):
+        arrays = [self.field_codes, self.years, self.offsets, self.doy, *self.columns.values()]
+        return sum(array.nbytes for array in arrays) + int(pd.Series(self.field_ids).memory_usage(deep=True, index=False))
+
+    #length of every series
+    def lengths(self):
+        return np.diff(self.offsets)
+
+    #series number of every observation, as the sorted group codes used in mowing/features.py
+    def series_codes(self):
+        return np.repeat(np.arange(len(self), dtype=np.int64), self.lengths())
+
+    #offsets starting at 0, for the arrays of this store (slices keep the offsets of their parent)
+    def local_offsets(self):
+        return self.offsets - self.offsets[0]
+
+    #dates of every observation as datetime64[D]
+    def dates(self):
+        year_starts = (np.repeat(self.years, self.lengths()).astype(np.int64) - 1970).astype('datetime64[Y]').astype('datetime64[D]')
+        return year_starts + (self.doy.astype(np.int64) - 1).astype('timedelta64[D]')
+
+    #function to get the series start:stop as a store sharing the arrays of this one (no copy)
+    def slice(self, start, stop):
+        start, stop, _ = slice(start, stop).indices(len(self))
+        stop = max(start, stop)
+        first, last = self.offsets[start] - self.offsets[0], self.offsets[stop] - self.offsets[0]
+        return FieldSeasons(
+            self.field_ids, self.field_codes[start:stop], self.years[start:stop],
+            self.offsets[start:stop + 1], self.doy[first:last],
+            {name: values[first:last] for name, values in self.columns.items()},
+        )
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step not in (None, 1):
+                raise ValueError("only contiguous slices share the arrays")
+            return self.slice(item.start, item.stop)
+        start, stop = self.offsets[item] - self.offsets[0], self.offsets[item + 1] - self.offsets[0]
+        return {
+            'year': int(self.years[item]),
+            'field_id': self.field_ids[self.field_codes[item]],
+            'doy': self.doy[start:stop],
+            **{name: values[start:stop] for name, values in self.columns.items()},
+        }
+
+    #function to return a store with one more (or a replaced) column, sharing all other arrays
+    def with_column(self, name, values):
+        if len(values) != len(self.doy):
+            raise ValueError(f"column {name!r} has {len(values)} values, expected {len(self.doy)}")
+        return FieldSeasons(self.field_ids, self.field_codes, self.years, self.offsets, self.doy,
+                            {**self.columns, name: values})
+
+    #function to convert the store to a long dataframe (date, field_id and the value columns)
+    #field_id is categorical, so that the unique IDs are not repeated per row
+    def to_frame(self):
+        lengths = self.lengths()
+        field_id = pd.Categorical.from_codes(np.repeat(self.field_codes, lengths), categories=self.field_ids)
+        return pd.DataFrame({'date': pd.to_datetime(self.dates()), 'field_id': field_id, **self.columns})
+
+    #function to convert the store to an Arrow table with one row per series and list columns
+    #(doy and the value columns share the offsets, so the data is not copied)
+    def to_arrow(self):
+        import pyarrow as pa
+        offsets = pa.array(self.local_offsets().astype(np.int32))
+        return pa.table({
+            'year': pa.array(self.years),
+            'field_id': pa.DictionaryArray.from_arrays(pa.array(self.field_codes), pa.array(self.field_ids.astype(str))),
+            'doy': pa.ListArray.from_arrays(offsets, pa.array(self.doy)),
+            **{name: pa.ListArray.from_arrays(offsets, pa.array(values)) for name, values in self.columns.items()},
+        })
+
+    #function to build the store from an Arrow table written by to_arrow (e.g. read back from Parquet)
+    @classmethod
+    def from_arrow(cls, table):
+        import pyarrow as pa
+        table = table.combine_chunks()
+        field_id = table.column('field_id').chunk(0) if table.num_rows else pa.array([], pa.dictionary(pa.int32(), pa.string()))
+        if not pa.types.is_dictionary(field_id.type):
+            field_id = field_id.dictionary_encode()
+        doy = table.column('doy').chunk(0) if table.num_rows else pa.array([], pa.list_(pa.int32()))
+        offsets = doy.offsets.to_numpy().astype(np.int64)
+        offsets = offsets - offsets[0]
+        columns = {}
+        for name in table.column_names:
+            if name not in ('year', 'field_id', 'doy'):
+                columns[name] = table.column(name).chunk(0).flatten().to_numpy(zero_copy_only=False)
+        return cls(
+            field_ids=np.asarray(field_id.dictionary.to_pylist(), dtype=object),
+            field_codes=field_id.indices.to_numpy(zero_copy_only=False).astype(np.int32),
+            years=table.column('year').to_numpy().astype(np.int16),
+            offsets=offsets,
+            doy=doy.flatten().to_numpy(zero_copy_only=False).astype(np.int32),
+            columns=columns,
+        )
+
+
+#stages 6 and 7 on the store, with the same results as the dataframe functions
+
+#function to smooth a column with the SG filter inside every series (see mowing/smoothing.py)
+def smooth(field_seasons, column='NDVI', output_column=None, window_length=smoothing.WINDOW_LENGTH,
+           polyorder=smoothing.POLYORDER, mode='nearest', short_groups='filter'):
+    values = field_seasons.columns[column]
+    smoothed = smoothing.savgol_by_group(values, field_seasons.local_offsets(), window_length=window_length,
+                                         polyorder=polyorder, mode=mode, short_groups=short_groups)
+    return field_seasons.with_column(output_column or column, smoothed.astype(values.dtype, copy=False))
+
+#function to add the differences to earlier observations of the same series, e.g. dif_to_forelast
+def temporal_features(field_seasons, column='NDVI', lags=None):
+    values = field_seasons.columns[column]
+    codes = field_seasons.series_codes()
+    for name, lag in (lags or features.TEMPORAL_LAGS).items():
+        diff = features.grouped_diff_sorted(values.astype(float), codes, lag=lag)
+        field_seasons = field_seasons.with_column(name, diff.astype(values.dtype, copy=False))
+    return field_seasons
+
+#function to add the valley anomaly input (1 where an observation lies threshold below both neighbours)
+def valley(field_seasons, column='NDVI', threshold=features.VALLEY_THRESHOLD):
+    values = field_seasons.columns[column].astype(float)
+    codes = field_seasons.series_codes()
+    is_valley = (features.grouped_diff_sorted(values, codes, 1) <= threshold) & \
+                (features.grouped_diff_sorted(values, codes, -1) <= threshold)
+    return field_seasons.with_column('valley', is_valley.astype(np.int8))
+
+#function to find the observations that start a cut: runs of dif_to_forelast <= threshold within a series,
+#after removing the observations of the excluded months (as cuts.detect_cuts)
+#returns the positions of these observations in the arrays of the store, ordered by series and date
+def cut_positions(field_seasons, threshold=cuts.CUT_THRESHOLD, excluded_months=cuts.EXCLUDED_MONTHS):
+    dates = field_seasons.dates()
+    months = (dates.astype('datetime64[M]').astype(np.int64) % 12) + 1
+    kept = np.flatnonzero(~np.isin(months, excluded_months))
+
+    codes = field_seasons.series_codes()[kept]
+    drops = field_seasons.columns['dif_to_forelast'][kept]
+    return kept[cuts.run_starts_sorted(drops <= threshold, codes)]
+
+#function to list the cuts at the given positions with the range of ± 1 observation around them
+#(previous and next observation of the same series, see evaluation.observation_ranges)
+#returns the columns year, field_id, date, earliest and latest, as used by evaluation.score_detections
+def cut_ranges(field_seasons, positions):
+    dates = field_seasons.dates()
+    codes = field_seasons.series_codes()
+    previous = np.maximum(positions - 1, 0)
+    following = np.minimum(positions + 1, len(dates) - 1)
+    return pd.DataFrame({
+        'year': field_seasons.years[codes[positions]].astype(np.int32),
+        'field_id': field_seasons.field_ids[field_seasons.field_codes[codes[positions]]].astype(str),
+        'date': pd.to_datetime(dates[positions]),
+        'earliest': pd.to_datetime(np.where(codes[previous] == codes[positions], dates[previous], dates[positions])),
+        'latest': pd.to_datetime(np.where(codes[following] == codes[positions], dates[following], dates[positions])),
+    })
+
+#function to detect cutting dates from dif_to_forelast, as cuts.detect_cuts
+#returns one row per year-field_id with the columns year, field_id, cut_1 ... cut_n
+def detect_cuts(field_seasons, threshold=cuts.CUT_THRESHOLD, excluded_months=cuts.EXCLUDED_MONTHS, date_format='%d/%m/%Y'):
+    dates = field_seasons.dates()
+    months = (dates.astype('datetime64[M]').astype(np.int64) % 12) + 1
+    series = np.unique(field_seasons.series_codes()[~np.isin(months, excluded_months)])
+    positions = cut_positions(field_seasons, threshold, excluded_months)
+
+    result = pd.DataFrame({
+        'year': field_seasons.years[series].astype(np.int32),
+        'field_id': field_seasons.field_ids[field_seasons.field_codes[series]],
+    })
+
+    if len(positions):
+        start_codes = field_seasons.series_codes()[positions]
+        cut_number = np.arange(len(positions)) - np.searchsorted(start_codes, start_codes, side='left')
+        formatted = pd.DatetimeIndex(dates[positions]).strftime(date_format).to_numpy(dtype=object)
+        wide = np.full((len(result), cut_number.max() + 1), np.nan, dtype=object)
+        wide[np.searchsorted(series, start_codes), cut_number] = formatted
+        for i in range(wide.shape[1]):
+            result[f'cut_{i + 1}'] = wide[:, i]
+
+    return result
+
+
+#dataframe versions of pipeline.smooth_series and cuts.detect_cuts that run on the store, used by scripts 6 and 7
+#the store keeps float64 values here, so that the results are the same as those of the dataframe functions
+
+#function to raise a ValueError if a year-field_id series has several observations on one date
+#the dataframe functions order such rows by an unstable sort, so their results would not be reproducible;
+#script 5 resolves them before (see deduplication.merge_dfs)
+def check_unique_dates(field_seasons):
+    codes = field_seasons.series_codes()
+    repeated = (field_seasons.doy[1:] == field_seasons.doy[:-1]) & (codes[1:] == codes[:-1])
+    if repeated.any():
+        raise ValueError(f"{int(repeated.sum())} observations repeat the date of another one of the same field_id; "
+                         "keep one observation per date and field_id (see deduplication.resolve_duplicates)")
+
+#function to smooth NDVI and add the temporal features, as pipeline.smooth_series
+#the other columns are kept and dif_to_forelast and NDVI are placed last, as in the former output of script 6;
+#rows without date or field_id are not smoothed (NaN), rows stay sorted by date
+def smooth_frame(df, window_length=smoothing.WINDOW_LENGTH, polyorder=smoothing.POLYORDER, short_groups='filter'):
+    df = df.assign(date=pd.to_datetime(df['date'])).sort_values(by='date')
+    store = FieldSeasons.from_frame(df.assign(_row=np.arange(len(df), dtype=np.float64)), ('NDVI', '_row'), np.float64)
+    check_unique_dates(store)
+    store = smooth(store, 'NDVI', window_length=window_length, polyorder=polyorder, short_groups=short_groups)
+    store = temporal_features(store, 'NDVI')
+
+    rows = store.columns['_row'].astype(np.int64)
+    result = df.drop(columns=['NDVI', 'year'], errors='ignore')
+    for name in [*features.TEMPORAL_LAGS, 'NDVI']:
+        values = np.full(len(df), np.nan)
+        values[rows] = store.columns[name]
+        result[name] = values
+    return result.sort_values('date')
+
+#function to detect cutting dates from the dif_to_forelast column of a dataframe, as cuts.detect_cuts
+def detect_cuts_frame(df, threshold=cuts.CUT_THRESHOLD, excluded_months=cuts.EXCLUDED_MONTHS, date_format='%d/%m/%Y'):
+    store = FieldSeasons.from_frame(df, ('dif_to_forelast',), np.float64)
+    check_unique_dates(store)
+    return detect_cuts(store, threshold, excluded_months, date_format)
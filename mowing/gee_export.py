@@ -0,0 +1,244 @@
+#the following python modules need to be installed:
+import hashlib
+import json
+import os
+import random
+import time
+
+import pandas as pd
+
+#orchestration of Google Earth Engine table exports in chunks of fields and dates
+#every chunk is one export task with one reduceRegions call per image over the fields of the chunk;
+#several tasks run at once, failed submissions and tasks are retried with exponential backoff, and
+#the state of every chunk is kept in a manifest file, so that an interrupted run resumes where it stopped.
+#Earth Engine is reached through a backend with three methods (submit, status, and field_ids), so that
+#the orchestration can be run against LocalBackend instead of Earth Engine.
+
+#task states of Earth Engine (ee.data.getTaskStatus) used by the orchestrator
+FINISHED = 'COMPLETED'
+FAILED_STATES = ('FAILED', 'CANCELLED')
+
+#function to split a list of field IDs and a date range into export chunks
+#fields_per_chunk fields and months_per_chunk months per chunk (None: the whole range);
+#returns a list of dicts with chunk_id, field_ids, start and end (end exclusive)
+def plan_chunks(field_ids, start_date, end_date, fields_per_chunk=500, months_per_chunk=None, prefix='chunk'):
+    field_ids = list(field_ids)
+    start_date, end_date = pd.Timestamp(start_date), pd.Timestamp(end_date)
+    if months_per_chunk:
+        bounds = list(pd.date_range(start_date, end_date, freq=pd.DateOffset(months=months_per_chunk)))
+        if bounds[-1] < end_date:
+            bounds.append(end_date)
+    else:
+        bounds = [start_date, end_date]
+
+    chunks = []
+    for field_start in range(0, max(len(field_ids), 1), fields_per_chunk):
+        for period_start, period_end in zip(bounds[:-1], bounds[1:]):
+            chunks.append({
+                'chunk_id': f"{prefix}_{field_start // fields_per_chunk:04d}_{period_start:%Y%m%d}_{period_end:%Y%m%d}",
+                'field_ids': field_ids[field_start:field_start + fields_per_chunk],
+                'start': f"{period_start:%Y-%m-%d}",
+                'end': f"{period_end:%Y-%m-%d}",
+            })
+    return chunks
+
+#function to compute a fingerprint of the field IDs of a chunk, stored in the manifest with its state
+def fields_fingerprint(chunk):
+    return hashlib.sha256(json.dumps([str(field_id) for field_id in chunk['field_ids']]).encode()).hexdigest()
+
+#functions to read and write the manifest, which maps chunk IDs to their state
+def load_manifest(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(path, manifest):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+#delay before the next attempt: backoff doubled per failed attempt, at most max_backoff, with jitter
+def backoff_delay(attempts, backoff, max_backoff):
+    return min(backoff * 2 ** (attempts - 1), max_backoff) * random.uniform(0.8, 1.2)
+
+#function to run the exports of all chunks
+#at most max_concurrent tasks run at once; a chunk is given up after max_attempts failed attempts
+#chunks completed in an earlier run (manifest_path) are skipped, running tasks are followed up and
+#chunks that were given up are tried again; a chunk whose field IDs differ from those of the earlier
+#run (e.g. after a change of the field list) is exported again
+#clock and sleep can be replaced, e.g. to run LocalBackend without waiting
+#returns the manifest, with the state, task ID, attempts, last error and field ID fingerprint of every chunk
+def run_exports(backend, chunks, manifest_path, max_concurrent=3, max_attempts=5, poll_interval=30,
+                backoff=60, max_backoff=3600, clock=time.time, sleep=time.sleep):
+    manifest = load_manifest(manifest_path)
+    for chunk in chunks:
+        fields_hash = fields_fingerprint(chunk)
+        if manifest.get(chunk['chunk_id'], {}).get('fields_hash') != fields_hash:
+            manifest[chunk['chunk_id']] = {'state': 'PENDING', 'task_id': None, 'attempts': 0,
+                                           'error': None, 'retry_at': 0, 'fields_hash': fields_hash}
+        #chunks given up in an earlier run get max_attempts new attempts
+        if manifest[chunk['chunk_id']]['state'] == 'GAVE_UP':
+            manifest[chunk['chunk_id']].update(state='RETRY', attempts=0, retry_at=0)
+    by_id = {chunk['chunk_id']: chunk for chunk in chunks}
+    todo = [chunk_id for chunk_id in by_id if manifest[chunk_id]['state'] != FINISHED]
+    print(f"{len(chunks) - len(todo)} of {len(chunks)} chunks already exported")
+
+    def fail(entry, error):
+        entry['attempts'] += 1
+        entry['error'] = str(error)
+        entry['task_id'] = None
+        if entry['attempts'] >= max_attempts:
+            entry['state'] = 'GAVE_UP'
+            print(f"Giving up after {entry['attempts']} attempts: {error}")
+        else:
+            entry['state'] = 'RETRY'
+            entry['retry_at'] = clock() + backoff_delay(entry['attempts'], backoff, max_backoff)
+
+    while True:
+        active = [chunk_id for chunk_id in todo if manifest[chunk_id]['state'] == 'RUNNING']
+
+        #follow up the running tasks
+        for chunk_id in active:
+            entry = manifest[chunk_id]
+            state, error = backend.status(entry['task_id'])
+            if state == FINISHED:
+                entry['state'], entry['error'] = FINISHED, None
+                print(f"{chunk_id}: exported")
+            elif state in FAILED_STATES:
+                print(f"{chunk_id}: task {state.lower()} ({error})")
+                fail(entry, error or state)
+
+        #submit waiting chunks while there is room
+        running = sum(manifest[chunk_id]['state'] == 'RUNNING' for chunk_id in todo)
+        for chunk_id in todo:
+            entry = manifest[chunk_id]
+            if running >= max_concurrent:
+                break
+            if entry['state'] not in ('PENDING', 'RETRY') or entry['retry_at'] > clock():
+                continue
+            try:
+                entry['task_id'] = backend.submit(by_id[chunk_id])
+            except Exception as error:
+                #e.g. too many queued tasks or a lost connection
+                print(f"{chunk_id}: submission failed ({error})")
+                fail(entry, error)
+                continue
+            entry['state'] = 'RUNNING'
+            running += 1
+
+        save_manifest(manifest_path, manifest)
+
+        waiting = [manifest[chunk_id] for chunk_id in todo if manifest[chunk_id]['state'] not in (FINISHED, 'GAVE_UP')]
+        if not waiting:
+            break
+        if running:
+            sleep(poll_interval)
+        else:
+            sleep(max(min(entry['retry_at'] for entry in waiting) - clock(), 0))
+
+    states = pd.Series([manifest[chunk_id]['state'] for chunk_id in by_id]).value_counts()
+    print("Export states:", states.to_dict())
+    return manifest
+
+
+#backend submitting the chunks as Earth Engine table exports to Google Drive
+#images is the masked ee.ImageCollection with an NDVI band, fields the ee.FeatureCollection of the fields
+class EarthEngineBackend:
+    def __init__(self, images, fields, field_id_column, folder, scale=10, reducer='median'):
+        #optional dependency, only needed for Earth Engine exports
+        import ee
+        self.ee = ee
+        self.images = images
+        self.fields = fields
+        self.field_id_column = field_id_column
+        self.folder = folder
+        self.scale = scale
+        self.reducer = reducer
+
+    def field_ids(self):
+        return self.fields.aggregate_array(self.field_id_column).getInfo()
+
+    #table of one chunk: one reduceRegions call per image over the fields of the chunk
+    def chunk_table(self, chunk):
+        ee = self.ee
+        fields = self.fields.filter(ee.Filter.inList(self.field_id_column, chunk['field_ids']))
+        images = self.images.filterDate(chunk['start'], chunk['end']).filterBounds(fields.geometry())
+        reducer = getattr(ee.Reducer, self.reducer)().setOutputs(['NDVI'])
+        field_id_column = self.field_id_column
+
+        def reduce_image(image):
+            date = ee.Date(image.get('system:time_start')).format().slice(0, 10)
+            medians = image.select('NDVI').reduceRegions(collection=fields, reducer=reducer, scale=self.scale)
+            return (
+                medians
+                .filter(ee.Filter.notNull(['NDVI']))
+                .map(lambda feature: ee.Feature(None, {
+                    'date': date, 'NDVI': feature.get('NDVI'), 'field_id': feature.get(field_id_column)
+                }))
+            )
+
+        return images.map(reduce_image).flatten()
+
+    def submit(self, chunk):
+        task = self.ee.batch.Export.table.toDrive(
+            collection=self.chunk_table(chunk),
+            description=chunk['chunk_id'],
+            fileNamePrefix=chunk['chunk_id'],
+            selectors=['date', 'NDVI', 'field_id'],
+            folder=self.folder
+        )
+        task.start()
+        return task.id
+
+    def status(self, task_id):
+        status = self.ee.data.getTaskStatus(task_id)[0]
+        return status['state'], status.get('error_message')
+
+
+#local stand-in for Earth Engine, e.g. to test the orchestration
+#observations (date, NDVI, field_id) are written as one CSV file per chunk to output_directory;
+#a task completes after task_polls status requests; failures maps chunk IDs to the number of
+#failed task attempts and submit_failures to the number of rejected submissions
+class LocalBackend:
+    def __init__(self, observations, output_directory, task_polls=1, failures=None, submit_failures=None):
+        self.observations = observations
+        self.output_directory = output_directory
+        self.task_polls = task_polls
+        self.failures = dict(failures or {})
+        self.submit_failures = dict(submit_failures or {})
+        self.tasks = {}
+        self.submitted = []
+
+    def field_ids(self):
+        return sorted(self.observations['field_id'].unique())
+
+    def submit(self, chunk):
+        chunk_id = chunk['chunk_id']
+        if self.submit_failures.get(chunk_id, 0) > 0:
+            self.submit_failures[chunk_id] -= 1
+            raise RuntimeError("Too many tasks already in the queue")
+        task_id = f"task_{len(self.submitted)}"
+        self.submitted.append(chunk_id)
+        self.tasks[task_id] = {'chunk': chunk, 'polls': 0}
+        return task_id
+
+    def status(self, task_id):
+        task = self.tasks[task_id]
+        task['polls'] += 1
+        if task['polls'] < self.task_polls:
+            return 'RUNNING', None
+        chunk_id = task['chunk']['chunk_id']
+        if self.failures.get(chunk_id, 0) > 0:
+            self.failures[chunk_id] -= 1
+            return 'FAILED', "Computation timed out."
+
+        dates = pd.to_datetime(self.observations['date'])
+        selected = self.observations[
+            self.observations['field_id'].isin(task['chunk']['field_ids'])
+            & (dates >= task['chunk']['start']) & (dates < task['chunk']['end'])
+        ]
+        selected.loc[:, ['date', 'NDVI', 'field_id']].to_csv(
+            os.path.join(self.output_directory, f"{chunk_id}.csv"), index=False
+        )
+        return FINISHED, None
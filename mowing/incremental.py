@@ -0,0 +1,235 @@
+#the following python modules need to be installed:
+import os
+import shutil
+
+import pandas as pd
+
+from mowing import deduplication, normalisation, pipeline, storage
+from mowing.regions import REGION_PREFIXES, extract_regions
+
+#files of an incremental state version (Parquet, see mowing/storage.py)
+#every save writes a new version folder inside the state directory; the file CURRENT names the valid version
+#manifest: every (sat_name, date, field_id) key processed so far, including de-duplicated ones
+#observations: merged, de-duplicated and not yet normalised observations
+#minmax: normalisation parameters per year and region
+#smoothed, cuts: stored results of stages 6 and 7
+#all tables but minmax are folders with one Parquet file per year and region (e.g. year_2020_region_KM.parquet),
+#so that an update only reads and writes the partitions of its new observations; the files of the other
+#partitions are linked into the new version unchanged. region_prefixes have to stay the same between updates.
+STATE_FILES = {
+    'manifest': 'manifest.parquet',
+    'observations': 'observations.parquet',
+    'minmax': 'minmax.csv',
+    'smoothed': 'smoothed.parquet',
+    'cuts': 'cuts.parquet',
+}
+PARTITIONED_TABLES = ('manifest', 'observations', 'smoothed', 'cuts')
+
+CURRENT_FILE = 'CURRENT'
+VERSION_PREFIX = 'state_'
+
+MANIFEST_KEYS = ['sat_name', 'date', 'field_id']
+SERIES_KEYS = ['year', 'field_id']
+
+#function to get the folder of the current state version
+#states saved before versioning (tables directly in the state directory) are read from there
+def current_version(state_directory):
+    pointer = os.path.join(state_directory, CURRENT_FILE)
+    if not os.path.exists(pointer):
+        return state_directory
+    with open(pointer) as f:
+        return os.path.join(state_directory, f.read().strip())
+
+#function to get the year-region partition of every row, from the date or, for the cuts, the year column
+def partition_names(df, region_prefixes=REGION_PREFIXES):
+    years = df['date'].dt.year if 'date' in df.columns else df['year']
+    regions = extract_regions(df['field_id'], region_prefixes).fillna('unknown')
+    return 'year_' + years.astype(str).set_axis(df.index) + '_region_' + regions.set_axis(df.index)
+
+def _empty_table(name):
+    return {
+        'manifest': pd.DataFrame({'sat_name': pd.Series(dtype=str), 'date': pd.Series(dtype='datetime64[ns]'), 'field_id': pd.Series(dtype=str)}),
+        'observations': pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'NDVI': pd.Series(dtype=float), 'field_id': pd.Series(dtype=str), 'sat_name': pd.Series(dtype=str)}),
+        'minmax': pd.DataFrame({'year': pd.Series(dtype=int), 'region': pd.Series(dtype=str), 'min': pd.Series(dtype=float), 'max': pd.Series(dtype=float), 'count': pd.Series(dtype=int)}),
+        'smoothed': pd.DataFrame({'date': pd.Series(dtype='datetime64[ns]'), 'field_id': pd.Series(dtype=str), 'NDVI': pd.Series(dtype=float), 'dif_to_forelast': pd.Series(dtype=float)}),
+        'cuts': pd.DataFrame({'year': pd.Series(dtype=int), 'field_id': pd.Series(dtype=str)}),
+    }[name]
+
+#function to check whether a version stores its tables per partition (states saved before do not)
+def _is_partitioned(version_directory):
+    return any(os.path.isdir(os.path.join(version_directory, name)) for name in PARTITIONED_TABLES)
+
+#function to read one table of a version, only the given partitions (names as partition_names) or all of them
+def _read_table(version_directory, name, partitions=None, region_prefixes=REGION_PREFIXES):
+    if name == 'minmax':
+        path = os.path.join(version_directory, STATE_FILES[name])
+        return normalisation.load_minmax(path) if os.path.exists(path) else _empty_table(name)
+
+    folder = os.path.join(version_directory, name)
+    if os.path.isdir(folder):
+        available = sorted(file_name.removesuffix('.parquet') for file_name in os.listdir(folder))
+        wanted = [partition for partition in available if partitions is None or partition in partitions]
+        tables = [_plain_columns(storage.load_dataset(os.path.join(folder, f'{partition}.parquet'))) for partition in wanted]
+        return pd.concat(tables, ignore_index=True) if tables else _empty_table(name)
+
+    path = os.path.join(version_directory, STATE_FILES[name])
+    if not os.path.exists(path):
+        return _empty_table(name)
+    table = _plain_columns(storage.load_dataset(path))
+    if partitions is not None:
+        table = table.loc[partition_names(table, region_prefixes).isin(partitions).to_numpy()].reset_index(drop=True)
+    return table
+
+#function to load the stored state, with empty tables on the first run
+def load_state(state_directory):
+    version_directory = current_version(state_directory)
+    state = {name: _read_table(version_directory, name) for name in STATE_FILES}
+    state['smoothed'] = state['smoothed'].sort_values(['date', 'field_id'], kind='mergesort', ignore_index=True)
+    state['cuts'] = _sorted_cuts(state['cuts'])
+    return state
+
+#function to order the cuts by year and field_id, with the cut columns in order
+def _sorted_cuts(cut_dates):
+    cut_columns = sorted([column for column in cut_dates.columns if column.startswith('cut_')], key=lambda column: int(column[4:]))
+    return cut_dates.sort_values(SERIES_KEYS, kind='mergesort', ignore_index=True).loc[:, ['year', 'field_id'] + cut_columns]
+
+#function to write a new state version and make it the current one
+#tables maps the partitioned tables to {partition: rows} for the partitions that changed (all partitions of a
+#table when keep_others is False); the other partition files of the current version are linked unchanged.
+#All files are written to a new version folder first; only then the CURRENT file is replaced (one atomic
+#rename) to point to it. An interrupted save leaves the previous version in use, and its incomplete folder
+#is removed by the next save. Older versions are removed once the new one is current.
+def _save_version(state_directory, tables, minmax, keep_others=True):
+    os.makedirs(state_directory, exist_ok=True)
+    previous = current_version(state_directory)
+    versions = sorted(name for name in os.listdir(state_directory) if name.startswith(VERSION_PREFIX))
+    number = int(versions[-1][len(VERSION_PREFIX):]) + 1 if versions else 1
+    version = f"{VERSION_PREFIX}{number:06d}"
+    version_directory = os.path.join(state_directory, version)
+    os.makedirs(version_directory)
+
+    for name in PARTITIONED_TABLES:
+        folder = os.path.join(version_directory, name)
+        os.makedirs(folder)
+        for partition, rows in tables[name].items():
+            storage.save_dataset(rows, os.path.join(folder, f'{partition}.parquet'), 'parquet')
+        previous_folder = os.path.join(previous, name)
+        if keep_others and os.path.isdir(previous_folder):
+            for file_name in os.listdir(previous_folder):
+                if file_name.removesuffix('.parquet') not in tables[name]:
+                    _link(os.path.join(previous_folder, file_name), os.path.join(folder, file_name))
+    normalisation.save_minmax(minmax, os.path.join(version_directory, STATE_FILES['minmax']))
+
+    pointer = os.path.join(state_directory, CURRENT_FILE)
+    with open(pointer + '.tmp', 'w') as f:
+        f.write(version)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(pointer + '.tmp', pointer)
+
+    #remove older and incomplete versions, and the tables of a state saved before versioning
+    for old_version in versions:
+        shutil.rmtree(os.path.join(state_directory, old_version), ignore_errors=True)
+    for file_name in STATE_FILES.values():
+        if os.path.exists(os.path.join(state_directory, file_name)):
+            os.remove(os.path.join(state_directory, file_name))
+
+#function to put an unchanged file into the new version without copying it (hard link), or copy it
+#where the file system has no hard links
+def _link(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+#function to split a table into its partitions
+def _by_partition(df, region_prefixes=REGION_PREFIXES):
+    if df.empty:
+        return {}
+    return {partition: rows.reset_index(drop=True)
+            for partition, rows in df.groupby(partition_names(df, region_prefixes).to_numpy(), sort=True)}
+
+#function to save a whole state (as returned by load_state) as a new version
+def save_state(state, state_directory, region_prefixes=REGION_PREFIXES):
+    tables = {name: _by_partition(state[name], region_prefixes) for name in PARTITIONED_TABLES}
+    _save_version(state_directory, tables, state['minmax'], keep_others=False)
+
+#function to turn categorical columns (as loaded from Parquet) into plain columns, so that tables concatenate cleanly
+def _plain_columns(df):
+    return df.assign(**{column: df[column].astype(str) for column in df.columns
+                        if isinstance(df[column].dtype, pd.CategoricalDtype) and column != 'year'})
+
+#function to select the rows of df that belong to the given year-field_id series
+def _in_series(df, series, date_column='date'):
+    keys = pd.DataFrame({'year': df[date_column].dt.year if date_column else df['year'], 'field_id': df['field_id']})
+    return keys.merge(series.assign(_hit=True), on=SERIES_KEYS, how='left')['_hit'].notna().to_numpy()
+
+#function to process a delta of new observations (date, NDVI, field_id, sat_name) incrementally
+#only keys missing from the manifest are used, and only the year-region partitions of the new rows are read:
+#the stored observations of these partitions are merged and de-duplicated with the new rows, and the
+#year-field_id series they touch are normalised, cleaned of outliers, smoothed and searched for cuts again;
+#their results replace the stored ones. The min-max range of a year-region group is extended with the new
+#rows that survive the de-duplication (as the merged dataset of 5_merge_and_split.py); if it widens, every
+#series of that group is recomputed, since their normalised values change too. Normalisation ranges only
+#grow: a stored observation later replaced by a higher-priority satellite is not removed from the range.
+#returns a summary with the numbers of new rows and recomputed series
+def update(state_directory, delta, model, priority=deduplication.SENSOR_PRIORITY, region_prefixes=REGION_PREFIXES,
+           **detection_parameters):
+    #states saved with whole tables are converted to partitions once
+    if os.path.exists(os.path.join(current_version(state_directory), STATE_FILES['manifest'])):
+        save_state(load_state(state_directory), state_directory, region_prefixes)
+    version_directory = current_version(state_directory)
+
+    delta = _plain_columns(delta.loc[:, ['date', 'NDVI', 'field_id', 'sat_name']])
+    delta = delta.assign(date=pd.to_datetime(delta['date']).astype('datetime64[ns]'))
+    partitions = set(partition_names(delta, region_prefixes))
+    manifest = _read_table(version_directory, 'manifest', partitions, region_prefixes)
+    known = delta[MANIFEST_KEYS].merge(manifest.assign(_known=True), on=MANIFEST_KEYS, how='left')['_known']
+    new_rows = delta.loc[known.isna().to_numpy()]
+    if new_rows.empty:
+        return {'new_rows': 0, 'recomputed_series': 0}
+    partitions = set(partition_names(new_rows, region_prefixes))
+
+    #merge and de-duplicate the new rows together with the stored observations of their partitions (stage 5)
+    stored = _read_table(version_directory, 'observations', partitions, region_prefixes)
+    observations, statistics = deduplication.resolve_duplicates(pd.concat([stored, new_rows], ignore_index=True), priority)
+    deduplication.report_collisions(statistics)
+
+    #update the normalisation parameters with the new, valid observations kept by the de-duplication
+    kept_new = observations[MANIFEST_KEYS].merge(new_rows[MANIFEST_KEYS].drop_duplicates().assign(_new=True),
+                                                 on=MANIFEST_KEYS, how='left')['_new'].notna().to_numpy()
+    valid_new = normalisation.add_normalisation_keys(observations.loc[kept_new & (observations['NDVI'] > 0).to_numpy()], region_prefixes)
+    params, changed_groups = normalisation.update_minmax(_read_table(version_directory, 'minmax'), valid_new.dropna(subset=['region']))
+
+    #series touched by new rows, plus all series of year-region groups with a changed range
+    keyed = normalisation.add_normalisation_keys(observations, region_prefixes)
+    touched = keyed[['year', 'region']].merge(changed_groups.assign(_changed=True), on=['year', 'region'], how='left')['_changed']
+    affected = pd.concat([
+        new_rows.assign(year=new_rows['date'].dt.year)[SERIES_KEYS],
+        keyed.loc[touched.notna().to_numpy(), SERIES_KEYS],
+    ]).drop_duplicates()
+
+    #normalise and run stages 6 and 7 on the affected series only
+    series_rows = keyed.loc[_in_series(keyed, affected) & (keyed['NDVI'] > 0).to_numpy()]
+    normalised = series_rows.assign(NDVI=normalisation.apply_minmax(series_rows, params)).dropna(subset=['NDVI'])
+    smoothed, cut_dates = pipeline.detect_mowing(normalised.loc[:, ['date', 'NDVI', 'field_id', 'sat_name']], model, **detection_parameters)
+
+    #upsert the results of the affected series in their partitions
+    stored_smoothed = _read_table(version_directory, 'smoothed', partitions, region_prefixes)
+    stored_cuts = _read_table(version_directory, 'cuts', partitions, region_prefixes)
+    stored_smoothed = stored_smoothed.loc[~_in_series(stored_smoothed, affected)]
+    stored_cuts = stored_cuts.loc[~_in_series(stored_cuts, affected, date_column=None)]
+    smoothed = pd.concat([stored_smoothed, _plain_columns(smoothed)], ignore_index=True).sort_values(['date', 'field_id'], kind='mergesort')
+    cut_dates = _sorted_cuts(pd.concat([stored_cuts, _plain_columns(cut_dates)], ignore_index=True))
+
+    tables = {
+        'manifest': pd.concat([manifest, new_rows[MANIFEST_KEYS]], ignore_index=True),
+        'observations': observations,
+        'smoothed': smoothed,
+        'cuts': cut_dates,
+    }
+    tables = {name: {**{partition: table.iloc[:0] for partition in partitions}, **_by_partition(table, region_prefixes)}
+              for name, table in tables.items()}
+    _save_version(state_directory, tables, params)
+
+    return {'new_rows': len(new_rows), 'recomputed_series': len(affected)}
@@ -0,0 +1,220 @@
+#the following python modules need to be installed:
+import cProfile
+import json
+import numbers
+import os
+import platform
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#instrumentation of the pipeline stages: every stage records wall time, CPU time, peak memory and the
+#input/output row counts (per satellite, where the dataframe has a sat_name column); the run report
+#is written as JSON so that runs can be compared, e.g. to find the step that exceeds a processing window.
+#profile='cprofile' or 'pyinstrument' additionally profiles the stages (all or those in profile_stages)
+#stages run on other threads than the main thread (e.g. by the thread pool of mowing/runner.py) record the CPU
+#time of their own thread (cpu_clock 'thread'), which leaves out threads and processes started by the stage;
+#the memory values are process-wide: peak_rss_mb is the peak of the process so far, and the tracemalloc
+#values of concurrently running stages include the allocations of each other
+
+PROFILERS = ('cprofile', 'pyinstrument')
+
+#number of stages tracing memory at the moment, so that tracemalloc is only stopped after the last of them
+_tracing_lock = threading.Lock()
+_tracing_stages = 0
+
+def _make_parent_directory(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+#peak resident memory of the process so far in MB (None where the resource module is not available)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #bytes on macOS, kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+#function to count the rows of a dataframe (or a list/dict of dataframes), in total and per value of by
+#numbers are taken as row counts
+def count_rows(data, by='sat_name'):
+    if data is None:
+        return None, None
+    if isinstance(data, dict):
+        data = list(data.values())
+    if isinstance(data, (list, tuple)):
+        counts = [count_rows(df, by) for df in data]
+        total = sum(count for count, _ in counts if count is not None)
+        breakdown = {}
+        for _, per_value in counts:
+            for value, count in (per_value or {}).items():
+                breakdown[value] = breakdown.get(value, 0) + count
+        return total, breakdown or None
+    if isinstance(data, pd.DataFrame):
+        if by is not None and by in data.columns:
+            per_value = data[by].astype(str).value_counts(sort=False)
+            return len(data), {value: int(count) for value, count in per_value.items()}
+        return len(data), None
+    if isinstance(data, numbers.Integral):
+        return int(data), None
+    #other objects, e.g. models, have no rows
+    return None, None
+
+#measurements of one stage
+class StageRecord:
+    __slots__ = ('name', 'rows_in', 'rows_in_by', 'rows_out', 'rows_out_by', 'values')
+
+    def __init__(self, name, data_in=None, by='sat_name'):
+        self.name = name
+        self.rows_in, self.rows_in_by = count_rows(data_in, by)
+        self.rows_out, self.rows_out_by = None, None
+        self.values = {}
+
+    #data_out is a dataframe, a list/dict of dataframes or a number of rows
+    def output(self, data_out, by='sat_name'):
+        self.rows_out, self.rows_out_by = count_rows(data_out, by)
+
+    #further values to keep in the report, e.g. the number of removed outliers
+    def note(self, **values):
+        self.values.update(values)
+
+
+class RunReport:
+    #name identifies the run (e.g. the script); path is the JSON file written by save()
+    #trace_memory=True also records the peak of memory allocated within each stage (tracemalloc, slower):
+    #peak_allocated_mb in total and peak_increase_mb above the memory allocated when the stage started
+    def __init__(self, name, path=None, profile=None, profile_stages=None, trace_memory=False):
+        if profile is not None and profile not in PROFILERS:
+            raise ValueError(f"profile must be one of {PROFILERS} or None, not {profile!r}")
+        self.name = name
+        self.path = path
+        self.profile = profile
+        self.profile_stages = None if profile_stages is None else set(profile_stages)
+        self.trace_memory = trace_memory
+        self.started = datetime.now()
+        self.stages = []
+
+    def _profile_path(self, stage_name, suffix):
+        base = os.path.splitext(self.path)[0] if self.path else self.name
+        path = f"{base}_{stage_name}{suffix}"
+        _make_parent_directory(path)
+        return path
+
+    def _start_profiler(self, stage_name):
+        if self.profile is None or (self.profile_stages is not None and stage_name not in self.profile_stages):
+            return None
+        if self.profile == 'cprofile':
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        #optional dependency, only needed on demand
+        from pyinstrument import Profiler
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+
+    def _stop_profiler(self, profiler, stage_name):
+        if profiler is None:
+            return None
+        if self.profile == 'cprofile':
+            profiler.disable()
+            path = self._profile_path(stage_name, '.prof')
+            profiler.dump_stats(path)
+        else:
+            profiler.stop()
+            path = self._profile_path(stage_name, '.html')
+            with open(path, 'w') as f:
+                f.write(profiler.output_html())
+        return path
+
+    #context manager measuring the enclosed stage; data_in gives the input row counts
+    #the yielded StageRecord takes the output (record.output(df)) and further values (record.note(...))
+    @contextmanager
+    def stage(self, name, data_in=None, by='sat_name'):
+        global _tracing_stages
+        record = StageRecord(name, data_in, by)
+        if self.trace_memory:
+            with _tracing_lock:
+                #tracing started outside of the stages is left running
+                counted = _tracing_stages > 0 or not tracemalloc.is_tracing()
+                if counted:
+                    if _tracing_stages == 0:
+                        tracemalloc.start()
+                    _tracing_stages += 1
+                tracemalloc.reset_peak()
+                allocated_start = tracemalloc.get_traced_memory()[0]
+        profiler = self._start_profiler(name)
+        cpu_clock = 'process' if threading.current_thread() is threading.main_thread() else 'thread'
+        cpu_timer = time.process_time if cpu_clock == 'process' else time.thread_time
+        wall_start, cpu_start = time.perf_counter(), cpu_timer()
+        try:
+            yield record
+        finally:
+            wall_time = time.perf_counter() - wall_start
+            cpu_time = cpu_timer() - cpu_start
+            profile_path = self._stop_profiler(profiler, name)
+            if self.trace_memory:
+                with _tracing_lock:
+                    peak_allocated = tracemalloc.get_traced_memory()[1]
+                    if counted:
+                        _tracing_stages -= 1
+                        if _tracing_stages == 0:
+                            tracemalloc.stop()
+
+            throughput_rows = record.rows_in if record.rows_in is not None else record.rows_out
+            self.stages.append({
+                'stage': name,
+                'wall_s': wall_time,
+                'cpu_s': cpu_time,
+                'cpu_clock': cpu_clock,
+                'rows_in': record.rows_in,
+                'rows_out': record.rows_out,
+                'rows_per_s': throughput_rows / wall_time if throughput_rows is not None and wall_time > 0 else None,
+                'peak_rss_mb': peak_rss_mb(),
+                'peak_allocated_mb': peak_allocated / 1024 ** 2 if self.trace_memory else None,
+                'peak_increase_mb': (peak_allocated - allocated_start) / 1024 ** 2 if self.trace_memory else None,
+                'rows_in_by': record.rows_in_by,
+                'rows_out_by': record.rows_out_by,
+                'profile': profile_path,
+                **record.values,
+            })
+
+    #the stages as a dataframe, one row per stage
+    def to_frame(self):
+        return pd.DataFrame(self.stages)
+
+    def to_dict(self):
+        return {
+            'run': self.name,
+            'started': self.started.isoformat(timespec='seconds'),
+            'total_wall_s': sum(stage['wall_s'] for stage in self.stages),
+            'total_cpu_s': sum(stage['cpu_s'] for stage in self.stages),
+            'peak_rss_mb': peak_rss_mb(),
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'stages': self.stages,
+        }
+
+    #function to write the report as JSON to path (or the path given at creation) and print a summary
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            raise ValueError("no path given for the run report")
+        _make_parent_directory(path)
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        print(f"Run report saved to '{path}'")
+        if self.stages:
+            print(self.to_frame().loc[:, ['stage', 'wall_s', 'cpu_s', 'rows_in', 'rows_out', 'peak_rss_mb']].to_string(index=False))
+        return path
@@ -0,0 +1,213 @@
+#the following python modules need to be installed:
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.features import rasterize
+from rasterio.warp import transform_geom
+from rasterio.windows import Window
+
+from mowing import dove, sentinel2
+
+#Landsat-7 and Landsat-8 field statistics at the native 30 m resolution, for locally stored
+#Collection 2 Level-2 products (one GeoTIFF per band), as an alternative to 1_landsat-7-preprocessing.js
+#and 2_landsat-8-preprocessing.js, which resample every scene to the 10 m Sentinel-2 grid first.
+#Instead, every 30 m pixel is weighted with the share of its area covered by the field polygon,
+#and the field NDVI is the weighted median of the unmasked pixels.
+
+#settings shared by Landsat-7 and Landsat-8 (Collection 2 Level-2)
+#QA_PIXEL bits 0-4: fill, dilated cloud, cirrus, cloud, cloud shadow; QA_RADSAT: saturated bands
+QA_PIXEL_MASK = 0b11111
+OPTICAL_SCALE = 0.0000275
+OPTICAL_OFFSET = -0.2
+
+#per sensor: product ID prefix, red and near-infrared bands
+SENSORS = {
+    'Lan7': {'prefix': 'LE07', 'red': 'SR_B3', 'nir': 'SR_B4'},
+    'Lan8': {'prefix': 'LC08', 'red': 'SR_B4', 'nir': 'SR_B5'},
+}
+
+#number of sub-pixels per pixel side used to compute the covered share of each pixel
+SUPERSAMPLING = 10
+
+#function to find the sensor of a product from its ID, e.g. LC08_L2SP_193026_20200501_20200820_02_T1
+def sensor_of_product(product_id):
+    for sat_name, settings in SENSORS.items():
+        if product_id.startswith(settings['prefix']):
+            return sat_name
+    raise ValueError(f"unknown Landsat product {product_id!r}, expected one of {[s['prefix'] for s in SENSORS.values()]}")
+
+#function to read the acquisition date from the product ID
+def date_of_product(product_id):
+    return pd.to_datetime(product_id.split('_')[3], format='%Y%m%d')
+
+#function to find the file of one band in a product directory
+def band_file(product_directory, band):
+    files = glob.glob(os.path.join(product_directory, f"*_{band}.TIF")) + glob.glob(os.path.join(product_directory, f"*_{band}.tif"))
+    if not files:
+        raise FileNotFoundError(f"no {band} file in {product_directory}")
+    return files[0]
+
+#function to compute the mask of valid pixels, as maskL7sr/maskL8sr
+def valid_pixels(qa_pixel, qa_radsat):
+    return ((qa_pixel & QA_PIXEL_MASK) == 0) & (qa_radsat == 0)
+
+#function to scale the digital numbers of the optical bands to surface reflectance
+def scale_optical(digital_numbers):
+    return digital_numbers.astype(np.float32) * np.float32(OPTICAL_SCALE) + np.float32(OPTICAL_OFFSET)
+
+#function to calculate NDVI of the valid pixels (NaN elsewhere)
+def landsat_ndvi(red, nir, valid):
+    red, nir = scale_optical(red), scale_optical(nir)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = (nir - red) / (nir + red)
+    ndvi[~valid] = np.nan
+    return ndvi
+
+#function to compute the covered share of every pixel of a grid for every field
+#each field is rasterized on a grid of supersampling x supersampling sub-pixels per pixel within its
+#bounding window, and the covered sub-pixels are counted per pixel
+#returns flat pixel indices, field positions (1-based, as in dove.field_labels) and weights in (0, 1]
+def coverage_weights(fields, transform, width, height, supersampling=SUPERSAMPLING):
+    pixels, positions, weights = [], [], []
+    for position, (geometry, _) in enumerate(fields, start=1):
+        left, bottom, right, top = rasterio.features.bounds(geometry)
+        window = rasterio.windows.from_bounds(left, bottom, right, top, transform)
+        row_off, col_off = max(int(np.floor(window.row_off)), 0), max(int(np.floor(window.col_off)), 0)
+        row_end = min(int(np.ceil(window.row_off + window.height)), height)
+        col_end = min(int(np.ceil(window.col_off + window.width)), width)
+        if row_end <= row_off or col_end <= col_off:
+            continue
+
+        rows, cols = row_end - row_off, col_end - col_off
+        fine_transform = rasterio.windows.transform(Window(col_off, row_off, cols, rows), transform) \
+            * rasterio.Affine.scale(1 / supersampling)
+        covered = rasterize([(geometry, 1)], out_shape=(rows * supersampling, cols * supersampling),
+                            transform=fine_transform, fill=0, dtype='uint8')
+        share = covered.reshape(rows, supersampling, cols, supersampling).sum(axis=(1, 3)) / supersampling ** 2
+
+        covered_rows, covered_cols = np.nonzero(share)
+        pixels.append((covered_rows + row_off) * width + covered_cols + col_off)
+        positions.append(np.full(len(covered_rows), position, dtype=np.int32))
+        weights.append(share[covered_rows, covered_cols])
+
+    if not pixels:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int32), np.array([], dtype=float)
+    return np.concatenate(pixels), np.concatenate(positions), np.concatenate(weights)
+
+#function to compute the weighted median of values for every label with one sort, without a loop over labels
+#the weighted median is the value where the cumulative weight reaches half of the total weight
+#(the mean of two values where it is reached exactly, so that equal weights give the ordinary median)
+#NaN values are ignored; returns the labels found and their weighted medians
+def weighted_label_medians(values, labels, weights):
+    valid = ~np.isnan(values) & (weights > 0)
+    values, labels, weights = values[valid], labels[valid], weights[valid]
+    if len(values) == 0:
+        return np.array([], dtype=labels.dtype), np.array([], dtype=float)
+
+    order = np.lexsort((values, labels))
+    values, labels, weights = values[order].astype(float), labels[order], weights[order]
+    starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+    ends = np.r_[starts[1:], len(labels)]
+
+    cumulative = np.cumsum(weights)
+    before = np.r_[0, cumulative][starts]
+    group_cumulative = cumulative - np.repeat(before, ends - starts)
+    half = np.repeat((cumulative[ends - 1] - before) / 2, ends - starts)
+
+    reached = group_cumulative >= half * (1 - 1e-9)
+    #first position of every group where half of the weight is reached
+    first = np.minimum.reduceat(np.where(reached, np.arange(len(values)), len(values)), starts)
+    exact = np.isclose(group_cumulative[first], half[first]) & (first + 1 < ends)
+    medians = values[first].copy()
+    medians[exact] = (values[first[exact]] + values[first[exact] + 1]) / 2
+    return labels[starts], medians
+
+#function to calculate the weighted NDVI median of every field in one product
+#only the window covering the fields is read; weights are cached by grid, like the field labels,
+#so a weight_cache must only be used with one field set
+#returns a dataframe with the columns date, NDVI, field_id and sat_name
+def product_ndvi_medians(product_directory, fields, weight_cache=None, fields_crs=None, supersampling=SUPERSAMPLING):
+    product_id = os.path.basename(os.path.normpath(product_directory))
+    sat_name = sensor_of_product(product_id)
+    settings = SENSORS[sat_name]
+
+    with rasterio.open(band_file(product_directory, settings['red'])) as red_src:
+        geometries = fields
+        if fields_crs is not None and str(fields_crs) != str(red_src.crs):
+            geometries = [(transform_geom(fields_crs, red_src.crs, geometry), field_id) for geometry, field_id in fields]
+        window = sentinel2.fields_window(geometries, red_src, margin=1)
+        if window is None:
+            return pd.DataFrame(columns=['date', 'NDVI', 'field_id', 'sat_name'])
+        red = red_src.read(1, window=window)
+        transform = red_src.window_transform(window)
+        grid_key = (str(red_src.crs), tuple(transform), int(window.width), int(window.height))
+
+    with rasterio.open(band_file(product_directory, settings['nir'])) as src:
+        nir = src.read(1, window=window)
+    with rasterio.open(band_file(product_directory, 'QA_PIXEL')) as src:
+        qa_pixel = src.read(1, window=window)
+    with rasterio.open(band_file(product_directory, 'QA_RADSAT')) as src:
+        qa_radsat = src.read(1, window=window)
+
+    if weight_cache is not None and grid_key in weight_cache:
+        pixels, positions, weights = weight_cache[grid_key]
+    else:
+        pixels, positions, weights = coverage_weights(geometries, transform, int(window.width), int(window.height), supersampling)
+        if weight_cache is not None:
+            weight_cache[grid_key] = (pixels, positions, weights)
+
+    ndvi = landsat_ndvi(red, nir, valid_pixels(qa_pixel, qa_radsat)).ravel()
+    field_positions, medians = weighted_label_medians(ndvi[pixels], positions, weights)
+    return pd.DataFrame({
+        'date': date_of_product(product_id),
+        'NDVI': medians,
+        'field_id': [fields[position - 1][1] for position in field_positions],
+        'sat_name': sat_name,
+    })
+
+#fields and coverage weights of one extraction, set by _init_worker in every worker process (or in this
+#process for a serial run, and cleared afterwards), so that another call never reuses them with other fields
+_worker_fields = {}
+
+def _init_worker(field_shapefile, field_id_column):
+    _worker_fields['fields'] = dove.read_fields(field_shapefile, field_id_column)
+    _worker_fields['weight_cache'] = {}
+
+#function to calculate the field medians of one product, used by the process pool
+def _product_medians(product_directory, fields_crs, supersampling):
+    return product_ndvi_medians(product_directory, _worker_fields['fields'], _worker_fields['weight_cache'],
+                                fields_crs, supersampling)
+
+#function to build the Landsat NDVI table of a product archive, product by product in a process pool
+#product_directories are the unpacked Level-2 products of Landsat-7 and/or Landsat-8
+#processes=None uses all cores, processes=1 runs serially; on Windows, call this from within
+#an `if __name__ == '__main__':` block
+def extract_landsat_ndvi(product_directories, field_shapefile, field_id_column='field_id', fields_crs=None,
+                         processes=None, supersampling=SUPERSAMPLING):
+    product_directories = sorted(product_directories)
+    processes = processes or os.cpu_count() or 1
+    args = (fields_crs, supersampling)
+
+    if processes == 1 or len(product_directories) <= 1:
+        _init_worker(field_shapefile, field_id_column)
+        try:
+            tables = [_product_medians(directory, *args) for directory in product_directories]
+        finally:
+            _worker_fields.clear()
+    else:
+        #fork avoids re-importing the calling script in every worker where it is available
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                                 initargs=(field_shapefile, field_id_column)) as executor:
+            tables = list(executor.map(_product_medians, product_directories,
+                                       *[[arg] * len(product_directories) for arg in args]))
+
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return pd.DataFrame(columns=['date', 'NDVI', 'field_id', 'sat_name'])
+    return pd.concat(tables, ignore_index=True)
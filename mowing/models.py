@@ -0,0 +1,114 @@
+#the following python modules need to be installed:
+import hashlib
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import IsolationForest
+
+#Isolation Forest settings used in this study
+IF_PARAMETERS = {'contamination': 0.06, 'random_state': 42}
+ANOMALY_INPUTS = ['NDVI', 'valley']
+
+#name of the model trained on all data, and of the registry index file
+ALL_DATA = 'all'
+REGISTRY_INDEX = 'registry.json'
+
+#rows scored at once by predict_chunked
+CHUNK_SIZE = 500000
+
+#function to compute a fingerprint of the training data and the model settings
+#the same data, inputs, parameters and scikit-learn version always give the same fingerprint
+def training_fingerprint(training_data, anomaly_inputs=ANOMALY_INPUTS, parameters=IF_PARAMETERS):
+    digest = hashlib.sha256()
+    hashed_rows = pd.util.hash_pandas_object(training_data[anomaly_inputs].reset_index(drop=True), index=False)
+    digest.update(hashed_rows.to_numpy().tobytes())
+    digest.update(json.dumps({'inputs': list(anomaly_inputs), 'parameters': parameters, 'sklearn': sklearn.__version__},
+                             sort_keys=True).encode())
+    return digest.hexdigest()
+
+#functions to read and write the registry index, which maps model names to their files and fingerprints
+def _read_index(registry_directory):
+    path = os.path.join(registry_directory, REGISTRY_INDEX)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_index(registry_directory, index):
+    path = os.path.join(registry_directory, REGISTRY_INDEX)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(index, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+#function to load a registered model by name, without any training data
+def load_model(registry_directory, name=ALL_DATA):
+    entry = _read_index(registry_directory).get(str(name))
+    if entry is None:
+        raise KeyError(f"no model named {name!r} in {registry_directory}")
+    return joblib.load(os.path.join(registry_directory, entry['file']))
+
+#function to load the model for the training data from the registry, or train and register it
+#the model is reused when the fingerprint of data and settings matches the registered one
+#n_jobs fits the trees in parallel; it does not change the fitted model
+def load_or_train(registry_directory, training_data, anomaly_inputs=ANOMALY_INPUTS, name=ALL_DATA, n_jobs=-1, **parameters):
+    parameters = {**IF_PARAMETERS, **parameters}
+    fingerprint = training_fingerprint(training_data, anomaly_inputs, parameters)
+
+    os.makedirs(registry_directory, exist_ok=True)
+    index = _read_index(registry_directory)
+    entry = index.get(str(name))
+    if entry is not None and entry['fingerprint'] == fingerprint:
+        return joblib.load(os.path.join(registry_directory, entry['file']))
+
+    model = IsolationForest(n_jobs=n_jobs, **parameters)
+    model.fit(training_data[anomaly_inputs])
+
+    file_name = f"IF_{name}_{fingerprint[:16]}.joblib"
+    joblib.dump(model, os.path.join(registry_directory, file_name))
+    index[str(name)] = {
+        'file': file_name,
+        'fingerprint': fingerprint,
+        'parameters': parameters,
+        'anomaly_inputs': list(anomaly_inputs),
+        'training_rows': len(training_data),
+    }
+    _write_index(registry_directory, index)
+    return model
+
+#function to load or train one model per group, e.g. by='region' or by='sat_name'
+#returns a dict of group -> model
+def load_or_train_groups(registry_directory, training_data, by, anomaly_inputs=ANOMALY_INPUTS, n_jobs=-1, **parameters):
+    return {
+        group: load_or_train(registry_directory, group_data, anomaly_inputs, name=f"{by}={group}", n_jobs=n_jobs, **parameters)
+        for group, group_data in training_data.groupby(by, observed=True)
+    }
+
+#function to compute anomaly labels (-1 outlier, 1 inlier) chunk by chunk, with bounded memory
+def predict_chunked(model, inputs, chunk_size=CHUNK_SIZE):
+    labels = np.empty(len(inputs), dtype=int)
+    for start in range(0, len(inputs), chunk_size):
+        labels[start:start + chunk_size] = model.predict(inputs.iloc[start:start + chunk_size])
+    return labels
+
+#function to compute anomaly labels with one model per group (see load_or_train_groups)
+#rows of groups without a model are scored with the fallback model, if one is given
+def predict_by_group(models, df, by, anomaly_inputs=ANOMALY_INPUTS, fallback=None, chunk_size=CHUNK_SIZE):
+    labels = np.empty(len(df), dtype=int)
+    positions = np.arange(len(df))
+    for group, group_positions in pd.Series(positions).groupby(df[by].to_numpy()).groups.items():
+        model = models.get(group, fallback)
+        if model is None:
+            raise KeyError(f"no model for {by}={group!r} and no fallback model")
+        rows = positions[group_positions]
+        labels[rows] = predict_chunked(model, df[anomaly_inputs].iloc[rows], chunk_size)
+    return labels
+
+#function to score an iterator of dataframes (e.g. storage.iter_fragments) one chunk at a time
+#yields every chunk with an added 'anomaly' column
+def iter_scored(chunks, model, anomaly_inputs=ANOMALY_INPUTS, chunk_size=CHUNK_SIZE):
+    for chunk in chunks:
+        yield chunk.assign(anomaly=predict_chunked(model, chunk[anomaly_inputs], chunk_size))
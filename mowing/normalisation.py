@@ -0,0 +1,79 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+from mowing.regions import REGION_PREFIXES, extract_regions
+
+#groups normalised separately in this study
+NORMALISATION_KEYS = ['year', 'region']
+
+#function to compute the min and max of a column for every group, in one grouped pass
+#returns a table with the group keys, 'min', 'max' and 'count' (number of non-missing values)
+def fit_minmax(df, column='NDVI', keys=NORMALISATION_KEYS):
+    params = df.groupby(keys, observed=True)[column].agg(['min', 'max', 'count']).reset_index()
+    return params
+
+#function to scale a column to (0, 1) with the min and max of its group
+#same arithmetic as sklearn's MinMaxScaler (x * scale - min * scale, zero ranges scale by 1);
+#rows of groups without parameters become NaN
+def apply_minmax(df, params, column='NDVI', keys=NORMALISATION_KEYS):
+    lookup = df[keys].merge(params, on=keys, how='left')
+    data_min = lookup['min'].to_numpy(dtype=float)
+    data_range = lookup['max'].to_numpy(dtype=float) - data_min
+    scale = 1.0 / np.where(data_range < 10 * np.finfo(float).eps, 1.0, data_range)
+    values = df[column].to_numpy(dtype=float, na_value=np.nan)
+    return pd.Series(values * scale + (0 - data_min * scale), index=df.index, name=column)
+
+#functions to persist the normalisation parameters, so that new observations can be normalised later
+def save_minmax(params, path):
+    params.to_csv(path, index=False)
+
+def load_minmax(path):
+    return pd.read_csv(path)
+
+#function to add the year and region columns used as normalisation groups
+def add_normalisation_keys(df, region_prefixes=REGION_PREFIXES):
+    return df.assign(
+        year=df['date'].dt.year,
+        region=extract_regions(df['field_id'], region_prefixes).to_numpy(),
+    )
+
+#function for minmax normalisation of NDVI by year and region
+#the region is looked up from the field_id prefix (region_prefixes); rows of unknown regions become NaN
+#params reuses stored parameters instead of fitting them; return_params=True also returns the parameters
+def normalise_columns_byYear_Region(df, column='NDVI', region_prefixes=REGION_PREFIXES, params=None, return_params=False):
+    df['date'] = pd.to_datetime(df['date'], dayfirst=True)
+    normalised_df = add_normalisation_keys(df, region_prefixes)
+
+    if params is None:
+        params = fit_minmax(normalised_df, column)
+    normalised_df[column] = apply_minmax(normalised_df, params, column)
+
+    if return_params:
+        return normalised_df, params
+    return normalised_df
+
+#function to combine stored parameters with the min and max of newly arriving observations
+#returns the updated parameters and the groups whose min or max changed;
+#only those groups need to be re-normalised, all other stored values stay valid
+def update_minmax(params, new_df, column='NDVI', keys=NORMALISATION_KEYS):
+    new_params = fit_minmax(new_df, column, keys)
+    combined = params.merge(new_params, on=keys, how='outer', suffixes=('', '_new'))
+
+    updated = combined[keys].copy()
+    updated['min'] = combined[['min', 'min_new']].min(axis=1)
+    updated['max'] = combined[['max', 'max_new']].max(axis=1)
+    updated['count'] = combined['count'].fillna(0).astype(int) + combined['count_new'].fillna(0).astype(int)
+
+    changed = (updated['min'] != combined['min']) | (updated['max'] != combined['max'])
+    return updated, updated.loc[changed, keys].reset_index(drop=True)
+
+#function to normalise new observations with the stored parameters, updating them incrementally
+#returns the normalised new rows, the updated parameters and the groups that changed
+#(stored rows of the changed groups have to be normalised again with the updated parameters)
+def normalise_new_observations(new_df, params, column='NDVI', region_prefixes=REGION_PREFIXES):
+    new_df = new_df.assign(date=pd.to_datetime(new_df['date'], dayfirst=True))
+    new_df = add_normalisation_keys(new_df, region_prefixes)
+    params, changed_groups = update_minmax(params, new_df.dropna(subset=['region']), column)
+    new_df[column] = apply_minmax(new_df, params, column)
+    return new_df, params, changed_groups
@@ -0,0 +1,222 @@
+#the following python modules need to be installed:
+import copy
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from mowing import cuts, deduplication, features, instrumentation, models, normalisation, pipeline, preparation, smoothing, splitting
+from mowing.regions import REGION_PREFIXES, extract_regions
+
+#out-of-core execution of stages 5 to 7 for datasets that do not fit in memory
+#the prepared observations are streamed into partitions on disk, either by year and region or by a hash
+#of the field_id into a fixed number of buckets; a partition always holds complete date-field_id collisions
+#and complete year-field_id series, so merge, split, outlier removal, smoothing and cut detection run
+#partition by partition. The min-max normalisation needs two passes: the min and max of every year-region
+#group are combined over all partitions first and then applied to every partition.
+#Only one partition per worker process is held in memory at a time.
+
+#partitioning: ('year', 'region') or a number of field_id hash buckets
+PARTITIONS = ('year', 'region')
+
+#rows of training data sampled across all partitions to fit the Isolation Forest
+#(each tree is fitted on 256 rows; the sample sets the contamination offset)
+MAX_TRAINING_ROWS = 1000000
+
+#subdirectories of the working directory
+OBSERVATIONS = 'observations'
+MERGED = 'merged'
+SMOOTHED = 'smoothed'
+
+#function to compute the partition of every row, as a string usable as a folder name
+#e.g. 'year_2020_region_KM' or, with a number of buckets, 'field_0042'
+def partition_keys(df, partitions=PARTITIONS, region_prefixes=REGION_PREFIXES):
+    if isinstance(partitions, (int, np.integer)):
+        buckets = pd.util.hash_array(df['field_id'].astype(str).to_numpy(dtype=object)) % np.uint64(partitions)
+        return 'field_' + pd.Series(buckets, index=df.index).astype(str).str.zfill(4)
+
+    parts = []
+    for column in partitions:
+        if column == 'year':
+            values = pd.to_datetime(df['date']).dt.year.astype(str)
+        elif column == 'region':
+            values = extract_regions(df['field_id'], region_prefixes).fillna('unknown')
+        else:
+            raise ValueError(f"cannot partition by {column!r}, only by 'year' and 'region' or a number of buckets")
+        parts.append(f'{column}_' + values.set_axis(df.index))
+    return parts[0].str.cat(parts[1:], sep='_') if len(parts) > 1 else parts[0]
+
+#function to write chunks of prepared observations (date, NDVI, field_id, sat_name) into partitions
+#every chunk adds one Parquet file, named after name and the chunk number, to each of its partitions
+#returns the number of rows per partition
+def write_partitions(chunks, directory, partitions=PARTITIONS, region_prefixes=REGION_PREFIXES, name='chunk'):
+    directory = os.path.join(directory, OBSERVATIONS)
+    os.makedirs(directory, exist_ok=True)
+    counts = {}
+    for chunk_number, chunk in enumerate(chunks):
+        chunk = chunk.loc[:, preparation.MERGE_COLUMNS].assign(
+            date=lambda df: pd.to_datetime(df['date']),
+            field_id=lambda df: df['field_id'].astype(str),
+            sat_name=lambda df: df['sat_name'].astype(str),
+        )
+        for key, part in chunk.groupby(partition_keys(chunk, partitions, region_prefixes), sort=False):
+            os.makedirs(os.path.join(directory, key), exist_ok=True)
+            part.to_parquet(os.path.join(directory, key, f'{name}_{chunk_number:06d}.parquet'), index=False)
+            counts[key] = counts.get(key, 0) + len(part)
+    return counts
+
+#function to list the partitions of a subdirectory of the working directory
+def list_partitions(directory, stage=OBSERVATIONS):
+    stage_directory = os.path.join(directory, stage)
+    if not os.path.isdir(stage_directory):
+        return []
+    return sorted(name.removesuffix('.parquet') for name in os.listdir(stage_directory))
+
+#function to read one partition
+def read_partition(directory, key, stage=OBSERVATIONS):
+    path = os.path.join(directory, stage, key)
+    return pd.read_parquet(path if os.path.isdir(path) else f'{path}.parquet')
+
+#function to combine min-max parameters fitted on parts of the data (see normalisation.fit_minmax)
+def combine_minmax(partial_params, keys=normalisation.NORMALISATION_KEYS):
+    return (
+        pd.concat(partial_params, ignore_index=True)
+        .groupby(keys, observed=True)
+        .agg({'min': 'min', 'max': 'max', 'count': 'sum'})
+        .reset_index()
+    )
+
+#first pass over a partition: take the daily medians of the satellites in median_sat_names (a partition holds all
+#observations of its date-field_id combinations), resolve date-field_id collisions, remove unrealistic NDVI values,
+#save the merged partition and fit the min and max of its year-region groups
+def _merge_partition(directory, key, priority, region_prefixes, median_sat_names):
+    observations = preparation.daily_medians(read_partition(directory, key), median_sat_names)
+    merged, statistics = deduplication.resolve_duplicates(observations, priority)
+    merged = merged[merged['NDVI'] > 0]
+    merged.to_parquet(os.path.join(directory, MERGED, f'{key}.parquet'), index=False)
+    params = normalisation.fit_minmax(normalisation.add_normalisation_keys(merged, region_prefixes))
+    return params, statistics, len(merged)
+
+#random seed of a partition, from the seed of the run and the partition key
+def _partition_seed(seed, key):
+    return [seed, *key.encode()]
+
+#function to normalise a merged partition with the combined parameters and split it into training and validation
+#the split of a partition only depends on the partition key and the seed
+def _normalised_split(directory, key, params, region_prefixes, train_share, seed, stratify_by):
+    merged = read_partition(directory, key, MERGED)
+    normalised = normalisation.normalise_columns_byYear_Region(merged, region_prefixes=region_prefixes, params=params)
+    normalised = normalised.drop(columns=['year', 'region'])
+    training_rows, validation_rows = splitting.train_validation_indices(
+        normalised, train_share, _partition_seed(seed, key), stratify_by
+        )
+    return normalised, training_rows, validation_rows
+
+#second pass over a partition: sample its training rows with the valley anomaly input
+def _sample_training(directory, key, params, region_prefixes, train_share, seed, stratify_by, fraction, valley_threshold):
+    normalised, training_rows, _ = _normalised_split(directory, key, params, region_prefixes, train_share, seed, stratify_by)
+    training = features.calculate_valley(normalised.iloc[training_rows].copy(), threshold=valley_threshold)
+    sampled = np.random.default_rng(_partition_seed(seed, key)).random(len(training)) < fraction
+    return training.loc[sampled, models.ANOMALY_INPUTS], len(training)
+
+#third pass over a partition: outlier removal, smoothing and cut detection, and saving of the smoothed series
+def _detect_partition(directory, key, params, region_prefixes, train_share, seed, stratify_by, detect_on, model,
+                      valley_threshold, window_length, polyorder, cut_threshold, excluded_months):
+    normalised, _, validation_rows = _normalised_split(directory, key, params, region_prefixes, train_share, seed, stratify_by)
+    observations = normalised.iloc[validation_rows] if detect_on == 'validation' else normalised
+    cleaned = pipeline.remove_outliers(observations, model, valley_threshold=valley_threshold)
+    smoothed = pipeline.smooth_series(cleaned, window_length, polyorder)
+    smoothed.to_parquet(os.path.join(directory, SMOOTHED, f'{key}.parquet'), index=False)
+    return cuts.detect_cuts(smoothed, cut_threshold, excluded_months), len(observations), len(cleaned)
+
+#function to run one pass over all partitions, in a pool of processes if processes > 1
+#the function is called with the working directory, the partition key and args
+def _map_partitions(function, keys, processes, directory, *args):
+    arguments = [[directory] * len(keys), keys, *[[arg] * len(keys) for arg in args]]
+    if processes == 1 or len(keys) <= 1:
+        return list(map(function, *arguments))
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+        return list(executor.map(function, *arguments))
+
+#function to run stages 5 to 7 out of core
+#sources: iterables of prepared observation chunks (date, NDVI, field_id, sat_name), e.g. one per satellite;
+#median_sat_names: satellites whose repeated daily observations are reduced to their median per partition
+#(chunks of these satellites are prepared without the medians, e.g. by preparation.sentinel2_observations);
+#directory: working directory for the partitions (emptied first) and the smoothed series (directory/smoothed);
+#model: a fitted Isolation Forest, otherwise one is trained on a sample of max_training_rows training rows;
+#detect_on: 'validation' detects cuts in the validation rows (as 6_IF_and_SG.py), 'all' in all rows;
+#processes: partitions processed at the same time (each one held in memory by its own process);
+#report: an instrumentation.RunReport recording the passes
+#returns the cut dates of all year-field_id series, the min-max parameters and the model
+def run_out_of_core(sources, directory, partitions=PARTITIONS, model=None, priority=deduplication.SENSOR_PRIORITY,
+                    median_sat_names=('Sen2',), region_prefixes=REGION_PREFIXES, train_share=splitting.TRAIN_SHARE, seed=42, stratify_by=None,
+                    max_training_rows=MAX_TRAINING_ROWS, if_parameters=None, detect_on='validation',
+                    valley_threshold=features.VALLEY_THRESHOLD, window_length=smoothing.WINDOW_LENGTH,
+                    polyorder=smoothing.POLYORDER, cut_threshold=cuts.CUT_THRESHOLD,
+                    excluded_months=cuts.EXCLUDED_MONTHS, processes=1, report=None):
+    if detect_on not in ('validation', 'all'):
+        raise ValueError(f"detect_on must be 'validation' or 'all', not {detect_on!r}")
+    report = report if report is not None else instrumentation.RunReport('out_of_core')
+    stage = report.stage
+
+    for subdirectory in (OBSERVATIONS, MERGED, SMOOTHED):
+        shutil.rmtree(os.path.join(directory, subdirectory), ignore_errors=True)
+    os.makedirs(os.path.join(directory, MERGED))
+    os.makedirs(os.path.join(directory, SMOOTHED))
+
+    #stream the sources into partitions
+    with stage('partition') as record:
+        counts = {}
+        for source_number, source in enumerate(sources):
+            written = write_partitions(source, directory, partitions, region_prefixes, name=f'source_{source_number:03d}')
+            for key, rows in written.items():
+                counts[key] = counts.get(key, 0) + rows
+        keys = sorted(counts)
+        if not keys:
+            raise ValueError("the sources contain no observations")
+        record.note(partitions=len(keys), rows=sum(counts.values()), largest_partition_rows=max(counts.values(), default=0))
+
+    #first pass: merge every partition and fit the min and max of its year-region groups
+    with stage('merge_and_fit_minmax') as record:
+        merged = _map_partitions(_merge_partition, keys, processes, directory, priority, region_prefixes,
+                                 tuple(median_sat_names))
+        params = combine_minmax([partial for partial, _, _ in merged])
+        statistics = pd.concat([partial for _, partial, _ in merged], ignore_index=True)
+        if not statistics.empty:
+            statistics = statistics.groupby(['kept', 'dropped'], as_index=False)['collisions'].sum()
+        deduplication.report_collisions(statistics)
+        record.note(merged_rows=sum(rows for _, _, rows in merged))
+
+    #second pass: sample the training rows of all partitions and train the Isolation Forest
+    arguments = (params, region_prefixes, train_share, seed, stratify_by)
+    if model is None:
+        with stage('train_isolation_forest') as record:
+            total_rows = sum(rows for _, _, rows in merged)
+            fraction = min(1.0, max_training_rows / max(total_rows * train_share, 1))
+            sampled = _map_partitions(_sample_training, keys, processes, directory, *arguments, fraction, valley_threshold)
+            training = pd.concat([sample for sample, _ in sampled], ignore_index=True)
+            model = IsolationForest(n_jobs=-1, **{**models.IF_PARAMETERS, **(if_parameters or {})})
+            model.fit(training[models.ANOMALY_INPUTS])
+            record.note(training_rows=sum(rows for _, rows in sampled), sampled_rows=len(training))
+
+    #third pass: outlier removal, smoothing and cut detection per partition
+    #with several processes, every worker predicts with one job (n_jobs=-1 would start a thread per core in each
+    #of them); the returned model keeps its own n_jobs
+    detect_model = model
+    if processes > 1 and hasattr(model, 'n_jobs'):
+        detect_model = copy.copy(model).set_params(n_jobs=1)
+    with stage('detect_mowing') as record:
+        detected = _map_partitions(_detect_partition, keys, processes, directory, *arguments, detect_on, detect_model,
+                                   valley_threshold, window_length, polyorder, cut_threshold, excluded_months)
+        cut_dates = pd.concat([partial for partial, _, _ in detected], ignore_index=True)
+        cut_columns = sorted((c for c in cut_dates.columns if c.startswith('cut_')), key=lambda c: int(c[4:]))
+        cut_dates = cut_dates.loc[:, ['year', 'field_id', *cut_columns]].sort_values(['year', 'field_id'], ignore_index=True)
+        record.note(rows=sum(rows for _, rows, _ in detected), cleaned_rows=sum(rows for _, _, rows in detected),
+                    field_seasons=len(cut_dates))
+
+    return cut_dates, params, model
@@ -0,0 +1,45 @@
+#the following python modules need to be installed:
+import pandas as pd
+
+from mowing import cuts, features, smoothing
+
+#anomaly inputs of the Isolation Forest
+ANOMALY_INPUTS = ['NDVI', 'valley']
+
+#stages 6 and 7 for normalised observations (date, NDVI, field_id), shared by the incremental,
+#streaming and benchmark code; the numbered scripts run the same steps on whole datasets
+
+#function to remove the observations an Isolation Forest labels as outliers (stage 6)
+#returns the remaining date, field_id and NDVI columns sorted by date
+def remove_outliers(df, model, anomaly_inputs=ANOMALY_INPUTS, valley_threshold=features.VALLEY_THRESHOLD):
+    df = features.calculate_valley(df.copy(), threshold=valley_threshold).drop(columns=['year'])
+    if df.empty:
+        return df.loc[:, ['date', 'field_id', 'NDVI']]
+    anomaly = model.predict(df[anomaly_inputs])
+    return (
+        df
+        .loc[anomaly != -1]
+        .sort_values(by='date')
+        .loc[:, ['date', 'field_id', 'NDVI']]
+    )
+
+#function to smooth NDVI with the SG filter and add dif_to_forelast (stage 6)
+def smooth_series(df, window_length=smoothing.WINDOW_LENGTH, polyorder=smoothing.POLYORDER, short_groups='filter'):
+    df = df.assign(date=pd.to_datetime(df['date'])).sort_values(by='date')
+    df['year'] = df['date'].dt.year
+    df = smoothing.smooth_by_group(
+        df, 'NDVI', ['year', 'field_id'], output_column='smoothed_NDVI',
+        window_length=window_length, polyorder=polyorder, mode='nearest', short_groups=short_groups
+        )
+    df = df.drop(columns=['NDVI', 'year']).rename(columns={'smoothed_NDVI': 'NDVI'})
+    return features.calculate_temporal_features(df, 'NDVI')
+
+#function to run outlier removal, smoothing and cut detection on normalised observations (stages 6 and 7)
+#returns the smoothed observations and the cut dates per year-field_id
+def detect_mowing(normalised, model, anomaly_inputs=ANOMALY_INPUTS, valley_threshold=features.VALLEY_THRESHOLD,
+                  window_length=smoothing.WINDOW_LENGTH, polyorder=smoothing.POLYORDER,
+                  cut_threshold=cuts.CUT_THRESHOLD, excluded_months=cuts.EXCLUDED_MONTHS):
+    cleaned = remove_outliers(normalised, model, anomaly_inputs, valley_threshold)
+    smoothed = smooth_series(cleaned, window_length, polyorder)
+    cut_dates = cuts.detect_cuts(smoothed, cut_threshold, excluded_months)
+    return smoothed, cut_dates
@@ -0,0 +1,89 @@
+#the following python modules need to be installed:
+import pandas as pd
+
+#columns of the prepared satellite datasets, as expected by the merge (see mowing/deduplication.py)
+MERGE_COLUMNS = ["date", "NDVI", "field_id", "sat_name"]
+
+#preparation of the satellite datasets for merging (5_merge_and_split.py)
+#the branches are independent of each other and can run concurrently (see mowing/runner.py)
+
+#function to prepare Landsat-7 or Landsat-8 observations:
+#convert 'date' column to datetime and sort by date, drop rows with NA values in the band and
+#index columns, rename columns, and select columns
+def prepare_landsat(raw, date_format=None):
+    column_range = list(raw.columns[1:14])
+    return (
+        raw
+        .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'], format=date_format)))
+        .sort_values('date')
+        .dropna(subset=column_range)
+        .rename(columns={"Satellite": "sat_name"})
+        .loc[:, MERGE_COLUMNS]
+    )
+
+#function to clean the Planet (Dove) zonal statistics (4_dove-preprocessing.py) by
+#dropping rows w/ empty NDVI values and
+#calculating NDVI median for duplicate date-field_id combinations (multiple observations in one day)
+def planet_daily_medians(planet_raw):
+    return (
+        planet_raw
+        .dropna(subset = "NDVI")
+        .groupby(['date', 'field_id'], as_index=False)[["NDVI", "cloud_cover"]]
+        .median()
+        .pipe(lambda x: x[[c for c in x if c != 'field_id'] + ['field_id']])
+        .assign(sat_name='Planet')
+    )
+
+#function to prepare Planet observations: convert 'date' column to datetime and sort by date
+#other processes already occurred in 4_dove-preprocessing.py
+def prepare_planet(raw):
+    return (
+        raw
+        .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
+        .sort_values('date')
+    )
+
+#function to prepare Sentinel-2 observations: as prepare_landsat, and
+#calculate median of duplicate "date" and "field_id" groups
+#since sen2 had repeated daily observations for our study areas
+def prepare_sentinel2(raw):
+    column_range = list(raw.columns[1:21])
+    return (
+        raw
+        .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
+        .sort_values('date')
+        .dropna(subset=column_range)
+        .groupby(['date', 'field_id'], as_index=False)[raw.columns[1:22]]
+        .median()
+        .pipe(lambda x: x[[c for c in x if c != 'field_id'] + ['field_id']])
+        .assign(sat_name="Sen2")
+        .loc[:, MERGE_COLUMNS]
+    )
+
+#function to prepare Sentinel-2 observations without the daily medians, for datasets prepared in chunks:
+#repeated daily observations may be in different chunks, so their medians are computed after
+#partitioning with daily_medians (see mowing/outofcore.py)
+def sentinel2_observations(raw):
+    column_range = list(raw.columns[1:21])
+    return (
+        raw
+        .pipe(lambda x: x.assign(date=pd.to_datetime(x['date'])))
+        .sort_values('date')
+        .dropna(subset=column_range)
+        .assign(sat_name="Sen2")
+        .loc[:, MERGE_COLUMNS]
+    )
+
+#function to replace the repeated daily observations of the satellites in sat_names by their NDVI median
+#per date-field_id combination, as prepare_sentinel2; the rows of other satellites are kept as they are
+def daily_medians(df, sat_names=('Sen2',)):
+    repeated = df['sat_name'].isin(sat_names).to_numpy()
+    if not repeated.any():
+        return df
+    medians = (
+        df[repeated]
+        .groupby(['date', 'field_id', 'sat_name'], as_index=False, observed=True)['NDVI']
+        .median()
+        .loc[:, MERGE_COLUMNS]
+    )
+    return pd.concat([df[~repeated], medians], ignore_index=True)
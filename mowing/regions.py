@@ -0,0 +1,21 @@
+#the following python modules need to be installed:
+import numpy as np
+import pandas as pd
+
+#region codes at the start of the field_id, KM, LM and AL in this study
+#a dict maps prefixes to region names instead, e.g. {'KM': 'Kollbach', 'LM': 'Lochham'}
+REGION_PREFIXES = ('KM', 'LM', 'AL')
+
+#function to look up the region of every field_id by its prefix, vectorised over the whole column
+#prefixes is a sequence of region codes or a dict of prefix -> region; longer prefixes win
+#field_ids without a known prefix get a missing region
+def extract_regions(field_ids, prefixes=REGION_PREFIXES):
+    table = dict(prefixes) if isinstance(prefixes, dict) else {prefix: prefix for prefix in prefixes}
+    field_ids = pd.Series(field_ids)
+    as_text = field_ids.astype('str').where(field_ids.notna())
+
+    regions = pd.Series(np.nan, index=field_ids.index, dtype=object)
+    for length in sorted({len(prefix) for prefix in table}, reverse=True):
+        found = regions.isna()
+        regions[found] = as_text[found].str[:length].map({p: r for p, r in table.items() if len(p) == length})
+    return regions.rename('region')
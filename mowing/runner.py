@@ -0,0 +1,237 @@
+#the following python modules need to be installed:
+import hashlib
+import json
+import os
+import sys
+import types
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import joblib
+import pandas as pd
+
+#small runner for pipeline stages declared as a DAG (directed acyclic graph)
+#every stage has a cache key computed from its function, its parameters, the fingerprints of its
+#input files and the keys of the stages it depends on; a stage whose key is already in the cache
+#is not executed, so that e.g. a change of the SG window_length only re-executes smoothing and the
+#stages after it. The key also covers the code of the stage function (constants and nested functions
+#included), the functions of the script it calls and the source of the mowing modules they use, so
+#editing e.g. buffer_size in a stage function or a function of mowing/dove.py re-executes the stage.
+#Stages whose inputs are ready run concurrently in a thread pool.
+#Files written by a stage (e.g. masked images) are not tracked: delete the cache entry to redo them.
+
+#one stage of the pipeline
+#func is called with the outputs of the stages in inputs (in that order) followed by params as
+#keyword arguments; files are paths (files or directories) whose changes invalidate the stage
+#exclusive stages run alone, e.g. stages starting their own process pool (forking a process
+#while other threads are running is not safe)
+class Stage:
+    __slots__ = ('name', 'func', 'inputs', 'params', 'files', 'exclusive')
+
+    def __init__(self, name, func, inputs=(), params=None, files=(), exclusive=False):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = dict(params or {})
+        self.files = tuple(files)
+        self.exclusive = exclusive
+
+#function to fingerprint input files or directories by path, size and modification time
+#hash_contents=True hashes the file contents instead (slower, but independent of copies and touches)
+def fingerprint_files(paths, hash_contents=False):
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(
+                os.path.join(root, name) for root, _, names in os.walk(path) for name in names
+            )
+        else:
+            files = [path]
+        for file in files:
+            if not os.path.exists(file):
+                digest.update(f"{file}:missing".encode())
+                continue
+            if hash_contents:
+                digest.update(file.encode())
+                with open(file, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        digest.update(block)
+            else:
+                status = os.stat(file)
+                digest.update(f"{file}:{status.st_size}:{status.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+#function to hash a code object: bytecode, constants (nested functions and lambdas recursively) and names
+def code_fingerprint(code, digest=None):
+    digest = digest or hashlib.sha256()
+    digest.update(code.co_code)
+    digest.update(repr(code.co_names).encode())
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            code_fingerprint(constant, digest)
+        else:
+            digest.update(f"{type(constant).__name__}:{constant!r}".encode())
+    return digest.hexdigest()
+
+def _global_names(code):
+    names = set(code.co_names)
+    for constant in code.co_consts:
+        if isinstance(constant, types.CodeType):
+            names |= _global_names(constant)
+    return names
+
+#function to collect what a stage function depends on: the code of the functions it calls from its own
+#script (recursively) and the source files of the mowing modules used by them, including the mowing
+#modules those import; returns a sorted list of (name, hash) pairs
+def code_dependencies(func):
+    fingerprints, modules = {}, set()
+    pending = [func]
+    while pending:
+        function = pending.pop()
+        name = f"{function.__module__}.{function.__qualname__}"
+        if name in fingerprints:
+            continue
+        fingerprints[name] = code_fingerprint(function.__code__)
+        namespace = function.__globals__
+        for global_name in _global_names(function.__code__):
+            value = namespace.get(global_name)
+            if isinstance(value, types.ModuleType):
+                module_name = value.__name__
+            else:
+                module_name = getattr(value, '__module__', None)
+                if isinstance(value, types.FunctionType) and module_name == function.__module__:
+                    pending.append(value)
+                    continue
+            if module_name and module_name.split('.')[0] == 'mowing':
+                modules.add(module_name)
+
+    #mowing modules imported by the used ones
+    pending = list(modules)
+    while pending:
+        module = sys.modules.get(pending.pop())
+        for value in vars(module).values() if module is not None else ():
+            module_name = value.__name__ if isinstance(value, types.ModuleType) else getattr(value, '__module__', None)
+            if isinstance(module_name, str) and module_name.split('.')[0] == 'mowing' and module_name not in modules:
+                modules.add(module_name)
+                pending.append(module_name)
+
+    for module_name in modules:
+        path = getattr(sys.modules.get(module_name), '__file__', None)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                fingerprints[module_name] = hashlib.sha256(f.read()).hexdigest()
+    return sorted(fingerprints.items())
+
+#function to compute the cache key of a stage from its definition and the keys of its inputs
+def stage_key(stage, input_keys, hash_contents=False):
+    func = stage.func
+    definition = {
+        'stage': stage.name,
+        'func': f"{getattr(func, '__module__', '')}.{getattr(func, '__qualname__', repr(func))}",
+        'code': code_dependencies(func) if isinstance(func, types.FunctionType) else None,
+        'params': stage.params,
+        'inputs': list(input_keys),
+        'files': fingerprint_files(stage.files, hash_contents) if stage.files else None,
+    }
+    return hashlib.sha256(json.dumps(definition, sort_keys=True, default=repr).encode()).hexdigest()
+
+#function to order the stages so that every stage comes after its inputs
+def topological_order(stages):
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("stage names must be unique")
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"cycle between stages: {' -> '.join(path + [name])}")
+        if name not in by_name:
+            raise KeyError(f"unknown input stage {name!r} of {path[-1]!r}")
+        state[name] = 'visiting'
+        for input_name in by_name[name].inputs:
+            visit(input_name, path + [name])
+        state[name] = 'done'
+        order.append(by_name[name])
+
+    for stage in stages:
+        visit(stage.name, [])
+    return order
+
+def _cache_path(cache_directory, stage, key):
+    return os.path.join(cache_directory, f"{stage.name}-{key[:16]}.joblib")
+
+#function to run the stages, reusing cached outputs
+#targets are the stages whose outputs are returned (default: all stages without dependents);
+#only the stages needed to produce targets that are not cached are executed or loaded
+#report is an optional mowing.instrumentation.RunReport recording the executed stages
+#(with the CPU time of the thread that ran each of them, see mowing/instrumentation.py)
+#returns a dict of stage name -> output
+def run_stages(stages, cache_directory=None, targets=None, max_workers=4, report=None, hash_contents=False):
+    order = topological_order(stages)
+    if targets is None:
+        used = {name for stage in order for name in stage.inputs}
+        targets = [stage.name for stage in order if stage.name not in used]
+
+    keys = {}
+    for stage in order:
+        keys[stage.name] = stage_key(stage, [keys[name] for name in stage.inputs], hash_contents)
+
+    def is_cached(stage):
+        return cache_directory is not None and os.path.exists(_cache_path(cache_directory, stage, keys[stage.name]))
+
+    #stages to execute or load: the targets, and the inputs of every stage that has to be executed
+    by_name = {stage.name: stage for stage in order}
+    needed, pending = set(), list(targets)
+    while pending:
+        name = pending.pop()
+        if name in needed:
+            continue
+        needed.add(name)
+        if not is_cached(by_name[name]):
+            pending.extend(by_name[name].inputs)
+
+    if cache_directory is not None:
+        os.makedirs(cache_directory, exist_ok=True)
+
+    outputs = {}
+
+    def execute(stage):
+        path = _cache_path(cache_directory, stage, keys[stage.name]) if cache_directory is not None else None
+        if path is not None and os.path.exists(path):
+            print(f"{stage.name}: cached")
+            return joblib.load(path)
+        arguments = [outputs[name] for name in stage.inputs]
+        if report is not None:
+            with report.stage(stage.name, arguments or None) as record:
+                result = stage.func(*arguments, **stage.params)
+                if isinstance(result, pd.DataFrame):
+                    record.output(result)
+        else:
+            result = stage.func(*arguments, **stage.params)
+        if path is not None:
+            joblib.dump(result, path + '.tmp')
+            os.replace(path + '.tmp', path)
+        print(f"{stage.name}: executed")
+        return result
+
+    remaining = [stage for stage in order if stage.name in needed]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while remaining or running:
+            for stage in list(remaining):
+                if any(other.exclusive for other in running.values()):
+                    break
+                if stage.exclusive and running:
+                    continue
+                if is_cached(stage) or all(name in outputs for name in stage.inputs):
+                    remaining.remove(stage)
+                    running[executor.submit(execute, stage)] = stage
+                    if stage.exclusive:
+                        break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                outputs[stage.name] = future.result()
+
+    return {name: outputs[name] for name in targets}
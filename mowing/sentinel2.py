@@ -0,0 +1,243 @@
+#the following python modules need to be installed:
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.features import bounds as geometry_bounds
+from rasterio.warp import transform_geom
+from rasterio.windows import Window, from_bounds
+from scipy.ndimage import binary_dilation, binary_erosion
+
+from mowing import dove
+
+#offline version of the Sentinel-2 cloud and shadow masking of 3_sentinel-2-preprocessing.py
+#(s2cloudless, Braaten 2022) for locally stored L2A bands and cloud probability rasters;
+#the per-field NDVI medians are computed directly, without the Earth Engine export
+
+#masking parameters, as in 3_sentinel-2-preprocessing.py
+CLD_PRB_THRESH = 65
+NIR_DRK_THRESH = 0.15
+CLD_PRJ_DIST = 1      # km
+BUFFER = 7            # pixels
+
+#reflectance scale of the L2A bands and scene classification (SCL) value of water
+#since processing baseline 04.00 (products from January 2022), the bands store reflectance * 1e4 + 1000:
+#BOA_ADD_OFFSET of the product metadata (-1000) has to be added before scaling; older products have no offset
+SR_BAND_SCALE = 1e4
+BASELINE_04_OFFSET = -1000
+SCL_WATER = 6
+
+#pixel size of the 10 m bands and of the grid the cloud projection is computed on (as the
+#reproject to scale 100 in Earth Engine), in metres
+PIXEL_SIZE = 10
+PROJECTION_SCALE = 100
+
+#columns of the scene index: acquisition date, file of every band and the mean solar azimuth angle
+#(MEAN_SOLAR_AZIMUTH_ANGLE of the product metadata); SCL and cloud probability may have a coarser resolution
+#the optional column boa_add_offset holds BOA_ADD_OFFSET of the product metadata; without it, the offset is
+#derived from an optional processing_baseline column (see read_scene_index), else 0
+SCENE_COLUMNS = ['date', 'B4', 'B8', 'SCL', 'cloud_probability', 'solar_azimuth']
+
+#function to shift a mask by (rows, cols): result[r, c] = mask[r + rows, c + cols], False outside
+def shift_mask(mask, rows, cols):
+    shifted = np.zeros_like(mask)
+    height, width = mask.shape
+    if abs(rows) >= height or abs(cols) >= width:
+        return shifted
+    target_rows = slice(max(-rows, 0), height - max(rows, 0))
+    target_cols = slice(max(-cols, 0), width - max(cols, 0))
+    source_rows = slice(max(rows, 0), height - max(-rows, 0))
+    source_cols = slice(max(cols, 0), width - max(-cols, 0))
+    shifted[target_rows, target_cols] = mask[source_rows, source_cols]
+    return shifted
+
+#function to reduce a mask to a coarser grid (block of factor x factor pixels is True if any pixel is)
+def coarsen_mask(mask, factor):
+    height, width = mask.shape
+    padded = np.zeros((-(-height // factor) * factor, -(-width // factor) * factor), dtype=bool)
+    padded[:height, :width] = mask
+    return padded.reshape(padded.shape[0] // factor, factor, padded.shape[1] // factor, factor).any(axis=(1, 3))
+
+#function to project clouds towards their shadows, as directionalDistanceTransform(...).mask()
+#a pixel is flagged when a cloud lies within max_distance (m) in the direction of the sun
+#shadow_azimuth is 90 - MEAN_SOLAR_AZIMUTH_ANGLE (degrees counterclockwise from east, towards the sun)
+#the projection is computed on a grid of projection_scale (m) by one array shift per step
+def project_clouds(clouds, shadow_azimuth, max_distance=CLD_PRJ_DIST * 1000, pixel_size=PIXEL_SIZE,
+                   projection_scale=PROJECTION_SCALE):
+    factor = max(int(round(projection_scale / pixel_size)), 1)
+    coarse = coarsen_mask(clouds, factor)
+    steps = int(round(max_distance / (pixel_size * factor)))
+
+    angle = np.deg2rad(shadow_azimuth)
+    #towards the sun: east is +col, north is -row
+    direction_cols, direction_rows = np.cos(angle), -np.sin(angle)
+    projected = coarse.copy()
+    for step in range(1, steps + 1):
+        projected |= shift_mask(coarse, int(round(step * direction_rows)), int(round(step * direction_cols)))
+
+    projected = projected.repeat(factor, axis=0).repeat(factor, axis=1)
+    return projected[:clouds.shape[0], :clouds.shape[1]]
+
+#function to build a circular structuring element, as the default kernel of focalMin/focalMax
+def disk(radius):
+    offsets = np.arange(-radius, radius + 1)
+    return offsets[:, None] ** 2 + offsets[None, :] ** 2 <= radius ** 2
+
+#function to compute the cloud and shadow mask of one scene (or window) from its arrays
+#same steps as add_cloud_bands, add_shadow_bands and add_cld_shdw_mask:
+#clouds: cloud probability > cld_prb_thresh; dark pixels: NIR < nir_drk_thresh outside water;
+#shadows: dark pixels within the projected clouds; the mask is eroded by 2 and buffered by buffer pixels
+#boa_add_offset is added to the NIR digital numbers before the dark pixel threshold
+#returns a boolean mask, True for cloud or shadow pixels
+def cloud_shadow_mask(cloud_probability, nir, scl, solar_azimuth, cld_prb_thresh=CLD_PRB_THRESH,
+                      nir_drk_thresh=NIR_DRK_THRESH, cld_prj_dist=CLD_PRJ_DIST, buffer=BUFFER,
+                      pixel_size=PIXEL_SIZE, projection_scale=PROJECTION_SCALE, boa_add_offset=0):
+    is_cloud = cloud_probability > cld_prb_thresh
+    dark_pixels = (nir < nir_drk_thresh * SR_BAND_SCALE - boa_add_offset) & (scl != SCL_WATER)
+    cloud_projection = project_clouds(is_cloud, 90 - solar_azimuth, cld_prj_dist * 1000, pixel_size, projection_scale)
+    is_cld_shdw = is_cloud | (cloud_projection & dark_pixels)
+
+    if not is_cld_shdw.any():
+        return is_cld_shdw
+    #pixels outside the array do not erode the mask, as masked pixels in focalMin
+    is_cld_shdw = binary_erosion(is_cld_shdw, structure=disk(2), border_value=1)
+    if buffer > 0 and is_cld_shdw.any():
+        is_cld_shdw = binary_dilation(is_cld_shdw, structure=disk(buffer))
+    return is_cld_shdw
+
+#function to compute NDVI of the unmasked pixels (NaN under the mask and where B4 + B8 is 0, i.e. no data)
+#NDVI does not change with the reflectance scale, so the digital numbers are used directly once
+#boa_add_offset is added (it does change NDVI)
+def masked_ndvi(red, nir, mask, boa_add_offset=0):
+    no_data = red.astype(np.float32) + nir == 0
+    red = red.astype(np.float32) + boa_add_offset
+    nir = nir.astype(np.float32) + boa_add_offset
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ndvi = (nir - red) / (nir + red)
+    ndvi[mask | no_data | (nir + red == 0)] = np.nan
+    return ndvi
+
+#function to find the window covering all fields on a raster grid, grown by margin pixels
+#and aligned to blocks of align pixels, so that the cloud projection grid is the same as for the full scene
+def fields_window(fields, src, margin, align=1):
+    left, bottom, right, top = np.array([geometry_bounds(geometry) for geometry, _ in fields]).T
+    window = from_bounds(left.min(), bottom.min(), right.max(), top.max(), src.transform)
+    row_off = max(int(np.floor(window.row_off)) - margin, 0) // align * align
+    col_off = max(int(np.floor(window.col_off)) - margin, 0) // align * align
+    row_end = min(int(np.ceil(window.row_off + window.height)) + margin, src.height)
+    col_end = min(int(np.ceil(window.col_off + window.width)) + margin, src.width)
+    if row_end <= row_off or col_end <= col_off:
+        return None
+    return Window(col_off, row_off, col_end - col_off, row_end - row_off)
+
+#function to read one band on the grid of a window of the 10 m bands
+#coarser bands (SCL, cloud probability) are resampled with nearest neighbour
+def read_on_grid(path, reference, window):
+    with rasterio.open(path) as src:
+        if (src.width, src.height) == (reference.width, reference.height):
+            return src.read(1, window=window)
+        x_scale, y_scale = src.width / reference.width, src.height / reference.height
+        source_window = Window(window.col_off * x_scale, window.row_off * y_scale, window.width * x_scale, window.height * y_scale)
+        return src.read(1, window=source_window, out_shape=(int(window.height), int(window.width)),
+                        resampling=Resampling.nearest)
+
+#function to calculate the NDVI median of every field in one scene
+#only the window covering the fields (plus the projection and buffer margin) is read
+#returns a dataframe with the columns date, NDVI and field_id
+def scene_ndvi_medians(scene, fields, label_cache=None, fields_crs=None, **mask_parameters):
+    parameters = {'cld_prj_dist': CLD_PRJ_DIST, 'buffer': BUFFER, 'pixel_size': PIXEL_SIZE,
+                  'projection_scale': PROJECTION_SCALE, **mask_parameters}
+    factor = max(int(round(parameters['projection_scale'] / parameters['pixel_size'])), 1)
+    margin = int(np.ceil(parameters['cld_prj_dist'] * 1000 / parameters['pixel_size'])) + parameters['buffer'] + 2 + factor
+
+    with rasterio.open(scene['B4']) as red_src:
+        geometries = fields
+        if fields_crs is not None and str(fields_crs) != str(red_src.crs):
+            geometries = [(transform_geom(fields_crs, red_src.crs, geometry), field_id) for geometry, field_id in fields]
+        window = fields_window(geometries, red_src, margin, align=factor)
+        if window is None:
+            return pd.DataFrame(columns=['date', 'NDVI', 'field_id'])
+        red = red_src.read(1, window=window)
+        transform = red_src.window_transform(window)
+        labels = dove.field_labels(geometries, red_src.crs, transform, int(window.width), int(window.height), label_cache)
+        nir = read_on_grid(scene['B8'], red_src, window)
+        scl = read_on_grid(scene['SCL'], red_src, window)
+        cloud_probability = read_on_grid(scene['cloud_probability'], red_src, window)
+
+    offset = scene_offset(scene)
+    mask = cloud_shadow_mask(cloud_probability, nir, scl, float(scene['solar_azimuth']), boa_add_offset=offset,
+                             **mask_parameters)
+    field_positions, medians = dove.label_medians(masked_ndvi(red, nir, mask, offset), labels)
+    return pd.DataFrame({
+        'date': scene['date'],
+        'NDVI': medians,
+        'field_id': [fields[position - 1][1] for position in field_positions],
+    })
+
+#function to get the BOA_ADD_OFFSET of one scene (row of the scene index), 0 when it is not given
+def scene_offset(scene):
+    offset = scene.get('boa_add_offset', 0)
+    return 0.0 if pd.isna(offset) else float(offset)
+
+#function to read the scene index, a CSV file with the columns of SCENE_COLUMNS
+#relative band paths are taken relative to the index file; without a boa_add_offset column, the offset
+#is derived from processing_baseline (e.g. 4.0 or '04.00') where that column is given
+def read_scene_index(index_file):
+    scenes = pd.read_csv(index_file)
+    missing = [column for column in SCENE_COLUMNS if column not in scenes.columns]
+    if missing:
+        raise ValueError(f"scene index {index_file} lacks the columns {missing}")
+    if 'boa_add_offset' not in scenes.columns and 'processing_baseline' in scenes.columns:
+        baseline = pd.to_numeric(scenes['processing_baseline'], errors='coerce')
+        scenes['boa_add_offset'] = np.where(baseline >= 4, BASELINE_04_OFFSET, 0)
+    base = os.path.dirname(os.path.abspath(index_file))
+    for band in ['B4', 'B8', 'SCL', 'cloud_probability']:
+        scenes[band] = [path if os.path.isabs(path) else os.path.join(base, path) for path in scenes[band]]
+    return scenes
+
+#fields and label rasters of one extraction, set by _init_worker in every worker process (or in this
+#process for a serial run, and cleared afterwards), so that another call never reuses them with other fields
+_worker_fields = {}
+
+def _init_worker(field_shapefile, field_id_column):
+    _worker_fields['fields'] = dove.read_fields(field_shapefile, field_id_column)
+    _worker_fields['label_cache'] = {}
+
+#function to calculate the field medians of one scene, used by the process pool
+def _scene_medians(scene, fields_crs, mask_parameters):
+    return scene_ndvi_medians(scene, _worker_fields['fields'], _worker_fields['label_cache'], fields_crs, **mask_parameters)
+
+#function to build the Sentinel-2 NDVI table of a tile archive, scene by scene in a process pool
+#scenes is a dataframe with the columns of SCENE_COLUMNS (see read_scene_index)
+#processes=None uses all cores, processes=1 runs serially; on Windows, call this from within
+#an `if __name__ == '__main__':` block
+#returns the columns date, NDVI, field_id and sat_name, as exported by 3_sentinel-2-preprocessing.py
+def extract_sentinel2_ndvi(scenes, field_shapefile, field_id_column='field_id', fields_crs=None, processes=None,
+                           **mask_parameters):
+    records = scenes.to_dict('records')
+    processes = processes or os.cpu_count() or 1
+    args = (fields_crs, mask_parameters)
+
+    if processes == 1 or len(records) <= 1:
+        _init_worker(field_shapefile, field_id_column)
+        try:
+            tables = [_scene_medians(scene, *args) for scene in records]
+        finally:
+            _worker_fields.clear()
+    else:
+        #fork avoids re-importing the calling script in every worker where it is available
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                                 initargs=(field_shapefile, field_id_column)) as executor:
+            tables = list(executor.map(_scene_medians, records, *[[arg] * len(records) for arg in args]))
+
+    tables = [table for table in tables if not table.empty]
+    if not tables:
+        return pd.DataFrame(columns=['date', 'NDVI', 'field_id', 'sat_name'])
+    ndvi = pd.concat(tables, ignore_index=True)
+    ndvi['date'] = pd.to_datetime(ndvi['date'])
+    return ndvi.assign(sat_name='Sen2')
@@ -0,0 +1,50 @@
+#the following python modules need to be installed:
+import numpy as np
+from scipy import signal
+
+from mowing.features import group_offsets, sorted_group_codes
+
+#Savitzky-Golay parameters used in this study
+WINDOW_LENGTH = 5
+POLYORDER = 2
+
+#function to apply the SG filter to every group of a group-sorted value array
+#groups of equal length are stacked and filtered in one call, so the cost is linear in the number of rows
+#groups shorter than window_length are handled according to short_groups:
+#   'filter' - filter them anyway, the window is padded by the edge mode (scipy's behaviour, used so far)
+#   'keep'   - keep their values unsmoothed
+#   'nan'    - set their values to NaN
+def savgol_by_group(values, offsets, window_length=WINDOW_LENGTH, polyorder=POLYORDER, mode='nearest', short_groups='filter'):
+    if short_groups not in ('filter', 'keep', 'nan'):
+        raise ValueError(f"short_groups must be 'filter', 'keep' or 'nan', not {short_groups!r}")
+
+    values = np.asarray(values, dtype=float)
+    smoothed = values.copy()
+    starts = offsets[:-1]
+    lengths = np.diff(offsets)
+
+    for length in np.unique(lengths):
+        if length < window_length and short_groups != 'filter':
+            if short_groups == 'nan':
+                rows = starts[lengths == length][:, None] + np.arange(length)
+                smoothed[rows] = np.nan
+            continue
+        rows = starts[lengths == length][:, None] + np.arange(length)
+        smoothed[rows] = signal.savgol_filter(values[rows], window_length=window_length, polyorder=polyorder, mode=mode, axis=-1)
+
+    return smoothed
+
+#function to smooth one column of a dataframe with the SG filter inside each group
+#rows keep their position; within a group they are filtered in their current order (sort by date first)
+def smooth_by_group(df, value_column, keys, output_column=None, window_length=WINDOW_LENGTH, polyorder=POLYORDER,
+                    mode='nearest', short_groups='filter'):
+    order, sorted_codes = sorted_group_codes(df, keys)
+    values = df[value_column].to_numpy(dtype=float, na_value=np.nan)[order]
+
+    smoothed = np.empty(len(df))
+    smoothed[order] = savgol_by_group(values, group_offsets(sorted_codes), window_length=window_length,
+                                      polyorder=polyorder, mode=mode, short_groups=short_groups)
+    smoothed[order[sorted_codes < 0]] = np.nan  # rows with a missing key belong to no group
+
+    df[output_column or value_column] = smoothed
+    return df
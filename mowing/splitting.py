@@ -0,0 +1,169 @@
+#the following python modules need to be installed:
+import random
+
+import numpy as np
+import pandas as pd
+
+from mowing.regions import REGION_PREFIXES, extract_regions
+
+#train/validation splits and cross-validation folds of whole year-field_id series (5_merge_and_split.py)
+#every series gets an integer group code, the groups are shuffled with one permutation and assigned to folds;
+#the unstratified split shuffles them as the former script 5 did, so it selects the same training groups;
+#splits are returned as positional row indices (df.iloc[indices]), not as copies of the data
+
+#share of the groups used for training, and strata of the stratified splits
+#'region' is looked up from the field_id prefix if the data has no region column;
+#a series observed by several satellites belongs to the sat_name with most observations
+TRAIN_SHARE = 0.8
+STRATIFY_BY = ('region', 'sat_name')
+
+#function to assign a group code to every row, numbered by field_id and year (as groupby().ngroup())
+#returns the codes and the number of groups; rows without field_id or date get -1
+def group_codes(df, date_format=None):
+    field_codes, _ = pd.factorize(df['field_id'], sort=True)
+    years = pd.to_datetime(df['date'], format=date_format).dt.year
+    valid = (field_codes >= 0) & years.notna().to_numpy()
+
+    codes = np.full(len(df), -1, dtype=np.int64)
+    if not valid.any():
+        return codes, 0
+    years = years.to_numpy(dtype=float, na_value=np.nan)[valid].astype(np.int64)
+    keys = field_codes[valid].astype(np.int64) * (years.max() - years.min() + 1) + (years - years.min())
+    unique_keys, codes[valid] = np.unique(keys, return_inverse=True)
+    return codes, len(unique_keys)
+
+#function to compute the stratum of every group from the columns in stratify_by
+#each group takes the most frequent value of a column within the group (missing values count as a value)
+#returns one integer stratum per group
+def group_strata(df, codes, n_groups, stratify_by=STRATIFY_BY, region_prefixes=REGION_PREFIXES):
+    valid = codes >= 0
+    group_values = []
+    for column in stratify_by:
+        if column in df:
+            values = df[column]
+        elif column == 'region':
+            field_codes, field_ids = pd.factorize(df['field_id'])
+            regions = extract_regions(field_ids, region_prefixes).to_numpy()
+            values = np.where(field_codes >= 0, regions[field_codes], None)
+        else:
+            raise KeyError(f"no column {column!r} to stratify by")
+        value_codes, uniques = pd.factorize(values)
+        n_values = len(uniques) + 1
+        counts = np.bincount(codes[valid] * n_values + value_codes[valid] + 1, minlength=n_groups * n_values)
+        group_values.append(counts.reshape(n_groups, n_values).argmax(axis=1))
+
+    if not group_values:
+        return np.zeros(n_groups, dtype=np.int64)
+    return np.unique(np.column_stack(group_values), axis=0, return_inverse=True)[1].reshape(-1)
+
+#function to order the groups randomly, within strata if given
+#returns the groups in that order and the rank of each of them within its stratum
+def _shuffled_ranks(n_groups, rng, strata=None):
+    order = rng.permutation(n_groups)
+    if strata is None:
+        return order, np.arange(n_groups), np.full(n_groups, n_groups)
+
+    order = order[np.argsort(strata[order], kind='stable')]
+    sorted_strata = strata[order]
+    starts = np.flatnonzero(np.r_[True, sorted_strata[1:] != sorted_strata[:-1]])
+    sizes = np.diff(np.r_[starts, n_groups])
+    ranks = np.arange(n_groups) - np.repeat(starts, sizes)
+    return order, ranks, np.repeat(sizes, sizes)
+
+#function to assign every group to one of n_folds folds
+#within a stratum the shuffled groups are dealt to the folds in turn (starting at a random fold),
+#so all folds have about the same size and the same share of every stratum
+def assign_folds(n_groups, n_folds=5, seed=42, strata=None):
+    rng = np.random.default_rng(seed)
+    order, ranks, _ = _shuffled_ranks(n_groups, rng, strata)
+    if strata is not None:
+        first_fold = rng.integers(n_folds, size=strata.max() + 1 if n_groups else 0)
+        ranks = ranks + first_fold[strata[order]]
+
+    folds = np.empty(n_groups, dtype=np.int64)
+    folds[order] = ranks % n_folds
+    return folds
+
+#function to share int(n_groups * train_share) training groups among the strata by largest remainder:
+#every stratum gets the integer part of its share, and the groups left over go to the strata with
+#the largest fractional parts (the first stratum on ties), so that the total is the same as without strata
+#returns the number of training groups of every stratum
+def stratum_training_counts(strata, train_share=TRAIN_SHARE):
+    quotas = np.bincount(strata) * train_share
+    counts = np.floor(quotas).astype(np.int64)
+    left_over = int(len(strata) * train_share) - counts.sum()
+    counts[np.argsort(counts - quotas, kind='stable')[:left_over]] += 1
+    return counts
+
+#function to select train_share of the groups (of every stratum) for training
+#without strata, the first int(n_groups * train_share) groups are used after shuffling the group numbers
+#with random.shuffle seeded with seed, as the former script 5 (same training groups for the same seed;
+#other seeds than integers, e.g. the per-partition seeds of mowing/outofcore.py, pass through np.random.SeedSequence);
+#with strata, the same total is shared among them (see stratum_training_counts)
+#returns a boolean array over the groups
+def assign_training_groups(n_groups, train_share=TRAIN_SHARE, seed=42, strata=None):
+    is_training = np.zeros(n_groups, dtype=bool)
+    if strata is None:
+        if not isinstance(seed, (int, np.integer)):
+            seed = int(np.random.SeedSequence(seed).generate_state(1)[0])
+        order = list(range(n_groups))
+        random.Random(seed).shuffle(order)
+        is_training[order[:int(n_groups * train_share)]] = True
+        return is_training
+
+    order, ranks, _ = _shuffled_ranks(n_groups, np.random.default_rng(seed), strata)
+    is_training[order] = ranks < stratum_training_counts(strata, train_share)[strata[order]]
+    return is_training
+
+#function to compute the group codes and strata of a dataframe
+def _groups(df, stratify_by, date_format, region_prefixes):
+    codes, n_groups = group_codes(df, date_format)
+    strata = group_strata(df, codes, n_groups, stratify_by, region_prefixes) if stratify_by else None
+    return codes, n_groups, strata
+
+#function to split the rows of whole year-field_id groups into training and validation data
+#returns the positional indices of the training rows and of the validation rows
+def train_validation_indices(df, train_share=TRAIN_SHARE, seed=42, stratify_by=None, date_format=None,
+                             region_prefixes=REGION_PREFIXES):
+    codes, n_groups, strata = _groups(df, stratify_by, date_format, region_prefixes)
+    is_training = assign_training_groups(n_groups, train_share, seed, strata)
+    valid = codes >= 0
+    return np.flatnonzero(valid & is_training[codes]), np.flatnonzero(valid & ~is_training[codes])
+
+#function to generate the training and validation indices of k-fold cross-validation, fold by fold
+#groups are assigned to folds once; the index arrays of a fold are only built when it is requested
+def iter_folds(df, n_folds=5, seed=42, stratify_by=None, date_format=None, region_prefixes=REGION_PREFIXES):
+    codes, n_groups, strata = _groups(df, stratify_by, date_format, region_prefixes)
+    folds = np.full(len(codes), -1, dtype=np.int64)
+    valid = codes >= 0
+    folds[valid] = assign_folds(n_groups, n_folds, seed, strata)[codes[valid]]
+    for fold in range(n_folds):
+        yield np.flatnonzero(valid & (folds != fold)), np.flatnonzero(folds == fold)
+
+#function to check a split: no date-field_id observation and no year-field_id group in both parts,
+#and together the parts contain all rows and groups of the source data
+#observations and groups are compared as int64 keys (field code combined with day or year) in hash sets
+def check_split(training_df, validation_df, source_df, date_format=None):
+    parts = [training_df, validation_df, source_df]
+    field_codes, field_ids = pd.factorize(pd.concat([df['field_id'] for df in parts], ignore_index=True))
+    field_codes = np.split(field_codes.astype(np.int64) + 1, np.cumsum([len(df) for df in parts[:-1]]))
+    n_fields = len(field_ids) + 1
+
+    def keys(df, codes):
+        dates = pd.to_datetime(df['date'], format=date_format)
+        days = dates.to_numpy(dtype='datetime64[D]').astype(np.int64)
+        years = dates.dt.year.to_numpy(dtype=float, na_value=0).astype(np.int64)
+        return pd.unique(days * n_fields + codes), pd.unique(years * n_fields + codes)
+
+    (training_observations, training_groups), (validation_observations, validation_groups), (_, source_groups) = \
+        [keys(df, codes) for df, codes in zip(parts, field_codes)]
+
+    result = {
+        'common_observations': int(pd.Index(training_observations).isin(validation_observations).sum()),
+        'common_groups': int(pd.Index(training_groups).isin(validation_groups).sum()),
+        'rows_match': len(training_df) + len(validation_df) == len(source_df),
+        'groups_match': len(training_groups) + len(validation_groups) == len(source_groups),
+    }
+    result['valid'] = (result['rows_match'] and result['groups_match']
+                       and not result['common_observations'] and not result['common_groups'])
+    return result
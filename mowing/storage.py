@@ -0,0 +1,179 @@
+#the following python modules need to be installed:
+import glob
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from mowing.regions import extract_regions
+
+#columns and data types of the per-scene NDVI tables
+NDVI_COLUMNS = ['date', 'NDVI', 'field_id', 'cloud_cover', 'sat_name']
+NDVI_DTYPES = {'NDVI': 'float64', 'cloud_cover': 'float64'}
+
+#function to list the fragment files of a directory, in a stable order
+def list_fragments(directory, pattern='*.csv'):
+    return sorted(glob.glob(os.path.join(directory, pattern)))
+
+#function to turn a list of column names into a usecols callable that ignores missing columns
+def _optional_columns(usecols):
+    if usecols is None or callable(usecols):
+        return usecols
+    wanted = set(usecols)
+    return lambda column: column in wanted
+
+#function to read one CSV fragment
+#usecols lists the columns to keep (missing ones are ignored), dtype maps columns to data types
+def read_fragment(path, usecols=None, dtype=None):
+    df = pd.read_csv(path, usecols=_optional_columns(usecols))
+    if dtype:
+        df = df.astype({column: kind for column, kind in dtype.items() if column in df.columns})
+    return df
+
+#function to read many CSV fragments concurrently and concatenate them once
+#the row order follows the order of paths
+def read_fragments(paths, usecols=None, dtype=None, max_workers=8):
+    paths = list(paths)
+    if not paths:
+        return pd.DataFrame()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(lambda path: read_fragment(path, usecols, dtype), paths))
+    return pd.concat(frames, ignore_index=True)
+
+#function to read CSV fragments in chunks of files_per_chunk files
+#yields one concatenated DataFrame per chunk, so only one chunk is held in memory at a time
+def iter_fragments(paths, files_per_chunk=500, usecols=None, dtype=None, max_workers=8):
+    paths = list(paths)
+    for start in range(0, len(paths), files_per_chunk):
+        yield read_fragments(paths[start:start + files_per_chunk], usecols, dtype, max_workers)
+
+#function to write CSV fragments into one CSV chunk by chunk, without holding all of them in memory
+#extra_columns are added to every chunk, e.g. {'sat_name': 'Lan8'}; returns the number of rows written
+def write_fragments_to_csv(paths, output_csv, files_per_chunk=500, usecols=None, dtype=None, extra_columns=None, max_workers=8):
+    rows = 0
+    header = True
+    for chunk in iter_fragments(paths, files_per_chunk, usecols, dtype, max_workers):
+        if extra_columns:
+            chunk = chunk.assign(**extra_columns)
+        chunk.to_csv(output_csv, index=False, mode='w' if header else 'a', header=header)
+        rows += len(chunk)
+        header = False
+    return rows
+
+#storage formats of the intermediate datasets
+#'csv' keeps the former files; 'parquet' stores typed columns (datetime64 dates, categorical
+#field_id/sat_name, float32 NDVI) and can be partitioned into year=.../region=... folders
+FILE_FORMATS = ('csv', 'parquet')
+CATEGORICAL_COLUMNS = ('field_id', 'sat_name', 'region')
+FLOAT32_COLUMNS = ('NDVI', 'dif_to_forelast', 'dif_to_last', 'cloud_cover')
+
+#file listing the partition columns that save_dataset added to a partitioned Parquet dataset
+#(files starting with '_' are ignored by Parquet readers)
+_PARTITION_FILE = '_partitions.txt'
+
+#function to add the file extension of a storage format to a path without extension
+def dataset_path(base_path, file_format='csv'):
+    if file_format not in FILE_FORMATS:
+        raise ValueError(f"file_format must be one of {FILE_FORMATS}, not {file_format!r}")
+    return f"{base_path}.{file_format}"
+
+#function to convert a dataframe to the typed columns stored in Parquet
+#dates are only parsed when they are already datetimes or a date_format is given, to avoid day/month guessing
+def to_columnar(df, date_format=None, float32_columns=FLOAT32_COLUMNS):
+    columns = {}
+    if 'date' in df.columns and (date_format or pd.api.types.is_datetime64_any_dtype(df['date'])):
+        columns['date'] = pd.to_datetime(df['date'], format=date_format).astype('datetime64[ns]')
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            columns[column] = df[column].astype('category')
+    for column in float32_columns:
+        if column in df.columns:
+            columns[column] = pd.to_numeric(df[column], errors='coerce').astype('float32')
+    return df.assign(**columns)
+
+#function to add the year and region partition columns when they are missing
+def _add_partition_columns(df, partition_by):
+    added = []
+    for column in partition_by:
+        if column in df.columns:
+            continue
+        if column == 'year':
+            df = df.assign(year=pd.to_datetime(df['date']).dt.year)
+        elif column == 'region':
+            df = df.assign(region=extract_regions(df['field_id']).fillna('unknown').to_numpy())
+        else:
+            raise ValueError(f"cannot derive partition column {column!r}")
+        added.append(column)
+    return df, added
+
+#function to save an intermediate dataset as CSV or Parquet
+#partition_by (Parquet only) splits the dataset into folders, e.g. ['year', 'region'];
+#year and region are derived from date and field_id if needed and dropped again by load_dataset
+#append=True adds the rows to an existing dataset, e.g. when writing chunk by chunk (see remove_dataset)
+def save_dataset(df, path, file_format='csv', partition_by=None, date_format=None, append=False):
+    if file_format == 'csv':
+        df.to_csv(path, index=False, mode='a' if append else 'w', header=not (append and os.path.exists(path)))
+        return path
+    if file_format != 'parquet':
+        raise ValueError(f"file_format must be one of {FILE_FORMATS}, not {file_format!r}")
+
+    df = to_columnar(df, date_format)
+    if not partition_by:
+        df.to_parquet(path, index=False)
+        return path
+
+    df, added = _add_partition_columns(df, partition_by)
+    if not append and os.path.isdir(path):
+        raise FileExistsError(f"{path} already exists, remove it or use append=True")
+    df.to_parquet(path, index=False, partition_cols=list(partition_by))
+    with open(os.path.join(path, _PARTITION_FILE), 'w') as f:
+        f.write('\n'.join(added))
+    return path
+
+#function to remove a dataset saved by save_dataset (file or partitioned folder), if it exists
+#used before writing a dataset chunk by chunk with append=True, so that a rerun does not add its rows twice
+def remove_dataset(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+#function to load an intermediate dataset saved by save_dataset, or any CSV with a date column
+#the format is taken from the path: folders and *.parquet are Parquet, everything else CSV
+def load_dataset(path, columns=None, filters=None, csv_date_format=None):
+    if not (os.path.isdir(path) or path.endswith('.parquet')):
+        df = pd.read_csv(path, usecols=columns)
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'], format=csv_date_format)
+        return df
+
+    df = pd.read_parquet(path, columns=columns, filters=filters)
+    return _drop_partition_columns(df, path, columns)
+
+#function to drop the partition columns added by save_dataset and to restore the year as integers
+def _drop_partition_columns(df, path, columns=None):
+    partition_file = os.path.join(path, _PARTITION_FILE)
+    if os.path.isdir(path) and os.path.exists(partition_file):
+        with open(partition_file) as f:
+            added = [column for column in f.read().split('\n') if column]
+        df = df.drop(columns=[column for column in added if column in df.columns and (columns is None or column not in columns)])
+    if 'year' in df.columns and isinstance(df['year'].dtype, pd.CategoricalDtype):
+        df['year'] = df['year'].astype(int)
+    return df
+
+#function to load a dataset saved by save_dataset (or any CSV with a date column) in chunks of rows_per_chunk rows,
+#so that datasets larger than the memory can be processed chunk by chunk; yields dataframes as load_dataset
+def iter_dataset(path, rows_per_chunk=1000000, columns=None, csv_date_format=None):
+    if not (os.path.isdir(path) or path.endswith('.parquet')):
+        for df in pd.read_csv(path, usecols=columns, chunksize=rows_per_chunk):
+            if 'date' in df.columns:
+                df['date'] = pd.to_datetime(df['date'], format=csv_date_format)
+            yield df
+        return
+
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(path, format='parquet', partitioning='hive' if os.path.isdir(path) else None)
+    for batch in dataset.to_batches(columns=columns, batch_size=rows_per_chunk):
+        if batch.num_rows:
+            yield _drop_partition_columns(batch.to_pandas(), path, columns)
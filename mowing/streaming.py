@@ -0,0 +1,225 @@
+#the following python modules need to be installed:
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from mowing import cuts, deduplication, features, normalisation, smoothing
+from mowing.pipeline import ANOMALY_INPUTS
+from mowing.regions import REGION_PREFIXES
+
+#streaming version of stages 6 and 7: observations are fed one by one or in micro-batches and a
+#'cut started' event is emitted as soon as the first dif_to_forelast <= threshold of a cluster is known.
+#Each step needs a few later observations before its value is final (the valley input 1, the SG filter
+#window_length // 2), so an event follows the observation that completes the SG window of the cut date.
+#For complete seasons, the events match the cut dates of the batch pipeline (mowing/pipeline.py).
+
+#compact state of one year-field_id series
+#only the last few observations of each step are kept, together with counters of all observations seen
+class FieldState:
+    __slots__ = ('raw', 'raw_count', 'raw_done', 'cleaned', 'cleaned_count', 'smoothed', 'smoothed_count',
+                 'in_cluster', 'last_date', 'last_sat_name')
+
+    def __init__(self):
+        self.raw = []              # last three raw observations (date, NDVI)
+        self.raw_count = 0         # raw observations seen
+        self.raw_done = 0          # raw observations passed on to the outlier removal
+        self.cleaned = []          # last window_length observations kept by the outlier removal
+        self.cleaned_count = 0     # observations kept by the outlier removal
+        self.smoothed = []         # last two smoothed NDVI values, for dif_to_forelast
+        self.smoothed_count = 0    # observations with a final smoothed value
+        self.in_cluster = False    # whether the last considered observation belongs to a cluster
+        self.last_date = None
+        self.last_sat_name = None  # satellite of the last raw observation, for same-date duplicates
+
+
+class StreamingCutDetector:
+    #model is the Isolation Forest used for outlier removal (None keeps every observation)
+    #params/region_prefixes normalise incoming raw NDVI with min-max parameters (see mowing/normalisation.py),
+    #which are extended with every batch: groups without stored parameters, e.g. the year of the current
+    #season, are added and the min and max of known groups are widened (see _normalise)
+    #without params, NDVI is expected to be normalised already
+    #priority picks one observation per date and field by satellite (see mowing/deduplication.py)
+    def __init__(self, model=None, params=None, region_prefixes=REGION_PREFIXES, priority=deduplication.SENSOR_PRIORITY,
+                 anomaly_inputs=ANOMALY_INPUTS,
+                 valley_threshold=features.VALLEY_THRESHOLD, window_length=smoothing.WINDOW_LENGTH,
+                 polyorder=smoothing.POLYORDER, cut_threshold=cuts.CUT_THRESHOLD, excluded_months=cuts.EXCLUDED_MONTHS):
+        self.model = model
+        self.params = params
+        self.region_prefixes = region_prefixes
+        self.priority = priority
+        self.anomaly_inputs = anomaly_inputs
+        self.valley_threshold = valley_threshold
+        self.window_length = window_length
+        self.half_window = window_length // 2
+        self.coefficients = signal.savgol_coeffs(window_length, polyorder, use='dot')
+        self.cut_threshold = cut_threshold
+        self.excluded_months = set(excluded_months)
+        self.fields = {}
+
+    #function to process observations (date, NDVI, field_id and optionally sat_name), in date order per field
+    #observations of one field on the same date, within the batch or with the last one of the previous batch
+    #(which is still buffered), keep one by satellite priority like the batch merge (resolve_duplicates)
+    #the whole batch is checked before the state changes: an observation older than the last one of its
+    #field raises a ValueError and leaves the detector as it was
+    #returns the 'cut started' events they complete as a dataframe (see _event)
+    def process(self, observations):
+        observations = observations.assign(date=pd.to_datetime(observations['date']))
+        if 'sat_name' not in observations:
+            observations = observations.assign(sat_name=None)
+        params = self.params
+        if params is not None:
+            observations, params = self._normalise(observations, params)
+
+        keys = list(zip(observations['date'].dt.year, observations['field_id']))
+        last_dates = pd.to_datetime(pd.Series([getattr(self.fields.get(key), 'last_date', None) for key in keys],
+                                              index=observations.index, dtype=object))
+        late = observations['date'] < last_dates
+        if late.any():
+            row = observations[late].iloc[0]
+            raise ValueError(f"observation of {(row['date'].year, row['field_id'])} on {row['date']:%Y-%m-%d} "
+                             "is older than the last one")
+
+        #last buffered observation of every field whose date is repeated in the batch
+        batch_dates = set(observations['date'])
+        stored = [(state.last_date, state.raw[-1][1], key[1], getattr(state, 'last_sat_name', None))
+                  for key, state in ((key, self.fields.get(key)) for key in set(keys))
+                  if state is not None and state.last_date in batch_dates]
+        stored = pd.DataFrame(stored, columns=['date', 'NDVI', 'field_id', 'sat_name']).assign(_stored=True)
+        observations = observations[['date', 'NDVI', 'field_id', 'sat_name']].assign(_stored=False)
+        observations, _ = deduplication.resolve_duplicates(pd.concat([stored, observations], ignore_index=True),
+                                                           self.priority)
+
+        ready = []
+        for date, value, field_id, sat_name, is_stored in observations.itertuples(index=False):
+            if is_stored:
+                continue
+            key = (date.year, field_id)
+            state = self.fields.get(key)
+            if state is None:
+                state = self.fields[key] = FieldState()
+            if date == state.last_date:
+                state.raw[-1] = (date, value)
+            else:
+                state.raw = state.raw[-2:] + [(date, value)]
+                state.raw_count += 1
+                ready.extend(self._valley_ready(key, state, final=False))
+            state.last_date = date
+            state.last_sat_name = sat_name
+        self.params = params
+
+        return self._detect(ready, final_keys=())
+
+    #function to normalise raw NDVI with the parameters updated by the batch (normalisation.update_minmax)
+    #observations already in the state keep the values of their own batch, so alerts early in a season
+    #use the range known so far; process keeps the updated parameters in self.params, to be saved between runs
+    def _normalise(self, observations, params):
+        keyed = normalisation.add_normalisation_keys(observations, self.region_prefixes)
+        unknown = keyed['region'].isna()
+        if unknown.any():
+            raise ValueError("no region prefix matches field_id "
+                             f"{', '.join(map(str, keyed.loc[unknown, 'field_id'].unique()[:5]))}")
+        params, _ = normalisation.update_minmax(params, keyed)
+        return observations.assign(NDVI=normalisation.apply_minmax(keyed, params).to_numpy()), params
+
+    #function to process a single observation
+    def add(self, date, ndvi, field_id):
+        return self.process(pd.DataFrame({'date': [date], 'NDVI': [ndvi], 'field_id': [field_id]}))
+
+    #function to close the series whose season is over (all series, or those of one year)
+    #the last observations are completed with edge padding like the batch SG filter; returns the remaining events
+    def flush(self, year=None):
+        keys = [key for key in self.fields if year is None or key[0] == year]
+        ready = []
+        for key in keys:
+            ready.extend(self._valley_ready(key, self.fields[key], final=True))
+        events = self._detect(ready, final_keys=keys)
+        for key in keys:
+            del self.fields[key]
+        return events
+
+    #function to take the raw observations whose valley input is known, i.e. whose next observation has arrived
+    #an observation is a valley when it lies valley_threshold below both neighbours; first and last ones never are
+    def _valley_ready(self, key, state, final):
+        ready = []
+        first_buffered = state.raw_count - len(state.raw)
+        while state.raw_done < state.raw_count - 1 or (final and state.raw_done < state.raw_count):
+            index = state.raw_done
+            date, value = state.raw[index - first_buffered]
+            valley = 0
+            if 0 < index < state.raw_count - 1:
+                diff_prev = value - state.raw[index - 1 - first_buffered][1]
+                diff_next = value - state.raw[index + 1 - first_buffered][1]
+                valley = int(diff_prev <= self.valley_threshold and diff_next <= self.valley_threshold)
+            ready.append((key, date, value, valley))
+            state.raw_done += 1
+        return ready
+
+    #function to remove outliers from the ready observations (one model call for all of them),
+    #then smooth the kept ones and look for cluster starts
+    def _detect(self, ready, final_keys):
+        keep = np.ones(len(ready), dtype=bool)
+        if self.model is not None and ready:
+            inputs = pd.DataFrame([(value, valley) for _, _, value, valley in ready], columns=['NDVI', 'valley'])
+            keep = self.model.predict(inputs[self.anomaly_inputs]) != -1
+
+        events = []
+        for (key, date, value, _), kept in zip(ready, keep):
+            if kept:
+                state = self.fields[key]
+                state.cleaned = state.cleaned[-(self.window_length - 1):] + [(date, value)]
+                state.cleaned_count += 1
+                events.extend(self._smooth_ready(key, state, final=False))
+        for key in final_keys:
+            events.extend(self._smooth_ready(key, self.fields[key], final=True))
+
+        return pd.DataFrame(events, columns=['year', 'field_id', 'date', 'earliest', 'latest'])
+
+    #function to smooth the cleaned observations whose SG window is complete (at the end of the season,
+    #the window is padded with the last value) and to check them for the start of a cluster
+    def _smooth_ready(self, key, state, final):
+        events = []
+        count = state.cleaned_count
+        first_buffered = count - len(state.cleaned)
+        last_ready = count - 1 if final else count - 1 - self.half_window
+        while state.smoothed_count <= last_ready:
+            index = state.smoothed_count
+            window = np.clip(np.arange(index - self.half_window, index + self.half_window + 1), 0, count - 1)
+            values = np.array([state.cleaned[i - first_buffered][1] for i in window])
+            smoothed = float(np.dot(self.coefficients, values))
+
+            dif_to_forelast = smoothed - state.smoothed[0] if len(state.smoothed) == 2 else np.nan
+            state.smoothed = state.smoothed[-1:] + [smoothed]
+            state.smoothed_count += 1
+
+            date = state.cleaned[index - first_buffered][0]
+            if date.month in self.excluded_months:
+                continue
+            in_cluster = bool(dif_to_forelast <= self.cut_threshold)
+            if in_cluster and not state.in_cluster:
+                earliest = state.cleaned[index - 1 - first_buffered][0] if index > 0 else date
+                latest = state.cleaned[index + 1 - first_buffered][0] if index < count - 1 else date
+                events.append(self._event(key, date, earliest, latest))
+            state.in_cluster = in_cluster
+        return events
+
+    #'cut started' event: year, field_id, detected date and the range of ± 1 observation around it
+    @staticmethod
+    def _event(key, date, earliest, latest):
+        return (key[0], key[1], date, earliest, latest)
+
+#functions to keep the per-field states between runs, e.g. when new scenes are processed daily
+#only the states are stored; model and parameters are passed again when loading
+def save_detector(detector, path):
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(detector.fields, f)
+    os.replace(path + '.tmp', path)
+
+def load_detector(path, **detector_parameters):
+    detector = StreamingCutDetector(**detector_parameters)
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            detector.fields = pickle.load(f)
+    return detector
@@ -0,0 +1,142 @@
+#the following python modules need to be installed:
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from mowing import cuts, evaluation, features, fieldseasons, models, smoothing
+
+#parameter sweep of the mowing detection (stages 6 and 7) against reference mowing dates
+#combinations share their upstream work: one Isolation Forest per valley threshold (the contamination
+#only sets the score percentile below which observations are outliers, so every contamination value
+#reuses the same trees and scores), one cleaned dataset per valley threshold and contamination,
+#one smoothing per cleaned dataset and SG setting; only cut detection and scoring run per combination
+
+#parameters of the sweep and their values in this study
+DEFAULTS = {
+    'valley_threshold': features.VALLEY_THRESHOLD,
+    'contamination': models.IF_PARAMETERS['contamination'],
+    'window_length': smoothing.WINDOW_LENGTH,
+    'polyorder': smoothing.POLYORDER,
+    'cut_threshold': cuts.CUT_THRESHOLD,
+    'excluded_months': tuple(cuts.EXCLUDED_MONTHS),
+}
+SCORE_COLUMNS = ['reference_cuts', 'detected_cuts', 'found_cuts', 'recall', 'precision', 'f1']
+
+#function to complete a combination with the default values of the parameters it does not set
+def _complete(combination):
+    unknown = set(combination) - set(DEFAULTS)
+    if unknown:
+        raise KeyError(f"unknown sweep parameters: {sorted(unknown)}")
+    combination = {**DEFAULTS, **combination}
+    combination['excluded_months'] = tuple(combination['excluded_months'])
+    return combination
+
+#function to list all combinations of a grid, a dict of parameter -> list of values
+#combinations whose polyorder is not smaller than window_length cannot be smoothed and are left out
+def grid_combinations(grid):
+    names = list(grid)
+    combinations = [_complete(dict(zip(names, values))) for values in itertools.product(*grid.values())]
+    return [c for c in combinations if c['polyorder'] < c['window_length']]
+
+#function to draw n_combinations different combinations of a grid at random (random search)
+def random_combinations(grid, n_combinations, seed=42):
+    combinations = grid_combinations(grid)
+    rng = np.random.default_rng(seed)
+    selected = rng.choice(len(combinations), size=min(n_combinations, len(combinations)), replace=False)
+    return [combinations[i] for i in np.sort(selected)]
+
+#function to remove the outliers of the validation data for every contamination value of a valley threshold
+#the forest is fitted once; an observation is an outlier when its score lies below the contamination
+#percentile of the training scores, as IsolationForest.predict with that contamination
+#returns a dict of contamination -> cleaned date, field_id, NDVI observations
+def clean_by_contamination(training, validation, valley_threshold, contaminations, anomaly_inputs=models.ANOMALY_INPUTS,
+                           random_state=42, n_jobs=-1):
+    training = features.calculate_valley(training.copy(), threshold=valley_threshold)
+    validation = features.calculate_valley(validation.copy(), threshold=valley_threshold)
+    model = IsolationForest(random_state=random_state, n_jobs=n_jobs).fit(training[anomaly_inputs])
+    training_scores = model.score_samples(training[anomaly_inputs])
+    validation_scores = model.score_samples(validation[anomaly_inputs])
+
+    cleaned = {}
+    for contamination in contaminations:
+        offset = np.percentile(training_scores, 100.0 * contamination)
+        cleaned[contamination] = validation.loc[validation_scores >= offset, ['date', 'field_id', 'NDVI']]
+    return cleaned
+
+#datasets shared with the worker processes (set by _init_worker)
+_worker_datasets = {}
+
+def _init_worker(datasets):
+    _worker_datasets.update(datasets)
+
+#function to smooth one cleaned dataset with one SG setting and score all cut parameters on it
+def _score_smoothing(outlier_key, window_length, polyorder, cut_parameters):
+    store = _worker_datasets['cleaned'][outlier_key]
+    reference = _worker_datasets['reference']
+    smoothed = fieldseasons.smooth(store, window_length=window_length, polyorder=polyorder)
+    smoothed = fieldseasons.temporal_features(smoothed)
+
+    scores = []
+    for cut_threshold, excluded_months in cut_parameters:
+        positions = fieldseasons.cut_positions(smoothed, cut_threshold, excluded_months)
+        scores.append(evaluation.score_detections(fieldseasons.cut_ranges(smoothed, positions), reference))
+    return scores
+
+#function to score parameter combinations (from grid_combinations or random_combinations) against
+#reference mowing dates (field_id, date) of the validation field-seasons, with a tolerance of ± 1 observation
+#the Isolation Forest is trained on training and applied to validation, as in 6_IF_and_SG.py;
+#the smoothing and scoring tasks run in a pool of processes (processes=1 runs them in this process)
+#returns one row per combination with its parameters and scores, best F1 first
+def run_sweep(training, validation, reference, combinations, processes=None, anomaly_inputs=models.ANOMALY_INPUTS,
+              random_state=42):
+    combinations = pd.DataFrame([_complete(c) for c in combinations], columns=list(DEFAULTS))
+    #reference cuts of the validation field-seasons
+    reference = reference.assign(date=pd.to_datetime(reference['date']), field_id=reference['field_id'].astype(str))
+    reference['year'] = reference['date'].dt.year
+    validation_dates = pd.to_datetime(validation['date'])
+    validation_seasons = pd.DataFrame({'year': validation_dates.dt.year.to_numpy(),
+                                       'field_id': validation['field_id'].astype(str).to_numpy()}).drop_duplicates()
+    reference = reference.merge(validation_seasons, on=['year', 'field_id'])
+
+    #stage 6 outlier removal: one forest per valley threshold, one cleaned dataset per contamination
+    cleaned = {}
+    for valley_threshold, group in combinations.groupby('valley_threshold', sort=False):
+        contaminations = group['contamination'].unique()
+        by_contamination = clean_by_contamination(training, validation, valley_threshold, contaminations,
+                                                  anomaly_inputs, random_state)
+        for contamination, observations in by_contamination.items():
+            cleaned[(valley_threshold, contamination)] = fieldseasons.FieldSeasons.from_frame(observations, dtype=np.float64)
+
+    #smoothing, cut detection and scoring: one task per cleaned dataset and SG setting
+    task_keys = ['valley_threshold', 'contamination', 'window_length', 'polyorder']
+    tasks, positions = [], []
+    for (valley_threshold, contamination, window_length, polyorder), group in combinations.groupby(task_keys, sort=False):
+        cut_parameters = list(zip(group['cut_threshold'], group['excluded_months']))
+        tasks.append(((valley_threshold, contamination), int(window_length), int(polyorder), cut_parameters))
+        positions.append(group.index)
+
+    datasets = {'cleaned': cleaned, 'reference': reference}
+    if processes == 1 or len(tasks) == 1:
+        _init_worker(datasets)
+        try:
+            results = [_score_smoothing(*task) for task in tasks]
+        finally:
+            _worker_datasets.clear()
+    else:
+        context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+        with ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=_init_worker,
+                                 initargs=(datasets,)) as executor:
+            results = list(executor.map(_score_smoothing, *zip(*tasks)))
+
+    scores = pd.DataFrame(index=combinations.index, columns=SCORE_COLUMNS, dtype=float)
+    for index, task_scores in zip(positions, results):
+        scores.loc[index] = pd.DataFrame(task_scores, index=index)[SCORE_COLUMNS]
+    return (
+        combinations.join(scores)
+        .sort_values('f1', ascending=False, kind='mergesort')
+        .reset_index(drop=True)
+    )